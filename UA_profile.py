@@ -16,7 +16,6 @@ UA profile module: defines a set of measures that run against Analyzer base data
       save comments only to job records, not flight records.
 """
 ### Section 1: dependencies (see FlightDataAnalyzer source files for additional options)
-import pdb
 import time
 import os, glob, socket
 import numpy as np
@@ -40,11 +39,17 @@ from analysis_engine.library import (integrate, repair_mask, index_at_value, all
 # asias_fds stuff
 import analyser_custom_settings as settings
 import staged_helper  as helper 
-import fds_oracle
+from lazy_import import LazyModule
+fds_oracle = LazyModule('fds_oracle')  # Oracle client loads only for SQL flight sets
+import supervised_run
+import kernels
+import dtype_policy
+from event_index import TransitionIndex
 from flightdatautilities.velocity_speed import get_vspeed_map, VelocitySpeed
 from flightdatautilities.model_information import (get_conf_map,
                                                    get_flap_map,
                                                    get_slat_map)
+from vspeed_registry import VelocitySpeedRegistry
 
    
 ### Section 2: measure definitions -- attributes, KTI, phase/section, KPV, DerivedParameter
@@ -67,31 +72,25 @@ Late Gear -- -done
 Late Flaps --(AltitudeAtLastFlapChangeBeforeTouchdown)
 '''
 
+def sustained_half_width(Param, window=3):
+    '''samples either side of each point in a sustained window, at least 1'''
+    add=Param.frequency*window/2
+    if add<1.0:
+        return 1
+    return int(add)
+
 def sustained_max_abs(Param,window=3,_slice=False):
     '''
     sustained max function for sustained events, window default of 3 sec (+/- 1.5)
     must use at least 3 samples (+/-1 sample)
     '''
     if _slice:   
-        x=np.ma.zeros(len(Param.array[_slice.slice]))
         absparam=abs(Param.array[_slice.slice])
     else:
-        x=np.ma.zeros(len(Param.array))    
         absparam=abs(Param.array)
-    add=Param.frequency*window/2
-    if add<1.0:
-        addint=1
-    else:
-        addint=int(add)
-        
-    shift=np.zeros(shape=(2*addint+1,len(absparam)))
-    for c in range(-addint,addint+1):
-        shift[c+addint]=np.roll(absparam,c,axis=0)
-    x.data[:]=shift.min(axis=0)        
-        
-    #length=len(Param.array)
-    #for c in range(addint,length):
-    #    x.data[c]=np.min(absparam[c-addint:c+addint+1])
+    x=np.ma.zeros(len(absparam), dtype=dtype_policy.float_dtype())
+    # min over the window, wrapping at the ends as the np.roll version did
+    x.data[:]=kernels.window_min(np.ma.getdata(absparam), sustained_half_width(Param, window))
     return x
 
 def sustained_max(Param,window=3,_slice=False):
@@ -99,27 +98,9 @@ def sustained_max(Param,window=3,_slice=False):
     sustained max function for sustained events, window default of 3 sec (+/- 1.5)
     must use at least 3 samples (+/-1 sample)
     '''
-    if _slice:   
-        x=np.ma.zeros(len(Param.array[_slice.slice]))
-    else:
-        x=np.ma.zeros(len(Param.array))      
-
-    add=Param.frequency*window/2
-    if add<1.0:
-        addint=1
-    else:
-        addint=int(add)
-    #pdb.set_trace()
-    shift=np.zeros(shape=(2*addint+1,len(x.data)))
-    for c in range(-addint,addint+1):
-        if _slice:
-            shift[c+addint]=np.roll(Param.array[_slice.slice],c,axis=0)
-        else:
-            shift[c+addint]=np.roll(Param.array,c,axis=0)
-    x.data[:]=shift.min(axis=0)
-    #length=len(Param.array)
-    #for c in range(addint,length):
-    #    x.data[c]=np.min(Param.array[c-addint:c+addint+1])
+    array = Param.array[_slice.slice] if _slice else Param.array
+    x=np.ma.zeros(len(array), dtype=dtype_policy.float_dtype())
+    x.data[:]=kernels.window_min(np.ma.getdata(array), sustained_half_width(Param, window))
     return x
         
 def sustained_min(Param,window=3,_slice=False):
@@ -127,28 +108,9 @@ def sustained_min(Param,window=3,_slice=False):
     sustained min function for sustained events, window default of 3 sec (+/- 1.5)
     must use at least 3 samples (+/-1 sample)
     '''
-    #pdb.set_trace()    
-    if _slice:   
-        x=np.ma.zeros(len(Param.array[_slice.slice]))
-    else:
-        x=np.ma.zeros(len(Param.array))   
-    add=Param.frequency*window/2
-    if add<1.0:
-        addint=1
-    else:
-        addint=int(add)
-        
-    shift=np.zeros(shape=(2*addint+1,len(x.data)))
-    for c in range(-addint,addint+1):
-        if _slice:
-            shift[c+addint]=np.roll(Param.array[_slice.slice],c,axis=0)
-        else:
-            shift[c+addint]=np.roll(Param.array,c,axis=0)
-    x.data[:]=shift.max(axis=0)
-    
-    #length=len(Param.array)
-    #for c in range(addint,length):
-    #    x.data[c]=np.max(Param.array[c-addint:c+addint+1])
+    array = Param.array[_slice.slice] if _slice else Param.array
+    x=np.ma.zeros(len(array), dtype=dtype_policy.float_dtype())
+    x.data[:]=kernels.window_max(np.ma.getdata(array), sustained_half_width(Param, window))
     return x
     
 
@@ -166,10 +128,6 @@ class A320(VelocitySpeed):
                 },
     }
     
-VELOCITY_SPEED_MAP = {
-    # Airbus
-    ('A320', None): A320,
-}   
 
 class B747 (VelocitySpeed):
     '''
@@ -187,39 +145,26 @@ class B747 (VelocitySpeed):
     }
     
 VELOCITY_SPEED_MAP = {
+    # Airbus
+    ('A320', None): A320,
     # Boeing
     ('B747', None): B747,
-}  
+}
 
-def get_vspeed_map_mitre(series=None, family=None, engine_series=None, engine_type=None):
+# MITRE tables from VELOCITY_SPEED_MAP and settings.VSPEED_TABLES_PATH (*.json, optional),
+# falling back to the FDS tables. Adding a fleet only needs a new table file.
+VSPEED_REGISTRY = VelocitySpeedRegistry(fallback=get_vspeed_map)
+VSPEED_REGISTRY.register_map(VELOCITY_SPEED_MAP)
+VSPEED_REGISTRY.load_directory(getattr(settings, 'VSPEED_TABLES_PATH', None))
+
+def get_vref_table(series=None, family=None, engine_series=None, engine_type=None):
     '''
-    Adapted from FDS 'get_vspeed_map' function
-    
-    Accessor for fetching velocity speed table classes.
-
-    :param series: An aircraft series e.g. B737-300
-    :type series: string
-    :param family: An aircraft family e.g. B737
-    :type family: string
-    :param engine_series: An engine series e.g. CF6-80C2
-    :type engine_series: string
-    :returns: associated VelocitySpeed class
-    :rtype: VelocitySpeed
+    Vref lookup table for an aircraft from VSPEED_REGISTRY. MITRE tables take
+    precedence over the FDS 'get_vspeed_map' tables, as in AirspeedReferenceVref.
+
     :raises: KeyError -- if no velocity speed mapping found.
     '''
-    lookup_combinations = ((series, engine_type),
-                           (family, engine_type),
-                           (series, engine_series),
-                           (family, engine_series),
-                           (series, None),
-                           (family, None))
-
-    for combination in lookup_combinations:
-        if combination in VELOCITY_SPEED_MAP:
-            return VELOCITY_SPEED_MAP[combination]
-        #else:
-            #found = 'None'
-            #return found
+    return VSPEED_REGISTRY.resolve(series, family, engine_series, engine_type)
 
 
 class AirspeedReferenceVref(DerivedParameterNode):
@@ -271,17 +216,13 @@ class AirspeedReferenceVref(DerivedParameterNode):
             
 
             x = map(lambda x: x.value if x else None, (series, family, engine, engine_type))
+            try:
+                vref_table = get_vref_table(*x)
+            except KeyError:
+                self.warning("'Airspeed Reference' will be fully masked "
+                             "because there is no Vref lookup table for %s." % (x,))
+                return
 
-            vspeed_class_test = get_vspeed_map_mitre(*x)
-            
-            if vspeed_class_test:
-                vspeed_class = vspeed_class_test
-            else:
-                vspeed_class = get_vspeed_map(*x)
-
-                        
-            
-            
             if gw is not None:  # and you must have eng_np
                 try:
                     # Allow up to 2 superframe values to be repaired:
@@ -295,29 +236,27 @@ class AirspeedReferenceVref(DerivedParameterNode):
                     return
 
                 setting_param = flap #or conf
-                vspeed_table = vspeed_class()
-                for approach in approaches:
-                    _slice = approach.slice
-                    '''TODO: Only uses max Vref setting, doesn't account for late config changes'''
-                    index = np.ma.argmax(setting_param.array[_slice])
-                    setting = setting_param.array[_slice][index]
-                    weight = repaired_gw[_slice][index] if gw is not None else None
-                    if setting in vspeed_table.vref_settings:
-                       ##and is_index_within_slice(touchdowns.get_last().index, _slice):
-                        # setting in vspeed table:
-                        vspeed = vspeed_table.vref(setting, weight)
-                    else:
-                        ''' Do not like the default of using max Vref for go arounds... '''
-                        ## No landing and max setting not in vspeed table:
-                        #if setting_param.name == 'Flap':
-                            #setting = max(get_flap_map(series.value, family.value))
-                        #else:
-                            #setting = max(get_conf_map(series.value, family.value).keys())
-                            #vspeed = vspeed_table.vref(setting, weight)
-                        self.warning("'Airspeed Reference' will be fully masked "
-                                 "because Vref lookup table does not have corresponding values.")
-                        return
-                    self.array = np_ma_masked_zeros_like(air_spd.array)
+                '''TODO: Only uses max Vref setting, doesn't account for late config changes.
+                   vref_table.vref() takes whole arrays, so setting_param.array[_slice] and
+                   repaired_gw[_slice] can be passed directly once we settle on the logic.'''
+                slices = [approach.slice for approach in approaches]
+                indexes = [np.ma.argmax(setting_param.array[_slice]) for _slice in slices]
+                flap_settings = np.ma.array([setting_param.array[_slice][index] for _slice, index in zip(slices, indexes)])
+                weights  = np.ma.array([repaired_gw[_slice][index] for _slice, index in zip(slices, indexes)])
+                if not all(setting in vref_table.vref_settings for setting in flap_settings):
+                    ''' Do not like the default of using max Vref for go arounds... '''
+                    ## No landing and max setting not in vspeed table:
+                    #if setting_param.name == 'Flap':
+                        #setting = max(get_flap_map(series.value, family.value))
+                    #else:
+                        #setting = max(get_conf_map(series.value, family.value).keys())
+                        #vspeed = vspeed_table.vref(setting, weight)
+                    self.warning("'Airspeed Reference' will be fully masked "
+                             "because Vref lookup table does not have corresponding values.")
+                    return
+                vspeeds = vref_table.vref(flap_settings, weights)
+                self.array = np_ma_masked_zeros_like(air_spd.array)
+                for _slice, vspeed in zip(slices, vspeeds):
                     self.array[_slice] = vspeed
 
 
@@ -695,7 +634,6 @@ class RateOfDescent3Sec500To50FtMax(KeyPointValueNode):
                approaches=S('Approach And Landing')):
 
         for app in approaches:
-            pdb.set_trace
             vsi_run = sustained_min(vrt_spd,_slice=app)
             x=np.ma.zeros(len(vrt_spd.array))
             x.data[app.slice]=vsi_run
@@ -763,8 +701,10 @@ class AltitudeAtLastGearDownBeforeTouchdown(KeyPointValueNode):
                alt_aal=P('Altitude AAL'),              
                touchdowns=KTI('Touchdown')):
 
+        gear_moves = TransitionIndex(gear.array, 0.5)
         for touchdown in touchdowns:
-            rough_index = index_at_value(gear.array.data, 0.5, slice(touchdown.index, 0, -1))
+            # last crossing before touchdown, as index_at_value scanning back from it
+            rough_index = gear_moves.last_before(touchdown.index)
             # index_at_value tries to be precise, but in this case we really
             # just want the index at the new flap setting.
             if rough_index:
@@ -895,6 +835,9 @@ if __name__=='__main__':
     LOG_LEVEL = 'WARNING'       
     MAKE_KML_FILES = False
     IS_PARALLEL = False
+    SUPERVISED = False   # each flight in a watched worker with a timeout, see supervised_run.py
+    RELEASE_NODES = False    # free intermediate derived arrays after their last consumer (node_release.py)
+    COMPACT_DTYPES = False   # store requested derived parameters as float32 / int8 codes (dtype_policy.py)
     ###############################################################
     module_names = [ os.path.basename(__file__).replace('.py','') ]#helper.get_short_profile_name(__file__)   # profile name = the name of this file
     print 'profile', PROFILE_NAME 
@@ -906,12 +849,21 @@ if __name__=='__main__':
         print "Run 'ipcluster start -n 10' from the command line first!"
         dview = helper.parallel_directview(PROFILE_NAME, module_names , FILE_REPOSITORY, 
                                                                LOG_LEVEL, FILES_TO_PROCESS, COMMENT, MAKE_KML_FILES)
+        dview['release_nodes'] = RELEASE_NODES
+        dview['compact_dtypes'] = COMPACT_DTYPES
         def eng_profile():
-            import staged_helper
+            import staged_helper, engine_setup
             reload(staged_helper)       
-            staged_helper.run_profile(PROFILE_NAME , module_names, LOG_LEVEL, files_to_process, 
+            engine_setup.install(release=release_nodes, compact_dtypes=compact_dtypes)
+            status = staged_helper.run_profile(PROFILE_NAME , module_names, LOG_LEVEL, files_to_process, 
                                     COMMENT, MAKE_KML_FILES, file_repository, save_oracle=True, mortal=True )
+            return status
         engine_results = dview.apply(eng_profile) 
+    elif SUPERVISED:
+        status = supervised_run.run_profile_supervised(PROFILE_NAME , module_names, LOG_LEVEL, FILES_TO_PROCESS, 
+                                COMMENT, MAKE_KML_FILES, FILE_REPOSITORY, save_oracle=True,
+                                timeout=600, flights_per_worker=50, retries=1)
+        print 'flight results', dict(status['counts'])
     else:
         helper.run_profile(PROFILE_NAME , module_names, LOG_LEVEL, FILES_TO_PROCESS, 
                                 COMMENT, MAKE_KML_FILES, FILE_REPOSITORY, save_oracle=True, mortal=True )
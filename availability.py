@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Which flights carry which parameters, from one parallel scan of HDF5 metadata.
+
+Rather than opening flights one at a time to see which fleets record
+'TCAS Combined Control' or 'ILS Glideslope', scan a directory once:
+
+    matrix = availability.scan(glob.glob(input_dir + '*.hdf5'), processes=8)
+    matrix.save('availability.npz')
+    ...
+    matrix = availability.AvailabilityMatrix.load('availability.npz')
+    matrix.fraction('TCAS Combined Control')
+    files, dropped = matrix.prune(FILES_TO_PROCESS, ['TCAS Combined Control', 'Vertical Speed'])
+
+The scan reads the series names and attributes (frequency, data_type,
+values_mapping) and the mask dataset for a masked-sample count, never the
+data. The matrix is flights x parameters: a presence bitmap plus frequency
+and masked/total sample counts. Files that could not be read (a network
+glitch, a truncated file) are listed in matrix.unreadable rather than taken
+for flights recording nothing, and prune() keeps them.
+"""
+import os
+import json
+import logging
+import multiprocessing
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def read_metadata(filepath):
+    '''
+    (filepath, {series name: (frequency, data_type, values_mapping, masked samples, samples)})
+    from the hdfaccess file layout; an unreadable file gives None
+    '''
+    import h5py
+    series = {}
+    try:
+        with h5py.File(filepath, 'r') as hdf:
+            for name, group in hdf['series'].items():
+                attrs = group.attrs
+                values_mapping = attrs.get('values_mapping')
+                mask = group['mask'] if 'mask' in group else None
+                samples = group['data'].shape[0] if 'data' in group else 0
+                series[name] = (float(attrs.get('frequency', 0.0)),
+                                str(attrs.get('data_type', '')),
+                                str(values_mapping) if values_mapping is not None else None,
+                                int(np.count_nonzero(mask[...])) if mask is not None else 0,
+                                int(samples))
+    except (IOError, KeyError) as err:
+        logger.warning('no metadata from %s: %s', filepath, err)
+        return filepath, None
+    return filepath, series
+
+
+class AvailabilityMatrix(object):
+    '''flights x parameters presence bitmap, with frequency and masked/total sample counts'''
+    def __init__(self, flights, params, present, frequency, masked, samples, param_info, unreadable=()):
+        self.flights = list(flights)
+        self.params = list(params)
+        self.present = present          # bool (flights, params)
+        self.frequency = frequency      # float32, 0 where absent
+        self.masked = masked            # int32 masked samples
+        self.samples = samples          # int32 samples
+        self.param_info = param_info    # {param: {'data_type': .., 'values_mapping': ..}} as first seen
+        self.unreadable = list(unreadable)  # flights whose metadata could not be read: unknown, not absent
+        self._flight_pos = dict((f, i) for i, f in enumerate(self.flights))
+        self._param_pos = dict((p, i) for i, p in enumerate(self.params))
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        '''from [(filepath, series metadata or None)] as returned by read_metadata'''
+        flights = [filepath for filepath, series in metadata]
+        unreadable = [filepath for filepath, series in metadata if series is None]
+        params = sorted(set(name for filepath, series in metadata for name in series or ()))
+        param_pos = dict((p, i) for i, p in enumerate(params))
+        shape = (len(flights), len(params))
+        present = np.zeros(shape, dtype=bool)
+        frequency = np.zeros(shape, dtype=np.float32)
+        masked = np.zeros(shape, dtype=np.int32)
+        samples = np.zeros(shape, dtype=np.int32)
+        param_info = {}
+        for row, (filepath, series) in enumerate(metadata):
+            if not series:
+                continue
+            cols = np.array([param_pos[name] for name in series])
+            values = series.values()
+            present[row, cols] = True
+            frequency[row, cols] = [v[0] for v in values]
+            masked[row, cols] = [v[3] for v in values]
+            samples[row, cols] = [v[4] for v in values]
+            for name, (freq, data_type, values_mapping, n_masked, n) in series.items():
+                if name not in param_info:
+                    param_info[name] = {'data_type': data_type, 'values_mapping': values_mapping}
+        return cls(flights, params, present, frequency, masked, samples, param_info, unreadable)
+
+    def save(self, path):
+        np.savez_compressed(path, present=np.packbits(self.present, axis=1),
+                            frequency=self.frequency, masked=self.masked, samples=self.samples,
+                            flights=json.dumps(self.flights), params=json.dumps(self.params),
+                            param_info=json.dumps(self.param_info), unreadable=json.dumps(self.unreadable))
+
+    @classmethod
+    def load(cls, path):
+        saved = np.load(path)
+        params = json.loads(str(saved['params']))
+        present = np.unpackbits(saved['present'], axis=1)[:, :len(params)].astype(bool)
+        unreadable = json.loads(str(saved['unreadable'])) if 'unreadable' in saved.files else []
+        return cls(json.loads(str(saved['flights'])), params, present, saved['frequency'],
+                   saved['masked'], saved['samples'], json.loads(str(saved['param_info'])), unreadable)
+
+    def _columns(self, params):
+        return [self._param_pos.get(p) for p in params]
+
+    def has(self, params):
+        '''bool per flight: every one of params is recorded'''
+        cols = self._columns(params)
+        if None in cols:  # recorded on no flight at all
+            return np.zeros(len(self.flights), dtype=bool)
+        return self.present[:, cols].all(axis=1)
+
+    def flights_with(self, params):
+        '''flights recording every one of params'''
+        return [self.flights[i] for i in np.flatnonzero(self.has(params))]
+
+    def fraction(self, param):
+        '''share of the readable flights recording param'''
+        col = self._param_pos.get(param)
+        readable = np.ones(len(self.flights), dtype=bool)
+        readable[[self._flight_pos[f] for f in self.unreadable]] = False
+        return float(self.present[readable, col].mean()) if col is not None and readable.any() else 0.0
+
+    def masked_fraction(self, param):
+        '''masked share of each flight's samples of param, nan where it is not recorded'''
+        col = self._param_pos.get(param)
+        if col is None:
+            return np.nan * np.ones(len(self.flights))
+        samples = self.samples[:, col].astype(float)
+        samples[samples == 0] = np.nan
+        return self.masked[:, col] / samples
+
+    def prune(self, files, params):
+        '''
+        (files to process, files dropped): drop the files known to lack one of
+        params; files that were not scanned, or could not be read, are kept
+        '''
+        has = self.has(params)
+        unreadable = set(self.unreadable)
+        keep, dropped = [], []
+        for f in files:
+            row = self._flight_pos.get(f)
+            (keep if row is None or f in unreadable or has[row] else dropped).append(f)
+        unknown = [f for f in files if f in unreadable]
+        if unknown:
+            logger.warning('kept %d files whose metadata could not be read, e.g. %s', len(unknown), unknown[0])
+        return keep, dropped
+
+
+def scan(files, processes=None, chunksize=8):
+    '''AvailabilityMatrix for the files, metadata read on `processes` workers'''
+    if processes == 1:
+        metadata = [read_metadata(f) for f in files]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            metadata = pool.map(read_metadata, files, chunksize=chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    return AvailabilityMatrix.from_metadata(metadata)
+
+
+if __name__=='__main__':
+    import sys, glob, time
+    input_dir = sys.argv[1]
+    t0 = time.time()
+    matrix = scan(glob.glob(os.path.join(input_dir, '*.hdf5')))
+    print '%d flights x %d parameters in %.1f sec' % (len(matrix.flights), len(matrix.params), time.time() - t0)
+    if matrix.unreadable:
+        print '%d files could not be read' % len(matrix.unreadable)
+    matrix.save(os.path.join(input_dir, 'availability.npz'))
+    for param in ('TCAS Combined Control', 'ILS Glideslope', 'ILS Localizer'):
+        print param, matrix.fraction(param)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Time the kernels of kernels.py against the per-sample loops they replaced
+(kept in test/test_kernels.py), on the jit path when numba is installed and
+on the NumPy/Python fallback.
+
+    python bench/bench_kernels.py
+    python bench/bench_kernels.py --samples 28800 115200 --repeat 5
+
+Runs without FDS. The first jit call compiles, so it is made before timing.
+"""
+import os
+import sys
+import argparse
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'test'))
+import numpy as np
+
+import kernels
+from test_kernels import (CTL_CODES, exceedance_loop, made_up_ra, roll_window, std_response_loop,
+                          vert_spd_required)
+
+
+def _best(func, repeat):
+    func()  # compile / warm up
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def _paths():
+    paths = [('fallback', False)]
+    if kernels.HAVE_NUMBA:
+        paths.insert(0, ('jit', True))
+    return paths
+
+
+def bench_window(samples, half_width, repeat):
+    values = np.random.RandomState(0).normal(size=samples)
+    rows = [('np.roll stack', _best(lambda: roll_window(values, half_width, False), repeat))]
+    for name, use_jit in _paths():
+        kernels.USE_JIT = use_jit
+        rows.append((name, _best(lambda: kernels.window_min(values, half_width), repeat)))
+    return rows
+
+
+def bench_tcas(samples, repeat):
+    '''one RA spanning the samples, the worst case for the per-sample loops'''
+    ctl, up, down, vert, vertspd = made_up_ra(0, samples)
+    stop = samples - 1
+    codes = np.array([CTL_CODES.get(s, kernels.CTL_OTHER) for s in ctl])
+    up_active = np.array([s.lower() != 'no up advisory' for s in up])
+    down_active = np.array([s.lower() != 'no down advisory' for s in down])
+    changed = np.ones(samples, dtype=bool)
+    required = np.array([vert_spd_required(*(states + (v,))) for states, v in zip(zip(ctl, up, down, vert), vertspd)])
+    reversal = np.array([s == 'Reversal' for s in vert])
+    valid = np.ones(samples, dtype=bool)
+    std = std_response_loop(ctl, up, down, vert, vertspd, 0, stop)
+    rows = [('std response loop', _best(lambda: std_response_loop(ctl, up, down, vert, vertspd, 0, stop), repeat)),
+            ('exceedance loop', _best(lambda: exceedance_loop(ctl, up, down, vertspd, std, 0, samples), repeat))]
+    for name, use_jit in _paths():
+        kernels.USE_JIT = use_jit
+        rows.append(('std response ' + name, _best(lambda: kernels.std_response(
+            0, codes, up_active, down_active, changed, required, reversal, vertspd, 5.0, 2.5, 480., 672.), repeat)))
+    rows.append(('exceedance', _best(lambda: kernels.exceedance(codes, up_active, down_active, vertspd, std, valid),
+                                     repeat)))
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='time kernels.py against the loops it replaced')
+    parser.add_argument('--samples', type=int, nargs='*', default=[3600, 28800])
+    parser.add_argument('--half-width', type=int, default=12, help='sustained window samples either side')
+    parser.add_argument('--repeat', type=int, default=3)
+    opts = parser.parse_args()
+    print 'numba', 'installed' if kernels.HAVE_NUMBA else 'not installed'
+    for samples in opts.samples:
+        print '%d samples' % samples
+        for label, rows in (('  sustained window +/-%d' % opts.half_width,
+                             bench_window(samples, opts.half_width, opts.repeat)),
+                            ('  TCAS RA', bench_tcas(samples, opts.repeat))):
+            print label
+            for name, seconds in rows:
+                print '    %-24s %9.4f sec' % (name, seconds)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark every node of the profile modules on synthetic flights, plus the
+full notebook_utils.derive_many() path, and compare against a saved baseline.
+
+    python bench/bench_profiles.py                          # print timings
+    python bench/bench_profiles.py --save bench/baseline.json
+    python bench/bench_profiles.py --compare bench/baseline.json
+
+Flights cover a few (hours, Hz) shapes; see FLIGHT_SHAPES. A node is timed by
+calling get_derived() on its dependencies, just as the FDS derive loop does, and
+the best of --repeat runs is kept. Nodes from the same module are derived first
+when one depends on another (e.g. 'TCAS RA Sections'). Run it from the repo
+root in the FDS environment.
+
+Baselines are plain JSON ({shape: {module.Node: seconds}}), one per machine, so
+compare against a file saved on the same box.
+"""
+import os
+import sys
+import json
+import time
+import inspect
+import argparse
+import platform
+import tempfile
+import datetime
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic
+
+PROFILE_MODULES = ['example_profile', 'tcas_profile', 'UA_profile']
+
+# (hours, Hz, RAs, approaches)
+FLIGHT_SHAPES = [(1.0, 1.0, 1, 1), (3.0, 4.0, 2, 2), (8.0, 8.0, 4, 3)]
+
+# slowdown ratio above which --compare reports a regression
+REGRESSION_RATIO = 1.25
+
+
+class _Quiet(object):
+    '''swallow the print statements of the nodes while they are timed'''
+    def __enter__(self):
+        self.stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')
+
+    def __exit__(self, *exc_info):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def shape_key(hours, frequency, ras, approaches):
+    return '%gh@%gHz/%dra/%dapp' % (hours, frequency, ras, approaches)
+
+
+def profile_nodes(module):
+    '''node classes defined in the module (not the ones it imports)'''
+    from analysis_engine.node import Node
+    return [cls for name, cls in sorted(vars(module).items())
+            if inspect.isclass(cls) and issubclass(cls, Node) and cls.__module__ == module.__name__]
+
+
+def time_nodes(module, nodes, repeat=3):
+    '''
+    {node name: best seconds, or an error string} for every node of the module
+    that can operate on the synthetic flight; derived nodes are added to `nodes`
+    '''
+    timings = {}
+    pending = profile_nodes(module)
+    progress = True
+    while pending and progress:
+        progress = False
+        for cls in list(pending):
+            deps = cls.get_dependency_names()
+            available = [d for d in deps if d in nodes]
+            if not cls.can_operate(available):
+                continue
+            pending.remove(cls)
+            progress = True
+            args = [nodes.get(d) for d in deps]
+            best = None
+            try:
+                with _Quiet():
+                    for i in range(repeat):
+                        node = cls()
+                        t0 = timeit.default_timer()
+                        node = node.get_derived(args)
+                        elapsed = timeit.default_timer() - t0
+                        best = elapsed if best is None else min(best, elapsed)
+            except Exception as err:
+                timings[cls.get_name()] = 'error: %r' % err
+                continue
+            timings[cls.get_name()] = best
+            nodes[cls.get_name()] = node
+    for cls in pending:
+        timings[cls.get_name()] = 'skipped: cannot operate'
+    return timings
+
+
+def time_derive_many(flt, module, repeat=1):
+    '''best seconds for notebook_utils.derive_many() of the whole module on the flight'''
+    import notebook_utils as nb
+    import staged_helper as helper
+    path = os.path.join(tempfile.mkdtemp(), flt.attributes['Myfile'])
+    synthetic.write_hdf5(flt, path)
+    best = None
+    try:
+        for i in range(repeat):
+            flight = helper.Flight()
+            flight.load_from_hdf5(path)
+            with _Quiet():
+                t0 = timeit.default_timer()
+                nb.derive_many(flight, vars(module))
+                elapsed = timeit.default_timer() - t0
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+    return best
+
+
+def run(shapes=FLIGHT_SHAPES, modules=PROFILE_MODULES, repeat=3, derive_many=True):
+    report = {'timestamp': datetime.datetime.now().isoformat(), 'host': platform.node(),
+              'python': platform.python_version(), 'repeat': repeat, 'nodes': {}, 'derive_many': {}}
+    for shape in shapes:
+        hours, frequency, ras, approaches = shape
+        key = shape_key(*shape)
+        t0 = time.time()
+        flt = synthetic.synthetic_flight(hours=hours, frequency=frequency, ras=ras, approaches=approaches)
+        print 'flight %s built in %.1f sec' % (key, time.time() - t0)
+        report['nodes'][key] = {}
+        report['derive_many'][key] = {}
+        for module_name in modules:
+            module = __import__(module_name)
+            timings = time_nodes(module, synthetic.to_nodes(flt), repeat=repeat)
+            for name, seconds in timings.items():
+                report['nodes'][key]['%s.%s' % (module_name, name)] = seconds
+            if derive_many:
+                try:
+                    report['derive_many'][key][module_name] = time_derive_many(flt, module)
+                except Exception as err:
+                    report['derive_many'][key][module_name] = 'error: %r' % err
+    return report
+
+
+def _flatten(report):
+    flat = {}
+    for section in ('nodes', 'derive_many'):
+        for key, timings in report[section].items():
+            for name, seconds in timings.items():
+                flat[(section, key, name)] = seconds
+    return flat
+
+
+def compare(report, baseline, ratio=REGRESSION_RATIO):
+    '''[(section, shape, name, baseline seconds, seconds, ratio)] for timings slower than ratio x baseline'''
+    regressions = []
+    now, then = _flatten(report), _flatten(baseline)
+    for k in sorted(set(now) & set(then)):
+        if isinstance(now[k], float) and isinstance(then[k], float) and then[k] > 0:
+            if now[k] / then[k] > ratio:
+                regressions.append(k + (then[k], now[k], now[k] / then[k]))
+    return regressions
+
+
+def format_report(report):
+    lines = []
+    for key, timings in sorted(report['nodes'].items()):
+        lines.append('== %s' % key)
+        rows = sorted(timings.items(), key=lambda kv: -kv[1] if isinstance(kv[1], float) else 0)
+        for name, seconds in rows:
+            value = '%10.4f' % seconds if isinstance(seconds, float) else seconds
+            lines.append('  %-70s %s' % (name, value))
+        for module_name, seconds in sorted(report['derive_many'][key].items()):
+            value = '%10.4f' % seconds if isinstance(seconds, float) else seconds
+            lines.append('  %-70s %s' % ('derive_many(%s)' % module_name, value))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='time the profile nodes on synthetic flights')
+    parser.add_argument('--save', help='write the timings to this baseline JSON file')
+    parser.add_argument('--compare', help='report timings slower than this baseline JSON file')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--modules', nargs='*', default=PROFILE_MODULES)
+    parser.add_argument('--no-derive-many', action='store_true', help='skip the derive_many timings')
+    opts = parser.parse_args()
+
+    report = run(modules=opts.modules, repeat=opts.repeat, derive_many=not opts.no_derive_many)
+    print format_report(report)
+    if opts.save:
+        with open(opts.save, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+        print 'baseline saved to', opts.save
+    if opts.compare:
+        with open(opts.compare) as f:
+            regressions = compare(report, json.load(f))
+        for section, key, name, then, now, ratio in regressions:
+            print 'REGRESSION %s %s %s: %.4f -> %.4f sec (x%.2f)' % (section, key, name, then, now, ratio)
+        print '%d regressions' % len(regressions)
+        sys.exit(1 if regressions else 0)
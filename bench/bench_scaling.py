@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Scaling benchmark for the parallel runners: the same engine work as
+parallel_profile.py's eng_profile() (staged_helper.run_analyzer() on a share of
+the files, its status returned to the controller), run on 1..N local worker
+processes over a corpus of synthetic HDF5 flights.
+
+    python bench/bench_scaling.py --workers 1 2 4 8 --flights 64
+    python bench/bench_scaling.py --mode read          # HDF5 reads only, the I/O ceiling
+
+For each worker count it reports
+    flights/s and parallel efficiency (speedup over 1 worker / workers)
+    CPU vs I/O+wait time: worker CPU seconds against flight wall seconds
+    per-flight latency p50/p95/p99
+
+Nothing goes to Oracle (save_oracle=False); the derived files land in an output
+directory under the corpus, cleared at the end. Worker counts run in the order
+given on the same corpus, so the page cache is warm after the first one; list 1
+twice to see the cold/warm difference.
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import multiprocessing
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import synthetic
+
+# (hours, Hz, RAs, approaches) cycled through the corpus, short hops to long hauls
+CORPUS_SHAPES = [(1.0, 1.0, 1, 1), (2.0, 4.0, 2, 1), (3.0, 8.0, 2, 2), (6.0, 8.0, 4, 1)]
+
+_config = {}
+
+
+def build_corpus(directory, flights, shapes=CORPUS_SHAPES):
+    '''write `flights` synthetic HDF5 files (kept between runs) and return their paths'''
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    paths = []
+    for i in range(flights):
+        hours, frequency, ras, approaches = shapes[i % len(shapes)]
+        path = os.path.join(directory, 'flight_%04d_%gh_%gHz.hdf5' % (i, hours, frequency))
+        if not os.path.exists(path):
+            flt = synthetic.synthetic_flight(hours=hours, frequency=frequency, ras=ras,
+                                             approaches=approaches, seed=i)
+            synthetic.write_hdf5(flt, path)
+        paths.append(path)
+    return paths
+
+
+def _cpu_time():
+    user, system = os.times()[:2]
+    return user + system
+
+
+def _init_worker(config):
+    _config.update(config)
+    if config['mode'] == 'analyzer':
+        import staged_helper
+        _config['logger'] = staged_helper.initialize_logger(config['log_level'])
+
+
+def _read_flight(filepath):
+    '''read every series of the file, data and mask'''
+    import h5py
+    nbytes = 0
+    with h5py.File(filepath, 'r') as hdf:
+        for group in hdf['series'].values():
+            nbytes += group['data'][...].nbytes + group['mask'][...].nbytes
+    return nbytes
+
+
+def _run_flight(filepath):
+    '''one flight on a worker: (filepath, wall seconds, cpu seconds, run_analyzer status or None)'''
+    wall0, cpu0 = time.time(), _cpu_time()
+    if _config['mode'] == 'read':
+        _read_flight(filepath)
+        status = None
+    else:
+        import staged_helper
+        status = staged_helper.run_analyzer(_config['profile_name'], _config['module_names'], _config['logger'],
+                                            [filepath], 'NA', _config['output_dir'], _config['output_dir'],
+                                            include_flight_attributes=False, make_kml=False,
+                                            save_oracle=False, comment='scaling benchmark',
+                                            file_repository='local')
+    return filepath, time.time() - wall0, _cpu_time() - cpu0, status
+
+
+def run_workers(files, workers, config):
+    '''process the files on `workers` processes, one flight per task; returns the stats of the run'''
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(config,))
+    t0 = time.time()
+    try:
+        flights = []
+        for filepath, wall, cpu, status in pool.imap_unordered(_run_flight, files, chunksize=1):
+            flights.append((wall, cpu))
+        elapsed = time.time() - t0
+    finally:
+        pool.close()
+        pool.join()
+    wall = np.array([f[0] for f in flights])
+    cpu = np.array([f[1] for f in flights])
+    return {'workers': workers, 'flights': len(flights), 'seconds': elapsed,
+            'flights_per_sec': len(flights) / elapsed,
+            'cpu_fraction': float(cpu.sum() / wall.sum()) if wall.sum() else 0.0,
+            'cpu_sec': float(cpu.sum()), 'io_wait_sec': float((wall - cpu).clip(0).sum()),
+            'latency_p50': float(np.percentile(wall, 50)),
+            'latency_p95': float(np.percentile(wall, 95)),
+            'latency_p99': float(np.percentile(wall, 99))}
+
+
+def run(files, worker_counts, config):
+    results = []
+    base = None
+    for workers in worker_counts:
+        stats = run_workers(files, workers, config)
+        if base is None or workers == 1:
+            base = stats['flights_per_sec'] / workers   # per-worker rate of the first (ideally 1 worker) run
+        stats['efficiency'] = stats['flights_per_sec'] / (base * workers)
+        print format_row(stats)
+        results.append(stats)
+    return results
+
+
+def format_row(stats):
+    return ('%3d workers %8.2f flights/s  eff %5.2f  cpu %4.0f%%  io+wait %8.1fs  '
+            'p50 %6.2fs p95 %6.2fs p99 %6.2fs' % (stats['workers'], stats['flights_per_sec'],
+                                                   stats.get('efficiency', 0.0), 100 * stats['cpu_fraction'],
+                                                   stats['io_wait_sec'], stats['latency_p50'],
+                                                   stats['latency_p95'], stats['latency_p99']))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='flights/s of the parallel runner by worker count')
+    parser.add_argument('--workers', type=int, nargs='*', default=[1, 2, 4, multiprocessing.cpu_count()])
+    parser.add_argument('--flights', type=int, default=32)
+    parser.add_argument('--corpus', default=os.path.join(os.path.expanduser('~'), 'asias_bench_corpus'))
+    parser.add_argument('--mode', choices=['analyzer', 'read'], default='analyzer')
+    parser.add_argument('--modules', nargs='*', default=['example_profile'])
+    parser.add_argument('--save', help='write the results to this JSON file')
+    opts = parser.parse_args()
+
+    files = build_corpus(opts.corpus, opts.flights)
+    print '%d flights in %s, %.0f MB' % (len(files), opts.corpus,
+                                         sum(os.path.getsize(f) for f in files) / 1e6)
+    config = {'mode': opts.mode, 'module_names': opts.modules, 'profile_name': 'bench_scaling',
+              'log_level': 'WARNING', 'output_dir': os.path.join(opts.corpus, 'output') + '/'}
+    if not os.path.exists(config['output_dir']):
+        os.makedirs(config['output_dir'])
+    results = run(files, opts.workers, config)
+    for leftover in glob.glob(os.path.join(config['output_dir'], '*.hdf5')):
+        os.remove(leftover)
+    if opts.save:
+        with open(opts.save, 'w') as f:
+            json.dump({'mode': opts.mode, 'modules': opts.modules, 'corpus_flights': len(files),
+                       'cpu_count': multiprocessing.cpu_count(), 'results': results}, f, indent=1)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic flights for benchmarking the profiles without any FDS data.
+
+synthetic_flight() builds a plausible flight of any length and sample rate:
+climb, cruise and descent, go-arounds plus a final landing, TCAS RAs, ILS
+signals on approach and randomly masked gaps. The same seed gives the same flight.
+
+    flt = synthetic_flight(hours=3, frequency=8, ras=2, approaches=2)
+    nodes = to_nodes(flt)              # analysis_engine P/M/KTI/S/A nodes by name
+    write_hdf5(flt, '/tmp/flt.hdf5')   # FDS hdfaccess file layout
+
+Every series is sampled at flt.frequency with zero offset, so nodes can be
+derived on it directly.
+"""
+import json
+import collections
+
+import numpy as np
+
+# values mappings of the multistate series, as in the FDS LFLs
+TCAS_COMBINED_CONTROL = {0: 'No Advisory', 1: 'Clear of Conflict', 2: 'Drop Track', 3: 'Altitude Lost',
+                         4: 'Up Advisory Corrective', 5: 'Down Advisory Corrective', 6: 'Preventive'}
+TCAS_UP_ADVISORY = {0: 'No Up Advisory', 1: 'Climb', 2: "Don't Descend", 3: "Don't Descend 500",
+                    4: "Don't Descend 1000", 5: "Don't Descend 2000"}
+TCAS_DOWN_ADVISORY = {0: 'No Down Advisory', 1: 'Descend', 2: "Don't Climb", 3: "Don't Climb 500",
+                      4: "Don't Climb 1000", 5: "Don't Climb 2000"}
+TCAS_VERTICAL_CONTROL = {0: 'Advisory is not one of the following types', 1: 'Crossing',
+                         2: 'Reversal', 3: 'Increase', 4: 'Maintain'}
+TCAS_SENSITIVITY = {0: 'SL = 0 (Automatic)', 1: 'SL = 1 (Standby)', 2: 'SL = 2 (TA Only)',
+                    3: 'SL = 3', 4: 'SL = 4', 5: 'SL = 5', 6: 'SL = 6', 7: 'SL = 7'}
+TCAS_RA = {0: '-', 1: 'RA'}
+GEAR_DOWN = {0: 'Up', 1: 'Down'}
+AP_ENGAGED = {0: '-', 1: 'Engaged'}
+
+Series = collections.namedtuple('Series', 'array frequency offset values_mapping')
+
+
+class SyntheticFlight(object):
+    '''arrays, KTI indexes, section slices and attributes of one synthetic flight'''
+    def __init__(self, frequency, duration):
+        self.frequency = frequency
+        self.duration = duration          # seconds
+        self.series = collections.OrderedDict()    # name -> Series
+        self.ktis = collections.OrderedDict()      # name -> [index, ...]
+        self.sections = collections.OrderedDict()  # name -> [(start, stop), ...]
+        self.attributes = collections.OrderedDict()
+
+    def add(self, name, array, values_mapping=None):
+        self.series[name] = Series(array, float(self.frequency), 0.0, values_mapping)
+
+
+def _altitude_profile(hours, approaches):
+    '''
+    (time, altitude) knots in seconds and feet AAL, and the (start, end) time of
+    every approach: from 3000 ft down to the go-around at 200 ft or the landing
+    '''
+    duration = hours * 3600.0
+    taxi = min(600.0, 0.05 * duration)
+    climb = min(1500.0, 0.15 * duration)
+    descent = min(1500.0, 0.15 * duration)
+    cruise_alt = 35000.0 if hours >= 1 else 10000.0
+    go_around = 600.0   # seconds per extra approach
+    t_land = duration - taxi
+    top_of_descent = t_land - 300.0 - descent - go_around * (approaches - 1)
+    knots = [(0.0, 0.0), (taxi, 0.0), (taxi + climb, cruise_alt), (top_of_descent, cruise_alt)]
+    t = top_of_descent + descent
+    approach_times = []
+    for i in range(approaches - 1):
+        knots += [(t, 3000.0), (t + 240.0, 200.0), (t + 360.0, 2000.0)]
+        approach_times.append((t, t + 240.0))
+        t += go_around
+    knots += [(t, 3000.0), (t_land, 0.0), (duration, 0.0)]
+    approach_times.append((t, t_land))
+    return np.array(knots).T, approach_times
+
+
+def _masked_gaps(array, rng, gaps, max_len):
+    '''mask a few random runs of samples, as drop-outs do on real recordings'''
+    mask = np.zeros(len(array), dtype=bool)
+    for start in rng.randint(0, len(array), size=gaps):
+        mask[start:start + rng.randint(1, max_len)] = True
+    return np.ma.array(array, mask=mask)
+
+
+def synthetic_flight(hours=3.0, frequency=1.0, ras=2, approaches=1, gaps=5, seed=0):
+    '''
+    a flight of `hours` sampled at `frequency` Hz, with `ras` TCAS RAs and
+    `approaches` approaches, the last of which lands
+    '''
+    rng = np.random.RandomState(seed)
+    flt = SyntheticFlight(frequency, hours * 3600.0)
+    n = int(flt.duration * frequency)
+    t = np.arange(n) / float(frequency)
+    (knot_t, knot_alt), approach_times = _altitude_profile(hours, approaches)
+
+    alt_aal = np.interp(t, knot_t, knot_alt)
+    alt_aal = np.where(alt_aal > 0, np.maximum(alt_aal + rng.normal(0, 5, n).cumsum() * 0.01, 1.0), 0.0)
+    airborne = alt_aal > 0
+    liftoff = int(np.argmax(airborne))
+    touchdown = int(n - np.argmax(airborne[::-1]))
+    vert_spd = np.gradient(alt_aal) * 60.0 * frequency
+    airspeed = np.where(airborne, np.minimum(140.0 + alt_aal / 100.0, 300.0), 10.0) + rng.normal(0, 1.5, n)
+
+    # approaches run on 30 s past the go-around or the touchdown
+    approach_slices = [(int(start * frequency), min(int((end + 30) * frequency), n))
+                       for start, end in approach_times]
+    in_approach = np.zeros(n, dtype=bool)
+    for start, stop in approach_slices:
+        in_approach[start:stop] = True
+
+    flap = np.where(in_approach, 30.0, 0.0)
+    flap[in_approach & (alt_aal > 1500)] = 25.0
+    gear = np.where((in_approach & (alt_aal < 1500)) | ~airborne, 1, 0)
+    ils_gs = np.ma.array(rng.normal(0, 0.3, n), mask=~in_approach)
+    ils_loc = np.ma.array(rng.normal(0, 0.2, n), mask=~in_approach)
+
+    # TCAS RAs spread through the cruise: ~25 s corrective, then 5 s clear of conflict
+    ra_starts = np.linspace(liftoff + 0.3 * (touchdown - liftoff), liftoff + 0.7 * (touchdown - liftoff), ras)
+    ra_len, coc_len = int(25 * frequency), int(5 * frequency)
+    ctl = np.zeros(n, dtype=int)
+    up = np.zeros(n, dtype=int)
+    down = np.zeros(n, dtype=int)
+    vert = np.zeros(n, dtype=int)
+    ra = np.zeros(n, dtype=int)
+    ra_slices = []
+    for i, start in enumerate(ra_starts.astype(int)):
+        stop = start + ra_len
+        climb = i % 2 == 0
+        ctl[start:stop] = 4 if climb else 5
+        (up if climb else down)[start:stop] = 1
+        vert[start + ra_len // 2:stop] = 2 if i % 3 == 2 else 0   # every third RA reverses
+        ctl[stop:stop + coc_len] = 1
+        ra[start:stop] = 1
+        ra_slices.append((start, stop))
+
+    masked = lambda a: _masked_gaps(a, rng, gaps, int(4 * frequency) + 2)
+    flt.add('Altitude AAL', masked(alt_aal))
+    flt.add('Altitude AAL For Flight Phases', np.ma.array(alt_aal))
+    flt.add('Altitude QNH', masked(alt_aal + 500.0))
+    flt.add('Vertical Speed', masked(vert_spd))
+    flt.add('Airspeed', masked(airspeed))
+    flt.add('Airspeed True', masked(airspeed * (1 + alt_aal / 50000.0)))
+    flt.add('Pitch', masked(rng.normal(2, 1, n)))
+    flt.add('Roll', masked(rng.normal(0, 3, n)))
+    flt.add('Gross Weight Smoothed', np.ma.array(np.linspace(250000.0, 190000.0, n)))
+    flt.add('Flap', np.ma.array(flap))
+    flt.add('Eng (*) N1 Min', masked(np.where(airborne, 60.0, 25.0) + rng.normal(0, 2, n)))
+    flt.add('ILS Glideslope', ils_gs)
+    flt.add('ILS Localizer', ils_loc)
+    flt.add('Gear Down', np.ma.array(gear), GEAR_DOWN)
+    flt.add('AP Engaged', np.ma.array(np.where(alt_aal > 5000, 1, 0)), AP_ENGAGED)
+    flt.add('TCAS RA', np.ma.array(ra), TCAS_RA)
+    flt.add('TCAS Combined Control', np.ma.array(ctl), TCAS_COMBINED_CONTROL)
+    flt.add('TCAS Up Advisory', np.ma.array(up), TCAS_UP_ADVISORY)
+    flt.add('TCAS Down Advisory', np.ma.array(down), TCAS_DOWN_ADVISORY)
+    flt.add('TCAS Vertical Control', np.ma.array(vert), TCAS_VERTICAL_CONTROL)
+    flt.add('TCAS Sensitivity Level', np.ma.array(np.where(airborne, 4, 0)), TCAS_SENSITIVITY)
+
+    flt.ktis['Liftoff'] = [float(liftoff)]
+    flt.ktis['Touchdown'] = [float(touchdown)]
+    flt.ktis['AP Disengaged Selection'] = [float(i) for i in np.flatnonzero(np.diff(np.where(alt_aal > 5000, 1, 0)) < 0) + 1]
+    flt.sections['Airborne'] = [(liftoff, touchdown)]
+    flt.sections['Grounded'] = [(0, liftoff), (touchdown, n)]
+    flt.sections['Approach And Landing'] = approach_slices
+    flt.sections['Approach'] = approach_slices
+    flt.sections['Final Approach'] = [(start + (stop - start) // 2, stop) for start, stop in approach_slices]
+
+    flt.attributes['Series'] = 'B747-200'
+    flt.attributes['Family'] = 'B747'
+    flt.attributes['Engine Series'] = 'JT9D'
+    flt.attributes['Engine Type'] = 'JT9D-7'
+    flt.attributes['FDR Landing Runway'] = {'identifier': '31R', 'glideslope': {'frequency': 111.5}}
+    flt.attributes['FDR Takeoff Airport'] = {'code': {'icao': 'KSFO'}}
+    flt.attributes['FDR Landing Airport'] = {'code': {'icao': 'KJFK'}}
+    flt.attributes['Myfile'] = 'synthetic-%gh-%gHz-%d.hdf5' % (hours, frequency, seed)
+    flt.attributes['Mydict'] = {}
+    flt.ra_slices = ra_slices   # ground truth, for checking the TCAS nodes
+    flt.start_timestamp = 1373673600.0 + 3600.0 * seed   # 2013-07-13 00:00 UTC, one hour per seed
+    return flt
+
+
+def to_nodes(flt):
+    '''analysis_engine nodes for every series, KTI, section and attribute, by name'''
+    from analysis_engine.node import (A, KTI, M, P, KeyTimeInstance, Section, SectionNode)
+    nodes = {}
+    for name, s in flt.series.items():
+        if s.values_mapping:
+            nodes[name] = M(name, array=s.array.copy(), values_mapping=s.values_mapping,
+                            frequency=s.frequency, offset=s.offset)
+        else:
+            nodes[name] = P(name, array=s.array.copy(), frequency=s.frequency, offset=s.offset)
+    for name, indexes in flt.ktis.items():
+        nodes[name] = KTI(name, frequency=flt.frequency,
+                          items=[KeyTimeInstance(index=i, name=name) for i in indexes])
+    for name, slices in flt.sections.items():
+        nodes[name] = SectionNode(name, frequency=flt.frequency,
+                                  items=[Section(name, slice(a, b), a, b) for a, b in slices])
+    for name, value in flt.attributes.items():
+        nodes[name] = A(name, value=value)
+    return nodes
+
+
+def write_hdf5(flt, path):
+    '''
+    write the series in the layout read by hdfaccess.file.hdf_file:
+    /series/<name>/data, /series/<name>/mask and attributes on each series group
+    '''
+    import h5py
+    with h5py.File(path, 'w') as hdf:
+        hdf.attrs['duration'] = flt.duration
+        hdf.attrs['version'] = 'synthetic'
+        hdf.attrs['start_timestamp'] = flt.start_timestamp
+        series = hdf.create_group('series')
+        for name, s in flt.series.items():
+            group = series.create_group(name)
+            group.create_dataset('data', data=np.ma.getdata(s.array))
+            group.create_dataset('mask', data=np.ma.getmaskarray(s.array))
+            group.attrs['frequency'] = s.frequency
+            group.attrs['supf_offset'] = s.offset
+            group.attrs['lfl'] = True
+            if s.values_mapping:
+                group.attrs['values_mapping'] = json.dumps(dict((str(k), v) for k, v in s.values_mapping.items()))
+                group.attrs['data_type'] = 'Multi-state'
+            else:
+                group.attrs['data_type'] = 'Signed'
+    return path
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Array-backed containers for KeyPointValue / KeyTimeInstance output.
+
+A KeyPointValueNode is a list of recordtype objects, one Python object per
+KPV. The state-change KPVs in tcas_profile produce hundreds of those per
+flight. CompactKPVs keeps them instead as one structured numpy array with
+index, value and name-code columns, plus a table of interned names. Nodes fill
+it in bulk, and it is saved, memory-mapped or pickled as a single buffer.
+
+    kpvs = CompactKPVs()
+    kpvs.extend([12., 40.], [1, 0], 'TCAS Up Advisory|Climb')
+    node.extend(kpvs.to_items())         # KeyPointValue objects for the analyzer
+
+snapshot_kpvs() reads any number of parameters at the indices of one KTI node
+in one vectorised pass, without full-length copies such as np.abs(array).
+"""
+import json
+
+import numpy as np
+
+
+class NameTable(object):
+    '''interned item names: name <-> small integer code'''
+    def __init__(self, names=()):
+        self.names = []
+        self._codes = {}
+        for name in names:
+            self.code(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def code(self, name):
+        try:
+            return self._codes[name]
+        except KeyError:
+            self._codes[name] = len(self.names)
+            self.names.append(name)
+            return self._codes[name]
+
+    def codes(self, names):
+        return np.array([self.code(name) for name in names], dtype=np.int32)
+
+
+class _CompactItems(object):
+    '''columns of node items in a structured array; see CompactKPVs'''
+    dtype = None
+
+    def __init__(self, records=None, names=()):
+        self.name_table = NameTable(names)
+        self._chunks = [] if records is None else [records]
+
+    @property
+    def records(self):
+        '''all items as one structured array, in the order they were added'''
+        if len(self._chunks) != 1:
+            if self._chunks:
+                self._chunks = [np.concatenate(self._chunks)]
+            else:
+                self._chunks = [np.zeros(0, dtype=self.dtype)]
+        return self._chunks[0]
+
+    @property
+    def names(self):
+        return self.name_table.names
+
+    def __len__(self):
+        return sum(len(chunk) for chunk in self._chunks)
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and self.names == other.names and
+                np.array_equal(self.records, other.records))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def _add(self, columns, name):
+        '''append rows; name is one name for all rows or a sequence, one per row'''
+        size = len(columns['index'])
+        chunk = np.zeros(size, dtype=self.dtype)
+        for field, column in columns.items():
+            chunk[field] = column
+        if isinstance(name, basestring):
+            chunk['name'] = self.name_table.code(name)
+        else:
+            chunk['name'] = self.name_table.codes(name)
+        if size:
+            self._chunks.append(chunk)
+
+    def item_names(self):
+        '''name of each item, decoded from the name codes'''
+        return np.array(self.names, dtype=object)[self.records['name']] if len(self) else []
+
+    def save(self, path):
+        '''write the records to path (.npy) and the names to path + '.names' '''
+        np.save(path, self.records)
+        with open(path + '.names', 'w') as f:
+            json.dump(self.names, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        '''read back a save(); by default the records are memory-mapped, not copied'''
+        with open(path + '.names') as f:
+            names = json.load(f)
+        return cls(np.load(path, mmap_mode=mmap_mode), names)
+
+    def to_buffer(self):
+        '''(names, buffer) without copying the records, e.g. for a socket or shared memory'''
+        return self.names, np.ascontiguousarray(self.records).data
+
+    @classmethod
+    def from_buffer(cls, names, buf):
+        '''wrap a to_buffer() buffer without copying it'''
+        return cls(np.frombuffer(buf, dtype=cls.dtype), names)
+
+    def __reduce__(self):
+        return (_rebuild, (type(self), self.names, self.records.tostring()))
+
+
+def _rebuild(cls, names, data):
+    return cls.from_buffer(names, data)
+
+
+class CompactKPVs(_CompactItems):
+    '''KeyPointValue items as index, value and name-code columns'''
+    dtype = np.dtype([('index', np.float64), ('value', np.float64), ('name', np.int32)])
+
+    def extend(self, index, value, name):
+        '''add KPVs from arrays of index and value'''
+        self._add({'index': index, 'value': value}, name)
+
+    @classmethod
+    def from_items(cls, kpvs):
+        compact = cls()
+        compact.extend([k.index for k in kpvs], [k.value for k in kpvs], [k.name for k in kpvs])
+        return compact
+
+    def to_items(self):
+        '''KeyPointValue objects, as expected in a KeyPointValueNode'''
+        from analysis_engine.node import KeyPointValue
+        records = self.records
+        return [KeyPointValue(index=index, value=value, name=name)
+                for index, value, name in zip(records['index'].tolist(),
+                                              records['value'].tolist(),
+                                              self.item_names())]
+
+
+class CompactKTIs(_CompactItems):
+    '''KeyTimeInstance items as index and name-code columns'''
+    dtype = np.dtype([('index', np.float64), ('name', np.int32)])
+
+    def extend(self, index, name):
+        '''add KTIs from an array of index'''
+        self._add({'index': index}, name)
+
+    @classmethod
+    def from_items(cls, ktis):
+        compact = cls()
+        compact.extend([k.index for k in ktis], [k.name for k in ktis])
+        return compact
+
+    def to_items(self):
+        '''KeyTimeInstance objects, as expected in a KeyTimeInstanceNode'''
+        from analysis_engine.node import KeyTimeInstance
+        return [KeyTimeInstance(index=index, name=name)
+                for index, name in zip(self.records['index'].tolist(), self.item_names())]
+
+
+def state_change_kpvs(array, prefix, nonzero=False):
+    '''
+    KPVs for every change of state in a multistate array, masked or not, named
+    prefix|state (prefix|masked for masked samples) with the state code as value.
+    nonzero=True skips changes into state code 0.
+    '''
+    data = np.ma.getdata(array)
+    change_points = np.flatnonzero(np.diff(data)) + 1
+    values = data[change_points]
+    if nonzero:
+        change_points = change_points[values != 0]
+        values = values[values != 0]
+    masked = np.ma.getmaskarray(array)[change_points]
+    mapping = getattr(array, 'values_mapping', {})
+    names = [prefix + '|masked' if is_masked else prefix + '|' + mapping.get(value, str(value))
+             for value, is_masked in zip(values.tolist(), masked.tolist())]
+    kpvs = CompactKPVs()
+    kpvs.extend(change_points, values, names)
+    return kpvs
+
+
+def values_at_indices(array, indices, transform=None):
+    '''
+    library.value_at_index() at many indices in one pass: (values, valid).
+    Fractional indices interpolate between the two samples around them, or take
+    the unmasked one; indices outside the array take the end samples.
+    transform (e.g. np.abs) is applied to the gathered samples, not the array.
+    '''
+    data = np.ma.getdata(array)
+    mask = np.ma.getmask(array)
+    index = np.clip(np.asarray(indices, dtype=np.float64), 0, len(data) - 1)
+    low = index.astype(np.int64)
+    high = np.minimum(low + 1, len(data) - 1)
+    r = index - low
+    low_value = data[low].astype(np.float64)
+    high_value = data[high].astype(np.float64)
+    if transform is not None:
+        low_value, high_value = transform(low_value), transform(high_value)
+    values = low_value + r * (high_value - low_value)
+    exact = r == 0
+    if mask is np.ma.nomask:
+        return np.where(exact, low_value, values), np.ones(len(index), dtype=bool)
+    low_masked, high_masked = mask[low], mask[high]
+    values = np.where(exact | high_masked, low_value, np.where(low_masked, high_value, values))
+    valid = np.where(exact, ~low_masked, ~(low_masked & high_masked))
+    return values, valid
+
+
+def snapshot_kpvs(ktis, series):
+    '''
+    KPVs of several parameters at every KTI, as create_kpvs_at_ktis() would
+    make them one node at a time: series is [(kpv name, array, transform or None)].
+    No KPV where the value is masked.
+    '''
+    index = np.array([kti.index for kti in ktis], dtype=np.float64)
+    kpvs = CompactKPVs()
+    for name, array, transform in series:
+        if not len(index) or array is None or not len(array):
+            continue
+        values, valid = values_at_indices(array, index, transform)
+        kpvs.extend(index[valid], values[valid], name)
+    return kpvs
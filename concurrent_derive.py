@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Derive the nodes of one flight on a thread pool, independent branches at once.
+
+staged_helper.derive_parameters_series walks the process order one node at a
+time. Here the process order is cut into waves: a node goes in the first wave
+after all the nodes it depends on. The nodes of a wave are derived together
+on a ThreadPool, which pays off because the heavy NumPy operations release
+the GIL. In tcas_profile the RA Start snapshots, the state-change KPVs and the
+standard response chain overlap like this.
+
+    params = concurrent_derive.derive_parameters_concurrent(flt, node_mgr, process_order,
+                                                            precomputed=flt.parameters, workers=4)
+    params = nb.derive_many(flt, vars(), workers=4)
+
+Waves do not keep the process order: a node may run before one listed ahead
+of it. So every input goes to its node through copy_on_write.protect(), and a
+node that writes to an input (DistanceTravelledInAir zeroing airspeed.array)
+changes only its own copy. Every node then sees its inputs as their producers
+left them, whatever the grouping and timing, and the params are those of the
+serial loop under copy_on_write.CopyOnWriteInputs (nb.derive_many(flt, vars(),
+copy_on_write=True)). The flight's series are never written.
+
+Profile with workers=1: NodeProfiler's timings and memory deltas assume one
+node at a time, and nb.derive_many refuses profiler= with workers=.
+"""
+import logging
+from multiprocessing.pool import ThreadPool
+
+import copy_on_write
+
+logger = logging.getLogger(__name__)
+
+
+def _derived_names(node_mgr, process_order, precomputed):
+    '''the names in the process order that need deriving here'''
+    return [name for name in process_order
+            if name not in node_mgr.hdf_keys and name not in precomputed
+            and hasattr(node_mgr.derived_nodes.get(name), 'get_dependency_names')
+            and node_mgr.get_attribute(name) is None]
+
+
+def waves(node_mgr, process_order, precomputed={}):
+    '''lists of node names, each list depending only on the lists before it, in process order within a list'''
+    derived = _derived_names(node_mgr, process_order, precomputed)
+    level = {}
+    for name in derived:
+        deps = [level[d] for d in node_mgr.derived_nodes[name].get_dependency_names() if d in level]
+        level[name] = max(deps) + 1 if deps else 0
+    result = [[] for _ in range(max(level.values()) + 1)] if level else []
+    for name in derived:
+        result[level[name]].append(name)
+    return result
+
+
+def _dependency(name, params, node_mgr, flight):
+    if name in params:
+        return params[name]
+    attribute = node_mgr.get_attribute(name)
+    if attribute is not None:
+        return attribute
+    return flight.series.get(name) if name in node_mgr.hdf_keys else None
+
+
+def _derive(job):
+    name, node_class, deps = job   # deps already protected, see _protect
+    first_dep = next((d for d in deps if d is not None and getattr(d, 'frequency', None)), None)
+    frequency = first_dep.frequency if first_dep else 1.0
+    offset = first_dep.offset if first_dep else 0.0
+    node = node_class(frequency=frequency, offset=offset)
+    return node.get_derived(deps)
+
+
+def _protect(jobs):
+    '''jobs with copy_on_write.protect() around every input, so no node sees another's writes'''
+    return [(name, node_class, [copy_on_write.protect(d) for d in deps])
+            for name, node_class, deps in jobs]
+
+
+def derive_parameters_concurrent(flight, node_mgr, process_order, precomputed={}, workers=4):
+    '''{name: node} for the process order, as derive_parameters_series makes it, a wave at a time'''
+    params = dict(precomputed)
+    pool = ThreadPool(workers)
+    try:
+        for wave in waves(node_mgr, process_order, precomputed):
+            jobs = []
+            for name in wave:
+                node_class = node_mgr.derived_nodes[name]
+                deps = [_dependency(d, params, node_mgr, flight) for d in node_class.get_dependency_names()]
+                if all(d is None for d in deps):
+                    raise RuntimeError('No dependencies available - Nodes cannot operate without ANY '
+                                       'dependencies available! Node: %s' % node_class.__name__)
+                jobs.append((name, node_class, deps))
+            logger.debug('deriving %d nodes together: %s', len(jobs), ', '.join(wave))
+            for name, result in zip(wave, pool.map(_derive, _protect(jobs), chunksize=1)):
+                params[name] = result
+    finally:
+        pool.close()
+        pool.join()
+    return params
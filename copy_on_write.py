@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Copy-on-write inputs for nodes that write to their arguments.
+
+A few nodes change their inputs in place: DistanceTravelledInAir zeroes
+airspeed.array on the ground, example_profile's TCASRAStart rewrites
+tcas.array and MydictAttribute adds to mydict.value. With shared inputs
+(precomputed=flight.parameters in nb.derive_many, or nodes handed to several
+consumers) that leaks into the flight, so the safe choice was a copy per
+input per node. Under CopyOnWriteInputs each node instead gets a shallow copy
+of each input whose array is a read-only view of the original. The first
+write to that array (item assignment, +=, .mask = ...) moves it onto a
+private copy of its data and mask and carries on, so the array stays the one
+object: self.array = param.array followed by self.array[i] = v writes to the
+node's output, and the original is untouched. Mutable attribute values are
+copied up front.
+
+    with copy_on_write.CopyOnWriteInputs():
+        params = nb.derive_many(flt, vars())     # or nb.derive_many(flt, vars(), copy_on_write=True)
+    copy_on_write.stats()   # {'shared': n, 'bytes_shared': .., 'copies': n, 'bytes_copied': ..}
+
+Slices taken before the first write, and param.array.data, are views of the
+original: writing to them raises, as they are read-only.
+
+Moving an array onto its private copy rebinds its buffer through the
+deprecated ndarray.data setter, which only takes a buffer of the same layout
+as the array. An input that is not contiguous (a strided slice such as
+array[::2]), or any input once numpy drops the setter, is copied by protect()
+up front instead.
+"""
+import copy
+import warnings
+import threading
+import collections
+
+import numpy as np
+
+_stats = collections.Counter()
+_stats_lock = threading.Lock()   # nodes may be derived on several threads, see concurrent_derive.py
+
+
+def stats():
+    '''input arrays shared and copied (and their bytes) since the last reset_stats()'''
+    return dict((k, _stats[k]) for k in ('shared', 'bytes_shared', 'copies', 'bytes_copied', 'attribute_copies'))
+
+
+def reset_stats():
+    _stats.clear()
+
+
+def _rebind(array, data):
+    '''point array at the buffer of data, which has the same shape and layout'''
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)   # the setter is deprecated, not yet removed
+        np.ndarray.data.__set__(array, data)
+
+
+def _can_rebind():
+    '''whether this numpy still lets an array's buffer be swapped'''
+    try:
+        _rebind(np.zeros(2), np.ones(2))
+    except (AttributeError, TypeError):
+        return False
+    return True
+
+_REBIND = _can_rebind()
+
+
+def _nbytes(array):
+    mask = np.ma.getmask(array)
+    return array.nbytes + (mask.nbytes if mask is not np.ma.nomask else 0)
+
+
+class _CopyOnWrite(object):
+    '''mixed in ahead of the array class (MaskedArray, MappedArray, ...) of a shared input'''
+    _cow_base = None
+    _cow_shared = False
+
+    def __array_finalize__(self, obj):
+        super(_CopyOnWrite, self).__array_finalize__(obj)
+        self._cow_shared = False  # slices and results are not the input itself
+
+    def _writable(self):
+        '''
+        from the first write on, this very array holds a private copy of its
+        data and mask, so every name bound to it (param.array, or self.array =
+        param.array) sees the write and the original does not
+        '''
+        if self._cow_shared:
+            private = np.ma.getdata(self).copy(order='K')   # C or Fortran, as the original
+            _rebind(self, private)
+            self.flags.writeable = True
+            if self._mask is not np.ma.nomask:
+                self._mask = self._mask.copy()
+            self._cow_shared = False
+            with _stats_lock:
+                _stats['copies'] += 1
+                _stats['bytes_copied'] += _nbytes(self)
+        return self
+
+    def __setitem__(self, index, value):
+        super(_CopyOnWrite, self._writable()).__setitem__(index, value)
+
+    def _get_mask(self):
+        return np.ma.MaskedArray.mask.fget(self)
+
+    def _set_mask(self, mask):
+        np.ma.MaskedArray.mask.fset(self._writable(), mask)
+
+    mask = property(_get_mask, _set_mask)
+
+    def __reduce__(self):
+        return self.view(self._cow_base).__reduce__()
+
+
+def _inplace(name):
+    def inplace(self, other):
+        return getattr(super(_CopyOnWrite, self._writable()), name)(other)
+    inplace.__name__ = name
+    return inplace
+
+for _name in ('__iadd__', '__isub__', '__imul__', '__idiv__', '__itruediv__', '__ifloordiv__', '__ipow__'):
+    setattr(_CopyOnWrite, _name, _inplace(_name))
+
+_classes = {}
+
+
+def _cow_class(cls):
+    cls = cls._cow_base if issubclass(cls, _CopyOnWrite) else cls   # results of arithmetic on a shared input
+    if cls not in _classes:
+        _classes[cls] = type('CopyOnWrite' + cls.__name__, (_CopyOnWrite, cls), {'_cow_base': cls})
+    return _classes[cls]
+
+
+def _sharable(array):
+    '''a buffer of the array's own layout can be swapped in on the first write'''
+    return _REBIND and (array.flags.c_contiguous or array.flags.f_contiguous)
+
+
+def protect(node):
+    '''
+    a shallow copy of an input node whose array (a masked array) is shared
+    until written, or whose dict/list value is its own; other inputs as they are
+    '''
+    if node is None:
+        return node
+    array = getattr(node, 'array', None)
+    if isinstance(array, np.ma.MaskedArray) and not _sharable(array):
+        own = copy.copy(node)
+        own.array = array.copy()
+        with _stats_lock:
+            _stats['copies'] += 1
+            _stats['bytes_copied'] += _nbytes(array)
+        return own
+    if isinstance(array, np.ma.MaskedArray):
+        shared = copy.copy(node)
+        view = array.view(_cow_class(type(array)))
+        view.flags.writeable = False
+        if view._mask is not np.ma.nomask:
+            view._mask = view._mask.view()
+            view._mask.flags.writeable = False
+        view._cow_shared = True
+        shared.array = view
+        with _stats_lock:
+            _stats['shared'] += 1
+            _stats['bytes_shared'] += _nbytes(array)
+        return shared
+    value = getattr(node, 'value', None)
+    if isinstance(value, (dict, list)):
+        own = copy.copy(node)
+        own.value = copy.copy(value)
+        with _stats_lock:
+            _stats['attribute_copies'] += 1
+        return own
+    return node
+
+
+class CopyOnWriteInputs(object):
+    '''context manager: every node derived inside gets its inputs through protect()'''
+    def __init__(self, node_base=None):
+        self.node_base = node_base   # class whose get_derived is wrapped; analysis_engine's Node by default
+        self._original = None
+
+    def __enter__(self):
+        if self.node_base is None:
+            import analysis_engine.node as node
+            self.node_base = node.Node
+        original = self._original = self.node_base.get_derived
+        def protected_get_derived(node, args):
+            return original(node, [protect(arg) for arg in args])
+        self.node_base.get_derived = protected_get_derived
+        return self
+
+    def __exit__(self, *exc_info):
+        self.node_base.get_derived = self._original
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Masked-data diagnostics for every series of a flight in one vectorised pass.
+
+Instead of np.ma.clump_masked() per series, the masks of all series are laid
+end to end (with an unmasked separator) and the gap edges found with a single
+np.diff. That gives, per series: samples, masked samples, number of masked
+gaps and the longest gap.
+
+    stats = data_quality.flight_mask_stats(flt)       # a loaded Flight
+    stats = data_quality.file_mask_stats(filepath)    # HDF5 masks only, cached per file
+    all_stats = data_quality.scan(FILES_TO_PROCESS, processes=8)
+    problems = stats.check({'ILS Glideslope': {'max_masked_fraction': 0.2, 'max_gap_sec': 10}})
+    files, dropped = data_quality.prune(all_stats, THRESHOLDS)
+
+A file scan() cannot read gets None instead of MaskStats, with a warning, and
+the rest of the scan carries on; prune() keeps such files, as it cannot judge them.
+"""
+import os
+import logging
+import multiprocessing
+
+import numpy as np
+
+from param_index import CatalogueCache, file_signature
+
+logger = logging.getLogger(__name__)
+
+
+class MaskStats(object):
+    '''per-series mask statistics of one flight, as parallel arrays'''
+    def __init__(self, names, frequency, samples, masked, gaps, longest_gap):
+        self.names = list(names)
+        self.frequency = np.asarray(frequency, dtype=float)
+        self.samples = np.asarray(samples)
+        self.masked = np.asarray(masked)
+        self.gaps = np.asarray(gaps)
+        self.longest_gap = np.asarray(longest_gap)     # samples
+        self._pos = dict((n, i) for i, n in enumerate(self.names))
+
+    @classmethod
+    def from_masks(cls, names, masks, frequency):
+        '''statistics of a list of boolean masks, one per series'''
+        masks = [np.asarray(m, dtype=bool).ravel() for m in masks]
+        lengths = np.array([len(m) for m in masks], dtype=np.int64)
+        n = len(masks)
+        # series i occupies [offsets[i], offsets[i] + lengths[i]), followed by one unmasked separator
+        offsets = np.concatenate([[0], np.cumsum(lengths + 1)[:-1]]).astype(np.int64)
+        joined = np.zeros(int(lengths.sum()) + n + 1, dtype=np.int8)
+        if n:
+            joined[1:] = np.concatenate([np.append(m, False) for m in masks])
+        edges = np.diff(joined)
+        starts = np.flatnonzero(edges == 1)        # first masked sample, shifted by the leading 0
+        stops = np.flatnonzero(edges == -1)
+        gap_lengths = stops - starts
+        series = np.searchsorted(offsets, starts, side='right') - 1
+        gaps = np.bincount(series, minlength=n) if n else np.zeros(0, dtype=int)
+        masked = np.bincount(series, weights=gap_lengths, minlength=n).astype(np.int64) if n \
+            else np.zeros(0, dtype=np.int64)
+        longest = np.zeros(n, dtype=np.int64)
+        if len(series):
+            np.maximum.at(longest, series, gap_lengths)
+        return cls(names, frequency, lengths, masked, gaps, longest)
+
+    def __len__(self):
+        return len(self.names)
+
+    def masked_fraction(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.samples > 0, self.masked / self.samples.astype(float), np.nan)
+
+    def longest_gap_sec(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.frequency > 0, self.longest_gap / self.frequency, np.nan)
+
+    def get(self, name):
+        '''{'samples', 'masked', 'gaps', 'longest_gap', 'masked_fraction', 'longest_gap_sec'} for one series'''
+        i = self._pos[name]
+        return {'samples': int(self.samples[i]), 'masked': int(self.masked[i]), 'gaps': int(self.gaps[i]),
+                'longest_gap': int(self.longest_gap[i]), 'masked_fraction': float(self.masked_fraction()[i]),
+                'longest_gap_sec': float(self.longest_gap_sec()[i])}
+
+    def worst(self, top=20, key='gaps'):
+        '''names of the series with the most gaps (or the highest 'masked' / 'longest_gap')'''
+        order = np.argsort(-getattr(self, key), kind='mergesort')
+        return [self.names[i] for i in order[:top]]
+
+    def check(self, thresholds):
+        '''
+        [(series, reason)] breaking thresholds = {series: {'max_masked_fraction': f,
+        'max_gaps': n, 'max_gap_sec': s}}; a missing series is a problem too
+        '''
+        problems = []
+        for name, limits in sorted(thresholds.items()):
+            if name not in self._pos:
+                problems.append((name, 'not recorded'))
+                continue
+            stats = self.get(name)
+            if stats['masked_fraction'] > limits.get('max_masked_fraction', 1.0):
+                problems.append((name, 'masked fraction %.3f' % stats['masked_fraction']))
+            if stats['gaps'] > limits.get('max_gaps', np.inf):
+                problems.append((name, '%d masked gaps' % stats['gaps']))
+            if stats['longest_gap_sec'] > limits.get('max_gap_sec', np.inf):
+                problems.append((name, 'masked gap of %.1f sec' % stats['longest_gap_sec']))
+        return problems
+
+
+def flight_mask_stats(flight):
+    '''MaskStats of every series of a loaded Flight (or any {name: Parameter} with .series)'''
+    series = flight.series
+    names = sorted(series.keys())
+    return MaskStats.from_masks(names, [np.ma.getmaskarray(series[n].array) for n in names],
+                                [series[n].frequency for n in names])
+
+
+def _read_mask_stats(filepath):
+    import h5py
+    with h5py.File(filepath, 'r') as hdf:
+        groups = hdf['series']
+        names = sorted(groups.keys())
+        masks = [groups[n]['mask'][...] if 'mask' in groups[n] else np.zeros(groups[n]['data'].shape[0], bool)
+                 for n in names]
+        frequency = [float(groups[n].attrs.get('frequency', 0.0)) for n in names]
+    return MaskStats.from_masks(names, masks, frequency)
+
+
+_cache = CatalogueCache(os.path.join(os.path.expanduser('~'), '.asias_fds', 'mask_stats'))
+
+
+def file_mask_stats(filepath):
+    '''MaskStats from the mask datasets of an HDF5 file, cached until the file changes'''
+    return _cache.get(filepath, file_signature(filepath), lambda: _read_mask_stats(filepath))
+
+
+def _file_mask_stats(filepath):
+    '''(filepath, MaskStats, None), or (filepath, None, error) when the file cannot be read'''
+    try:
+        return filepath, file_mask_stats(filepath), None
+    except (IOError, OSError, KeyError) as err:
+        return filepath, None, str(err)
+
+
+def scan(files, processes=None):
+    '''{filepath: MaskStats, or None when unreadable} for a flight set, files read on `processes` workers'''
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_file_mask_stats, files, chunksize=4)
+    finally:
+        pool.close()
+        pool.join()
+    for filepath, stats, error in results:
+        if error is not None:
+            logger.warning('no mask statistics from %s: %s', filepath, error)
+    return dict((filepath, stats) for filepath, stats, error in results)
+
+
+def prune(stats_by_file, thresholds):
+    '''
+    (files passing, {file: problems}) for scan() results and check() thresholds;
+    files scan() could not read are kept
+    '''
+    keep, dropped = [], {}
+    unreadable = [filepath for filepath, stats in stats_by_file.items() if stats is None]
+    if unreadable:
+        logger.warning('kept %d files that could not be checked, e.g. %s', len(unreadable), sorted(unreadable)[0])
+    for filepath, stats in sorted(stats_by_file.items()):
+        if stats is None:
+            keep.append(filepath)
+            continue
+        problems = stats.check(thresholds)
+        if problems:
+            dropped[filepath] = problems
+        else:
+            keep.append(filepath)
+    return keep, dropped
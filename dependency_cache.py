@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Memoised staged_helper.dependency_order().
+
+The process order depends only on the nodes requested, the series available
+in the file and the aircraft info the nodes can operate on, and those are the
+same for every flight of a fleet/LFL. The cache keys the (process order, graph)
+pair on exactly that, so a sweep over three fleets sorts the graph about three
+times, not once per flight.
+
+    process_order, graph = dependency_cache.dependency_order(node_mgr)
+    dependency_cache.install()   # staged_helper.run_profile/run_analyzer use the cache too
+    dependency_cache.info()      # {'hits': .., 'misses': .., 'evictions': .., 'size': .., 'maxsize': ..}
+"""
+import inspect
+import collections
+
+# aircraft info whose value (not just presence) is part of the key
+AIRCRAFT_KEYS = ('Family', 'Series', 'Manufacturer', 'Model', 'Frame', 'Engine Series', 'Engine Type')
+
+
+def order_key(node_mgr):
+    '''hashable signature of everything the dependency order depends on'''
+    aircraft_info = node_mgr.aircraft_info or {}
+    achieved = getattr(node_mgr, 'achieved_flight_record', None) or {}
+    return (tuple(sorted(node_mgr.requested)),
+            frozenset(node_mgr.hdf_keys),
+            frozenset(k for k, v in aircraft_info.items() if v is not None),
+            tuple((k, aircraft_info.get(k)) for k in AIRCRAFT_KEYS),
+            frozenset(achieved),
+            # node classes by identity, so a reloaded profile module is a new key
+            frozenset((name, id(cls)) for name, cls in node_mgr.derived_nodes.items() if inspect.isclass(cls)))
+
+
+class DependencyOrderCache(object):
+    '''LRU cache of (process order, graph) by order_key(node_mgr)'''
+    def __init__(self, maxsize=32, order=None):
+        self.maxsize = maxsize
+        self._order = order   # the uncached dependency_order(node_mgr, draw); staged_helper's by default
+        self._cache = collections.OrderedDict()
+        self.stats = collections.Counter()
+
+    def dependency_order(self, node_mgr, draw=False):
+        '''(process order, graph); the order is a fresh list, the graph is shared between hits'''
+        if draw:  # drawing happens inside the uncached call
+            return self._compute(node_mgr, draw)
+        key = order_key(node_mgr)
+        if key in self._cache:
+            self.stats['hits'] += 1
+            process_order, graph = self._cache.pop(key)
+        else:
+            self.stats['misses'] += 1
+            process_order, graph = self._compute(node_mgr, draw)
+            if len(self._cache) >= self.maxsize:
+                self._cache.popitem(last=False)
+                self.stats['evictions'] += 1
+        self._cache[key] = (process_order, graph)   # most recently used last
+        return list(process_order), graph
+
+    def _compute(self, node_mgr, draw):
+        order = self._order
+        if order is None:
+            import staged_helper
+            order = _helper_dependency_order or staged_helper.dependency_order
+        return order(node_mgr, draw=draw)
+
+    def info(self):
+        return {'hits': self.stats['hits'], 'misses': self.stats['misses'],
+                'evictions': self.stats['evictions'], 'size': len(self._cache), 'maxsize': self.maxsize}
+
+    def clear(self):
+        self._cache.clear()
+        self.stats.clear()
+
+
+_cache = DependencyOrderCache()
+_helper_dependency_order = None   # the original, once install() has replaced it
+
+
+def dependency_order(node_mgr, draw=False):
+    '''drop-in for staged_helper.dependency_order(), from the process-wide cache'''
+    return _cache.dependency_order(node_mgr, draw=draw)
+
+
+def info():
+    return _cache.info()
+
+
+def install():
+    '''route staged_helper.dependency_order (and so run_profile/run_analyzer) through the cache'''
+    global _helper_dependency_order
+    import staged_helper
+    if staged_helper.dependency_order is not dependency_order:
+        _helper_dependency_order = staged_helper.dependency_order
+        staged_helper.dependency_order = dependency_order
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Write-behind, compressed HDF5 storage of derived parameters.
+
+Writing the DerivedParameterNode outputs of a flight ('Distance Travelled In
+Air', 'TCAS RA Standard Response', ...) inside the flight loop puts the disk
+on the critical path. A DerivedWriter takes the arrays of a flight, queues
+them and returns; a background thread writes each flight to its own file,
+chunked and compressed (lzf by default, blosc through hdf5plugin when it is
+installed), while the next flight is derived. Optionally only the samples
+around sections of interest, such as the RA sections or the approaches, are
+kept; the rest is masked and compresses to almost nothing.
+
+    with derived_writer.DerivedWriter(output_dir, compression='lzf') as writer:
+        for flt in flights:
+            params = nb.derive_many(flt, vars())
+            writer.submit(flt.name, params, names=['TCAS RA Standard Response'],
+                          sections=params['TCAS RA Sections'], margin=15.0)
+    writer.stats()   # {'files': n, 'datasets': n, 'bytes_in': .., 'bytes_written': .., 'seconds': ..}
+
+    derived_writer.install(output_dir, sections='TCAS RA Sections')   # every derive_parameters_series
+
+Files follow the hdfaccess layout: series/<name>/data and series/<name>/mask,
+with frequency, offset, units and values_mapping (json) as attributes. A file
+is written under a temporary name and renamed, so readers never see half of one.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+import Queue
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 4096   # samples per chunk: 4096 float32 samples = 16kB
+
+
+def compression_options(compression):
+    '''h5py create_dataset keywords for 'lzf', 'gzip', 'blosc' or None'''
+    if compression == 'blosc':
+        try:
+            import hdf5plugin
+            return dict(hdf5plugin.Blosc(cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.SHUFFLE))
+        except ImportError:
+            logger.warning('hdf5plugin is not installed, using lzf instead of blosc')
+            compression = 'lzf'
+    if compression == 'lzf':
+        return {'compression': 'lzf', 'shuffle': True}
+    if compression == 'gzip':
+        return {'compression': 'gzip', 'compression_opts': 4, 'shuffle': True}
+    if compression is None:
+        return {}
+    raise ValueError('unknown compression %r' % (compression,))
+
+
+def section_windows(length, frequency, sections, margin=0.0):
+    '''
+    bool per sample of a parameter at frequency: within margin seconds of one
+    of sections (a section node: .frequency, and items with start_edge/stop_edge)
+    '''
+    keep = np.zeros(length, dtype=bool)
+    section_frequency = getattr(sections, 'frequency', None) or frequency
+    for section in sections:
+        start = (section.start_edge / float(section_frequency) - margin) * frequency
+        stop = (section.stop_edge / float(section_frequency) + margin) * frequency
+        keep[max(int(start), 0):max(int(np.ceil(stop)) + 1, 0)] = True
+    return keep
+
+
+def record(node, keep=None):
+    '''what the writer stores of a derived parameter node: data, mask and attributes'''
+    array = node.array
+    mask = np.ma.getmaskarray(array) if np.ma.is_masked(array) or keep is not None else None
+    data = np.ma.getdata(array)
+    if keep is not None:
+        data = np.where(keep, data, 0).astype(data.dtype)   # a copy: the node's array is left alone
+        mask = mask | ~keep
+    values_mapping = getattr(array, 'values_mapping', None)
+    return {'data': data, 'mask': mask,
+            'frequency': getattr(node, 'frequency', None), 'offset': getattr(node, 'offset', None),
+            'units': getattr(node, 'units', None),
+            'values_mapping': json.dumps(dict((str(k), v) for k, v in values_mapping.items()))
+                              if values_mapping else None}
+
+
+def write_hdf5(path, records, compression='lzf', chunk_size=CHUNK_SIZE):
+    '''write [(name, record)] to a new HDF5 file at path; returns the bytes on disk'''
+    import h5py
+    options = compression_options(compression)
+    tmp = path + '.tmp'
+    with h5py.File(tmp, 'w') as hdf:
+        series = hdf.create_group('series')
+        for name, rec in records:
+            group = series.create_group(name)
+            for key in ('data', 'mask'):
+                values = rec[key]
+                if values is None:
+                    continue
+                if len(values):
+                    group.create_dataset(key, data=values, chunks=(min(len(values), chunk_size),), **options)
+                else:
+                    group.create_dataset(key, data=values)
+            for key in ('frequency', 'offset', 'units', 'values_mapping'):
+                if rec[key] is not None:
+                    group.attrs[key] = rec[key]
+    os.rename(tmp, path)
+    return os.path.getsize(path)
+
+
+class DerivedWriter(object):
+    '''
+    Queues the derived parameters of each flight and writes them to
+    output_dir/<flight>.hdf5 on a background thread. At most max_pending
+    flights wait in the queue; submit() blocks beyond that.
+    '''
+    def __init__(self, output_dir, compression='lzf', chunk_size=CHUNK_SIZE, max_pending=2, write=None):
+        self.output_dir = output_dir
+        self.compression = compression
+        self.chunk_size = chunk_size
+        self.write = write or write_hdf5   # write(path, records, compression, chunk_size) -> bytes on disk
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        compression_options(compression)   # unknown compression fails here, not on the thread
+        self._queue = Queue.Queue(max_pending)
+        self._stats = {'files': 0, 'datasets': 0, 'bytes_in': 0, 'bytes_written': 0, 'seconds': 0.0}
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='derived-writer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, flight_name, params, names=None, sections=None, margin=0.0):
+        '''
+        queue the derived parameters among params (all with a masked array, or
+        only names); sections limits them to the samples within margin seconds
+        of those sections
+        '''
+        self._raise_error()
+        records = []
+        for name in sorted(names if names is not None else params):
+            node = params.get(name)
+            if not isinstance(getattr(node, 'array', None), np.ma.MaskedArray):
+                continue   # KPVs, KTIs, sections and attributes go to the database, not here
+            keep = None
+            if sections is not None:
+                keep = section_windows(len(node.array), getattr(node, 'frequency', 1.0) or 1.0,
+                                       sections, margin)
+            records.append((name, record(node, keep)))
+        path = os.path.join(self.output_dir, os.path.basename(flight_name).replace('.hdf5', '') + '.hdf5')
+        self._queue.put((path, records))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                path, records = job
+                t0 = time.time()
+                written = self.write(path, records, self.compression, self.chunk_size)
+                self._stats['seconds'] += time.time() - t0
+                self._stats['files'] += 1
+                self._stats['datasets'] += len(records)
+                self._stats['bytes_in'] += sum(r['data'].nbytes + (r['mask'].nbytes if r['mask'] is not None else 0)
+                                               for _, r in records)
+                self._stats['bytes_written'] += written
+            except Exception as err:
+                logger.exception('derived writer failed on %s', job[0])
+                self._error = self._error or err
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def flush(self):
+        '''wait until everything submitted is on disk'''
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def stats(self):
+        '''files, datasets, bytes in and on disk, and seconds spent writing; pending flights'''
+        result = dict(self._stats)
+        result['pending'] = self._queue.qsize()
+        return result
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_writer = None
+_options = {}
+_helper_derive_parameters_series = None   # the original, once install() has replaced it
+
+
+def _flight_name(flight):
+    for attr in ('filepath', 'file_path', 'name'):
+        value = getattr(flight, attr, None)
+        if value:
+            return value
+    return 'flight-%d' % (_writer.stats()['files'] + _writer.stats()['pending'])
+
+
+def derive_parameters_series(flight, node_mgr, process_order, *args, **kwargs):
+    '''staged_helper.derive_parameters_series() handing the requested derived parameters to the writer'''
+    res, params = _helper_derive_parameters_series(flight, node_mgr, process_order, *args, **kwargs)
+    sections = _options.get('sections')
+    _writer.submit(_flight_name(flight), params, names=[n for n in node_mgr.requested if n in params],
+                   sections=params.get(sections) if sections else None, margin=_options.get('margin', 0.0))
+    return res, params
+
+
+def install(output_dir, compression='lzf', sections=None, margin=15.0):
+    '''
+    write the requested derived parameters of every staged_helper.derive_parameters_series
+    call behind the derivation; sections names a section node to limit them to
+    '''
+    global _writer, _helper_derive_parameters_series
+    import staged_helper
+    if _writer is None:
+        _writer = DerivedWriter(output_dir, compression=compression)
+        atexit.register(_writer.close)
+    _options.update(sections=sections, margin=margin)
+    if staged_helper.derive_parameters_series is not derive_parameters_series:
+        _helper_derive_parameters_series = staged_helper.derive_parameters_series
+        staged_helper.derive_parameters_series = derive_parameters_series
+    return _writer
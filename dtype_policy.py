@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""
+Compact dtypes for the arrays of profile-derived parameters.
+
+Derived parameters come out of their nodes as float64, and multistate ones as
+int64 MappedArrays, whatever they hold. Under the policy a continuous series is
+stored as float32 when no unmasked sample moves by more than atol (in the
+parameter's own units) in the narrowing, and a multistate series as the
+smallest of int8/int16/int32 that holds every code of its values_mapping. A
+series that would not survive the narrowing (large counts, epoch seconds) is
+left as it is.
+
+Only the profile's requested nodes are narrowed, which are the nodes the sink
+stores, and no node reads an array the policy has narrowed: a requested node
+that nothing else consumes is narrowed as it is derived, and the others once
+derivation is over. So each stored value is within atol of its float64 value,
+and errors cannot build up downstream (integrating a float32 airspeed, say).
+The exceptions are the few nodes that allocate with float_dtype() themselves
+(TCASRAStandardResponse, the UA sustained helpers), whose values are fpm and
+feet compared against thresholds.
+
+    with dtype_policy.DtypePolicy(dtype_policy.sinks(node_mgr, process_order)):
+        res, params = helper.derive_parameters_series(flight, node_mgr, process_order, precomputed=...)
+    dtype_policy.compact_requested(node_mgr, params)
+    dtype_policy.stats()   # {'narrowed': n, 'kept': n, 'bytes_saved': ..}
+
+    dtype_policy.install()          # every derive_parameters_series in this process (run_profile, run_analyzer)
+    dtype_policy.set_policy(atol=0.001)
+
+Until install() or set_policy() is called, or inside a DtypePolicy block,
+there is no policy: float_dtype() is float64 and nodes allocate as before.
+"""
+import collections
+
+import numpy as np
+
+from node_release import consumer_counts
+
+_DEFAULT_POLICY = {'float_dtype': np.float32, 'atol': 0.01, 'state_codes': True}
+_policy = dict(_DEFAULT_POLICY, active=False)
+_stats = collections.Counter()
+
+
+def set_policy(float_dtype=np.float32, atol=0.01, state_codes=True):
+    '''
+    float_dtype: dtype continuous series are narrowed to (np.float64 to leave them)
+    atol: largest change, in the parameter's units, the float narrowing may make
+    state_codes: narrow the codes of multistate series
+    '''
+    _policy.update(float_dtype=float_dtype, atol=atol, state_codes=state_codes, active=True)
+
+
+def reset_policy():
+    '''no policy: new arrays are float64 again'''
+    _policy.clear()
+    _policy.update(_DEFAULT_POLICY, active=False)
+
+
+def float_dtype():
+    '''the dtype new continuous arrays are allocated with: float64 unless a policy is in force'''
+    return np.dtype(_policy['float_dtype'] if _policy['active'] else np.float64)
+
+
+def stats():
+    '''arrays narrowed and kept, and the bytes saved, since the last reset_stats()'''
+    return dict((k, _stats[k]) for k in ('narrowed', 'kept', 'bytes_saved'))
+
+
+def reset_stats():
+    _stats.clear()
+
+
+def state_dtype(codes):
+    '''the smallest signed integer dtype holding every code'''
+    codes = list(codes)
+    lo, hi = (min(codes), max(codes)) if codes else (0, 0)
+    for dtype in (np.int8, np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _narrow_float(array, atol):
+    '''array as the policy's float dtype if no unmasked sample changes by more than atol, else None'''
+    dtype = np.dtype(_policy['float_dtype'])
+    if array.dtype.kind != 'f' or array.dtype.itemsize <= dtype.itemsize:
+        return None
+    data = np.ma.getdata(array)
+    narrow = data.astype(dtype)
+    with np.errstate(invalid='ignore', over='ignore'):
+        error = np.abs(narrow.astype(data.dtype) - data)
+    error[~np.isfinite(data)] = 0           # nan and inf carry over as they are
+    error[np.ma.getmaskarray(array)] = 0    # so do masked samples
+    if error.max() > atol:
+        return None
+    return array.astype(dtype)
+
+
+def _narrow_states(array):
+    '''a MappedArray's codes as the smallest integer dtype that holds its mapping, else None'''
+    dtype = state_dtype(array.values_mapping)
+    if array.dtype.kind not in 'iu' or array.dtype.itemsize <= dtype.itemsize:
+        return None
+    narrow = array.astype(dtype)
+    narrow.values_mapping = array.values_mapping
+    return narrow
+
+
+def compact(array, atol=None):
+    '''array with the policy dtype where it applies and is within atol; otherwise array itself'''
+    if not isinstance(array, np.ma.MaskedArray) or not len(array):
+        return array
+    if hasattr(array, 'values_mapping'):
+        narrow = _narrow_states(array) if _policy['state_codes'] else None
+    else:
+        narrow = _narrow_float(array, _policy['atol'] if atol is None else atol)
+    if narrow is None:
+        _stats['kept'] += 1
+        return array
+    _stats['narrowed'] += 1
+    _stats['bytes_saved'] += array.nbytes - narrow.nbytes
+    return narrow
+
+
+def compact_node(node, atol=None):
+    '''node with its array compacted in place; nodes without a masked array are left alone'''
+    array = getattr(node, 'array', None)
+    if isinstance(array, np.ma.MaskedArray):
+        node.array = compact(array, atol)
+    return node
+
+
+def sinks(node_mgr, process_order):
+    '''the requested nodes no node in the process order reads: safe to narrow as they are derived'''
+    counts = consumer_counts(node_mgr, process_order)
+    return set(name for name in node_mgr.requested if not counts[name])
+
+
+def compact_requested(node_mgr, params, precomputed={}):
+    '''compact the requested nodes among params, once nothing will read them again'''
+    for name in node_mgr.requested:
+        if name in params and name not in precomputed:   # precomputed nodes belong to the Flight
+            compact_node(params[name])
+    return params
+
+
+class DtypePolicy(object):
+    '''
+    context manager: the policy is in force inside (float_dtype() allocates
+    narrow), and the nodes named in names are compacted as they are derived
+    '''
+    def __init__(self, names=(), node_base=None):
+        self.names = set(names)
+        self.node_base = node_base   # class whose get_derived is wrapped; analysis_engine's Node by default
+        self._original = None
+        self._active = None
+
+    def __enter__(self):
+        if self.node_base is None:
+            import analysis_engine.node as node
+            self.node_base = node.Node
+        self._active, _policy['active'] = _policy['active'], True
+        original = self._original = self.node_base.get_derived
+        names = self.names
+        def compact_get_derived(node, args):
+            result = original(node, args)
+            if getattr(node, 'name', None) in names:
+                compact_node(node)
+            return result
+        self.node_base.get_derived = compact_get_derived
+        return self
+
+    def __exit__(self, *exc_info):
+        self.node_base.get_derived = self._original
+        _policy['active'] = self._active
+
+
+_helper_derive_parameters_series = None   # the original, once install() has replaced it
+
+
+def derive_parameters_series(flight, node_mgr, process_order, *args, **kwargs):
+    '''staged_helper.derive_parameters_series() with the requested nodes compacted'''
+    with DtypePolicy(sinks(node_mgr, process_order)):
+        res, params = _helper_derive_parameters_series(flight, node_mgr, process_order, *args, **kwargs)
+    compact_requested(node_mgr, params, kwargs.get('precomputed') or {})
+    return res, params
+
+
+def install(**policy):
+    '''
+    compact the requested nodes of every staged_helper.derive_parameters_series
+    call; policy: set_policy() keywords
+    '''
+    global _helper_derive_parameters_series
+    import staged_helper
+    set_policy(**policy)
+    if staged_helper.derive_parameters_series is not derive_parameters_series:
+        _helper_derive_parameters_series = staged_helper.derive_parameters_series
+        staged_helper.derive_parameters_series = derive_parameters_series
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+The staged_helper replacements a profile engine installs before a run.
+
+Each IPython engine of a parallel profile calls install() at the top of its
+eng_profile(), before staged_helper.run_profile/run_analyzer. The node map and
+process order caches are always on; releasing intermediate arrays and compact
+dtypes change what the nodes and the sink see, so they are off unless asked for.
+
+    def eng_profile():
+        import engine_setup
+        engine_setup.install(release=release_nodes, compact_dtypes=compact_dtypes)
+"""
+import node_registry
+import dependency_cache
+import node_release
+import dtype_policy
+
+
+def install(release=False, compact_dtypes=False):
+    '''
+    release: free intermediate arrays after their last consumer (node_release.py)
+    compact_dtypes: store the requested nodes as float32 and int8 state codes (dtype_policy.py)
+    '''
+    node_registry.install()     # reuse the node map between runs on this engine
+    dependency_cache.install()  # and the process order between flights of a fleet
+    if release:
+        node_release.install()
+    if compact_dtypes:
+        dtype_policy.install()
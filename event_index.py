@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Sorted-index lookups of events, built once per flight instead of scanned per query.
+
+    aps = event_index.EventIndex(ap_offs)            # a KTI node
+    ap_off = aps.next_after(ra.start, within_slice=ra)    # as ap_offs.get_next()
+    gear_moves = event_index.TransitionIndex(gear.array, 0.5)
+    index = gear_moves.last_before(touchdown.index)  # as index_at_value() scanning back
+
+Each lookup is a np.searchsorted on the sorted event indices, so flights with
+many touch-and-gos or long RA series no longer rescan the node or the array.
+"""
+import numpy as np
+
+
+class EventIndex(object):
+    '''the items of a KTI (or KPV) node, sorted by index'''
+    def __init__(self, items, name=None):
+        items = [item for item in items if name is None or item.name == name]
+        self.items = sorted(items, key=lambda item: item.index)
+        self.index = np.array([item.index for item in self.items], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _first(self, pos, within_slice):
+        if within_slice is not None and within_slice.start is not None:
+            pos = max(pos, np.searchsorted(self.index, within_slice.start, side='left'))
+        if pos >= len(self.index):
+            return None
+        if within_slice is not None and within_slice.stop is not None and self.index[pos] >= within_slice.stop:
+            return None
+        return self.items[pos]
+
+    def next_after(self, index, within_slice=None):
+        '''first item with index > index (and start <= item.index < stop), like get_next; else None'''
+        return self._first(np.searchsorted(self.index, index, side='right'), within_slice)
+
+    def last_before(self, index, within_slice=None):
+        '''last item with index < index (and inside within_slice), like get_previous; else None'''
+        pos = np.searchsorted(self.index, index, side='left') - 1
+        if within_slice is not None and within_slice.stop is not None:
+            pos = min(pos, np.searchsorted(self.index, within_slice.stop, side='left') - 1)
+        if pos < 0:
+            return None
+        if within_slice is not None and within_slice.start is not None and self.index[pos] < within_slice.start:
+            return None
+        return self.items[pos]
+
+
+class TransitionIndex(object):
+    '''
+    fractional indices where a parameter crosses a threshold (masked samples
+    included, as index_at_value() on array.data), interpolated the same way
+    '''
+    def __init__(self, array, threshold):
+        diff = np.ma.getdata(array).astype(np.float64) - threshold
+        before, after = diff[:-1], diff[1:]
+        crossing = (before * after < 0) | ((after == 0) & (before != 0))
+        j = np.flatnonzero(crossing)
+        self.index = j + before[j] / (before[j] - after[j])
+
+    def __len__(self):
+        return len(self.index)
+
+    def last_before(self, index):
+        '''latest crossing at or before index, or None'''
+        pos = np.searchsorted(self.index, index, side='right') - 1
+        return float(self.index[pos]) if pos >= 0 else None
+
+    def next_after(self, index):
+        '''earliest crossing after index, or None'''
+        pos = np.searchsorted(self.index, index, side='right')
+        return float(self.index[pos]) if pos < len(self.index) else None
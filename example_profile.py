@@ -32,7 +32,9 @@ from analysis_engine.library import (integrate, repair_mask, index_at_value, all
 # asias_fds stuff
 import analyser_custom_settings as settings
 import staged_helper  as helper 
-import fds_oracle
+from lazy_import import LazyModule
+fds_oracle = LazyModule('fds_oracle')  # Oracle client loads only for SQL flight sets
+import supervised_run
 
    
 ### Section 2: measure definitions -- attributes, KTI, phase/section, KPV, DerivedParameter
@@ -141,7 +143,7 @@ class DistanceTravelledInAir(DerivedParameterNode):
     units='nm'
     def derive(self, airspeed=P('Airspeed True'), grounded=S('Grounded') ):
         for section in grounded:                      # zero out travel on the ground
-            airspeed.array[section.slice]=0.0         # this is already a copy 
+            airspeed.array[section.slice]=0.0         # a copy, or copied on this first write (copy_on_write.py)
         repaired_array = repair_mask(airspeed.array)  # to avoid integration hiccups 
         adist      = integrate( repaired_array, airspeed.frequency, scale=1.0/3600.0 )
         self.array = adist
@@ -271,6 +273,9 @@ if __name__=='__main__':
     LOG_LEVEL = 'WARNING'       
     MAKE_KML_FILES = False
     IS_PARALLEL = False
+    SUPERVISED = False   # each flight in a watched worker with a timeout, see supervised_run.py
+    RELEASE_NODES = False    # free intermediate derived arrays after their last consumer (node_release.py)
+    COMPACT_DTYPES = False   # store requested derived parameters as float32 / int8 codes (dtype_policy.py)
     ###############################################################
     module_names = [ os.path.basename(__file__).replace('.py','') ]#helper.get_short_profile_name(__file__)   # profile name = the name of this file
     print 'profile', PROFILE_NAME 
@@ -282,9 +287,12 @@ if __name__=='__main__':
         print "Run 'ipcluster start -n 10' from the command line first!"
         dview = helper.parallel_directview(PROFILE_NAME, module_names , FILE_REPOSITORY, 
                                                                LOG_LEVEL, FILES_TO_PROCESS, COMMENT, MAKE_KML_FILES)
+        dview['release_nodes'] = RELEASE_NODES
+        dview['compact_dtypes'] = COMPACT_DTYPES
         def eng_profile():
-            import staged_helper
+            import staged_helper, engine_setup
             reload(staged_helper)       
+            engine_setup.install(release=release_nodes, compact_dtypes=compact_dtypes)
             status = staged_helper.run_profile(PROFILE_NAME , module_names, LOG_LEVEL, files_to_process, 
                                     COMMENT, MAKE_KML_FILES, file_repository, save_oracle=True, mortal=True )
             return status
@@ -296,6 +304,11 @@ if __name__=='__main__':
         client.clear()
         client.close()
 
+    elif SUPERVISED:
+        status = supervised_run.run_profile_supervised(PROFILE_NAME , module_names, LOG_LEVEL, FILES_TO_PROCESS, 
+                                COMMENT, MAKE_KML_FILES, FILE_REPOSITORY, save_oracle=True,
+                                timeout=600, flights_per_worker=50, retries=1)
+        print 'flight results', dict(status['counts'])
     else:
         status=helper.run_profile(PROFILE_NAME , module_names, LOG_LEVEL, FILES_TO_PROCESS, 
                                 COMMENT, MAKE_KML_FILES, FILE_REPOSITORY, save_oracle=True, mortal=True )
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+Local, size-bounded LRU cache of repository HDF5 files.
+
+Flight sets come from repositories such as 'central', 'linux', 'local' or
+/opt/scratch, often over a VPN, and the sweeps (ra_sfo_sweep, ra_redo,
+ra_quickcheck) pull the same files again on every run. A FileCache keeps a
+copy of each file in a local directory and hands back its path:
+
+    cache = file_cache.FileCache('/tmp/fds_cache', max_bytes=20 * 2**30)
+    local_path = cache.get(remote_path)
+    files_to_process = cache.localize(files_to_process, workers=4)   # fetched 4 at a time
+    cache.release()   # after the run: the localized copies may be evicted again
+    cache.stats()   # {'hits': n, 'misses': n, 'waits': n, 'evictions': n, 'bytes_fetched': .., 'hit_rate': ..}
+
+A copy is used while the remote file keeps its (mtime, size); otherwise it is
+fetched again. Each copy has a .md5 sidecar with the digest taken while it
+was fetched, and verify='md5' checks it on every hit (verify='size', the
+default, only checks the size). Files are copied under a temporary name and
+renamed into place, and each file is populated under an flock, so several
+workers or engines can share one cache: the first fetches, the others wait
+and hit. When the cache grows past max_bytes the least recently used copies
+are deleted, with their lock files; copies being read, fetched or pinned are
+not, so localize() pins the copies of a run until release(), and a run larger
+than max_bytes overfills the cache rather than losing its first files. If the
+repository cannot be reached, the copies on hand are used.
+Copies keep their base file name, so base_file_path in the results still
+matches the repository's flight records.
+"""
+import os
+import json
+import time
+import errno
+import fcntl
+import threading
+import shutil
+import hashlib
+import logging
+import collections
+from multiprocessing.pool import ThreadPool
+
+from param_index import file_signature
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 2**20   # bytes read from the repository at a time
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.asias_fds', 'file_cache')
+
+
+def _makedirs(folder):
+    if not os.path.exists(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:  # another worker got there first
+            pass
+
+
+class _Lock(object):
+    '''
+    flock on a lock file: shared while a copy is read or pinned, exclusive while
+    it is fetched or evicted. An evictor removes the lock file with the copy, so
+    a lock taken on a file that has since been removed is taken again.
+    '''
+    def __init__(self, path, shared=False, blocking=True):
+        self.path = path
+        self.shared = shared
+        self.blocking = blocking
+        self._file = None
+
+    def acquire(self):
+        operation = (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) | (0 if self.blocking else fcntl.LOCK_NB)
+        while True:
+            _makedirs(os.path.dirname(self.path))
+            try:
+                f = open(self.path, 'a')
+            except IOError as err:
+                if err.errno != errno.ENOENT:   # the folder went with an eviction: make it again
+                    raise
+                continue
+            try:
+                fcntl.flock(f, operation)
+            except IOError:
+                f.close()
+                raise
+            try:
+                current = os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino
+            except OSError:
+                current = False
+            if current:
+                self._file = f
+                return self
+            f.close()
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+    def unlink(self):
+        '''remove the lock file, held exclusively, and its folder once empty'''
+        os.remove(self.path)
+        try:
+            os.rmdir(os.path.dirname(self.path))
+        except OSError:   # other copies or lock files still in it
+            pass
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class FileCache(object):
+    '''copies of repository files in directory, at most max_bytes of them'''
+    def __init__(self, directory=None, max_bytes=50 * 2**30, verify='size', open_remote=open):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.verify = verify            # 'size' or 'md5': the check made on a hit
+        self.open_remote = open_remote  # how repository files are opened for reading
+        self._stats = collections.Counter()
+        self._lock = threading.Lock()   # stats and pins; localize() fetches on several threads
+        self._pins = {}   # local path -> shared _Lock held until release()
+        _makedirs(self.directory)
+
+    def _local_path(self, remote_path):
+        '''directory/<hash of the remote path>/<file name>: the copy keeps its base file name'''
+        key = hashlib.md5(os.path.abspath(remote_path)).hexdigest()[:16]
+        return os.path.join(self.directory, key, os.path.basename(remote_path))
+
+    def _sidecar(self, local_path):
+        try:
+            with open(local_path + '.md5') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return None
+
+    def _valid(self, local_path, signature):
+        '''the copy at local_path is complete and, when signature is known, still current'''
+        sidecar = self._sidecar(local_path)
+        if sidecar is None or not os.path.exists(local_path):
+            return False
+        if signature is not None and tuple(sidecar['signature']) != tuple(signature):
+            return False
+        if os.path.getsize(local_path) != sidecar['size']:
+            return False
+        if self.verify == 'md5' and file_md5(local_path) != sidecar['md5']:
+            logger.warning('cached copy of %s is corrupt, fetching it again', sidecar['source'])
+            self._count('corrupt')
+            try:
+                os.remove(local_path + '.md5')   # invalid from now on, for every worker
+            except OSError:
+                pass
+            return False
+        return True
+
+    def get(self, remote_path, pin=False):
+        '''
+        path of a verified local copy of remote_path, fetched when there is none.
+        Unless pinned, another worker may evict the copy once get() returns;
+        pin=True keeps it until release()
+        '''
+        local_path = self._local_path(remote_path)
+        signature = file_signature(remote_path)
+        outcome = 'hits'
+        while True:
+            lock = _Lock(local_path + '.lock', shared=True).acquire()   # no eviction while held
+            try:
+                valid = self._valid(local_path, signature)
+                if valid:
+                    os.utime(local_path, None)   # most recently used
+            except:
+                lock.release()
+                raise
+            if valid:
+                break
+            lock.release()
+            with _Lock(local_path + '.lock') as exclusive:
+                if self._valid(local_path, signature):   # another worker fetched it while we waited
+                    outcome = 'waits'
+                    continue
+                try:
+                    self._fetch(remote_path, local_path, signature)
+                except:
+                    exclusive.unlink()
+                    raise
+                outcome = 'misses'
+        self._count(outcome)
+        if outcome == 'waits':
+            self._count('hits')
+        if signature is None:
+            self._count('offline')   # repository out of reach: the copy on hand is used
+        with self._lock:
+            if pin and local_path not in self._pins:
+                self._pins[local_path] = lock
+                lock = None
+        if lock is not None:
+            lock.release()
+        if outcome == 'misses':
+            self.evict()
+        return local_path
+
+    def release(self, local_paths=None):
+        '''unpin local_paths, or every copy this cache has pinned'''
+        with self._lock:
+            names = list(self._pins) if local_paths is None else [p for p in local_paths if p in self._pins]
+            locks = [self._pins.pop(p) for p in names]
+        for lock in locks:
+            lock.release()
+
+    def _fetch(self, remote_path, local_path, signature):
+        if signature is None:
+            raise IOError(errno.ENOENT, 'not in the repository and not cached', remote_path)
+        t0 = time.time()
+        if os.path.exists(local_path + '.md5'):   # an out of date copy: invalid until the new one is in
+            os.remove(local_path + '.md5')
+        tmp_path = '%s.%d.tmp' % (local_path, os.getpid())
+        digest = hashlib.md5()
+        try:
+            with self.open_remote(remote_path, 'rb') as remote:
+                with open(tmp_path, 'wb') as local:
+                    while True:
+                        block = remote.read(BLOCK_SIZE)
+                        if not block:
+                            break
+                        digest.update(block)
+                        local.write(block)
+            size = os.path.getsize(tmp_path)
+            if size != signature[1]:
+                raise IOError(errno.EIO, 'fetched %d of %d bytes' % (size, signature[1]), remote_path)
+            os.rename(tmp_path, local_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        sidecar = {'source': remote_path, 'signature': signature, 'size': size, 'md5': digest.hexdigest()}
+        with open(local_path + '.md5.tmp', 'w') as f:
+            json.dump(sidecar, f)
+        os.rename(local_path + '.md5.tmp', local_path + '.md5')
+        self._count('bytes_fetched', size)
+        self._count('fetch_seconds', time.time() - t0)
+
+    def entries(self):
+        '''[(last used, bytes, local path)] of the cached copies, least recently used first'''
+        result = []
+        paths = []
+        for key in os.listdir(self.directory):
+            try:
+                paths.extend(os.path.join(self.directory, key, name)
+                             for name in os.listdir(os.path.join(self.directory, key)))
+            except OSError:   # not a folder, or emptied and removed by another worker
+                continue
+        for path in paths:
+            if path.endswith(('.md5', '.lock', '.tmp')) or not os.path.exists(path + '.md5'):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:   # evicted by another worker
+                continue
+            result.append((stat.st_mtime, stat.st_size, path))
+        return sorted(result)
+
+    def evict(self):
+        '''
+        delete least recently used copies until the cache holds at most max_bytes;
+        copies pinned, read or fetched by any worker are skipped
+        '''
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                with _Lock(path + '.lock', blocking=False) as exclusive:
+                    for suffix in ('.md5', ''):
+                        os.remove(path + suffix)
+                    exclusive.unlink()
+            except (IOError, OSError):
+                continue
+            total -= size
+            self._count('evictions')
+            self._count('bytes_evicted', size)
+        if total > self.max_bytes:
+            logger.warning('file cache holds %d bytes, over its %d: the rest are in use', total, self.max_bytes)
+
+    def localize(self, remote_paths, workers=1):
+        '''
+        local paths for remote_paths, in order, fetched on `workers` threads and
+        pinned until release(): a set larger than max_bytes overfills the cache
+        for the run rather than losing its first files
+        '''
+        get = lambda remote_path: self.get(remote_path, pin=True)
+        if workers == 1:
+            return [get(p) for p in remote_paths]
+        pool = ThreadPool(workers)
+        try:
+            return pool.map(get, remote_paths, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self):
+        '''hits, misses, waits for another worker's fetch, evictions and bytes since this cache was made'''
+        result = dict((k, self._stats[k]) for k in ('hits', 'misses', 'waits', 'offline', 'corrupt',
+                                                     'evictions', 'bytes_fetched', 'bytes_evicted',
+                                                     'fetch_seconds'))
+        lookups = result['hits'] + result['misses']
+        result['hit_rate'] = float(result['hits']) / lookups if lookups else 0.0
+        return result
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), ''):
+            digest.update(block)
+    return digest.hexdigest()
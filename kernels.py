@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled kernels for the per-sample loops of the profiles, with Numba when it
+is installed and plain NumPy/Python otherwise (see Numba_Test.ipynb).
+
+    kernels.HAVE_NUMBA    # numba imported
+    kernels.USE_JIT       # use the compiled loops; set False to force the fallbacks
+
+Kernels work on plain numeric arrays: the nodes turn multistate values into
+small integer codes (CTL_*) and flags first, so no strings reach the loops.
+
+    window_min / window_max    sustained windows of UA_profile, circular like np.roll
+    std_response               TCAS RA standard response recurrence
+    exceedance                 TCAS RA altitude exceedance sum
+"""
+import numpy as np
+
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+USE_JIT = HAVE_NUMBA
+
+# TCAS Combined Control, as codes for the kernels
+CTL_OTHER = 0     # anything else: follow the aircraft
+CTL_CLEAR = 1     # 'Clear of Conflict', 'No Advzy'
+CTL_DOWN = 2      # 'Down Advisory Corrective'
+CTL_UP = 3        # 'Up Advisory Corrective'
+CTL_HOLD = 4      # 'Preventive', 'Drop Track', 'Altitude Lost'
+
+
+def jit(func):
+    '''numba.jit(nopython=True) of func when numba is installed, else func itself'''
+    if HAVE_NUMBA:
+        return numba.jit(nopython=True)(func)
+    return func
+
+
+### sustained windows
+@jit
+def _window_loop(values, half_width, use_max):
+    n = len(values)
+    out = np.empty(n)
+    for i in range(n):
+        best = values[i]
+        for j in range(-half_width, half_width + 1):
+            v = values[(i + j) % n]
+            if v != v:      # nan wins, as in ndarray.min
+                best = v
+                break
+            if (use_max and v > best) or (not use_max and v < best):
+                best = v
+        out[i] = best
+    return out
+
+
+def _window_numpy(values, half_width, use_max):
+    reduce = np.maximum if use_max else np.minimum
+    out = values.copy()
+    for c in range(-half_width, half_width + 1):
+        if c:
+            reduce(out, np.roll(values, c), out=out)
+    return out
+
+
+def window_min(values, half_width):
+    '''min of values[i-half_width:i+half_width+1] at each i, wrapping around the ends like np.roll'''
+    values = np.asarray(values, dtype=np.float64)
+    if USE_JIT and len(values):
+        return _window_loop(values, half_width, False)
+    return _window_numpy(values, half_width, False)
+
+
+def window_max(values, half_width):
+    '''max of values[i-half_width:i+half_width+1] at each i, wrapping around the ends like np.roll'''
+    values = np.asarray(values, dtype=np.float64)
+    if USE_JIT and len(values):
+        return _window_loop(values, half_width, True)
+    return _window_numpy(values, half_width, True)
+
+
+### TCAS
+@jit
+def _std_response_loop(start, ctl, up_active, down_active, changed, required_on_change, reversal,
+                       vertspd, lag_end, lag_reversal, acceleration, acceleration_reversal):
+    n = len(ctl)
+    std_out = np.empty(n)
+    required_out = np.empty(n)
+    initial = vertspd[0]
+    std = initial
+    required = np.nan
+    for i in range(n):
+        t = start + i
+        if changed[i]:
+            required = required_on_change[i]
+            if reversal[i]:
+                lag_end = t + lag_reversal
+                acceleration = acceleration_reversal
+                initial = std
+        c = ctl[i]
+        if c == CTL_CLEAR:
+            new = vertspd[i]
+        elif t < lag_end:  # not responding yet
+            new = initial
+        elif c == CTL_DOWN or down_active[i]:
+            new = std
+            if std > required:
+                new = std - acceleration
+            if new <= required:
+                new = required  # correct overshoot
+        elif c == CTL_UP or up_active[i]:
+            new = std
+            if std < required:
+                new = std + acceleration
+            if new >= required:
+                new = required  # correct overshoot
+        elif c == CTL_HOLD:
+            new = std
+        else:
+            new = vertspd[i]
+        std = new
+        std_out[i] = std
+        required_out[i] = required
+    return std_out, required_out
+
+
+def std_response(start, ctl, up_active, down_active, changed, required_on_change, reversal, vertspd,
+                 lag_end, lag_reversal, acceleration, acceleration_reversal):
+    '''
+    standard response vertical speed for the samples start..start+len(ctl)-1 of one RA,
+    and the required vertical speed in force at each; see TCASRAStandardResponse.
+    required_on_change is read where changed is set; nan stands for no requirement.
+    '''
+    args = [np.asarray(ctl, np.int8), np.asarray(up_active, np.bool_), np.asarray(down_active, np.bool_),
+            np.asarray(changed, np.bool_), np.asarray(required_on_change, np.float64),
+            np.asarray(reversal, np.bool_), np.asarray(vertspd, np.float64)]
+    if USE_JIT:
+        loop = _std_response_loop
+    else:  # plain python is quicker on lists than on numpy scalars
+        loop = getattr(_std_response_loop, 'py_func', _std_response_loop)
+        args = [a.tolist() for a in args]
+    return loop(start, *(args + [float(lag_end), float(lag_reversal), float(acceleration),
+                                 float(acceleration_reversal)]))
+
+
+def exceedance(ctl, up_active, down_active, vertspd, std, valid, buffer_fpm=250.0):
+    '''
+    sum of vertical speed shortfall against the standard response over valid samples:
+    below it for a climb, above it for a descent, beyond +/-buffer_fpm otherwise
+    '''
+    vertspd = np.asarray(vertspd, np.float64)
+    std = np.asarray(std, np.float64)
+    down = (np.asarray(ctl) == CTL_DOWN) | np.asarray(down_active, bool)
+    up = ~down & ((np.asarray(ctl) == CTL_UP) | np.asarray(up_active, bool))
+    deviation = np.where(down, vertspd - std, np.where(up, std - vertspd, np.abs(vertspd - std) - buffer_fpm))
+    return float(deviation[np.asarray(valid, bool) & (deviation > 0)].sum())
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Deferred imports, so that loading a profile or notebook_utils (and every
+reload(staged_helper) on an engine) does not pay for pandas, pylab, the Oracle
+client or the FFD master table until something actually uses them.
+
+    pd = LazyModule('pandas')                 # imported on the first pd.<attr>
+    fds_oracle = LazyModule('fds_oracle')     # only SQL flight sets touch Oracle
+    ffd_master = LazyObject(load_ffd_master)  # loader runs on first use
+
+A lazy module stays a LazyModule object: code keeps calling pd.DataFrame(...)
+as before. Only `from pandas import DataFrame` style imports need the real
+module, and those must stay eager.
+"""
+import types
+import importlib
+
+
+class LazyModule(types.ModuleType):
+    '''placeholder for a module that is imported when one of its attributes is first used'''
+    def __init__(self, name, submodules=()):
+        super(LazyModule, self).__init__(name)
+        self.__dict__['_lazy_submodules'] = tuple(submodules)
+        self.__dict__['_lazy_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            for submodule in self._lazy_submodules:
+                importlib.import_module('%s.%s' % (self.__name__, submodule))
+            self.__dict__['_lazy_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__['_lazy_module'] is not None
+
+    def __getattr__(self, attr):  # only called for attributes not set on the placeholder
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        return '<lazy module %r%s>' % (self.__name__, '' if self.loaded else ' (not loaded)')
+
+
+class LazyObject(object):
+    '''proxy for a value that is built by loader() when it is first used'''
+    def __init__(self, loader):
+        self.__dict__['_lazy_loader'] = loader
+        self.__dict__['_lazy_value'] = None
+        self.__dict__['loaded'] = False
+
+    def _load(self):
+        if not self.loaded:
+            self.__dict__['_lazy_value'] = self._lazy_loader()
+            self.__dict__['loaded'] = True
+        return self._lazy_value
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __repr__(self):
+        return repr(self._load()) if self.loaded else '<lazy %s (not loaded)>' % self._lazy_loader.__name__
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Per-node timing for profile runs: wall time, CPU time and peak memory growth of
+every node derived, profile nodes and FDS base nodes reported separately.
+
+    status = node_profiler.run_profile_profiled(PROFILE_NAME, module_names, LOG_LEVEL, FILES_TO_PROCESS,
+                                                COMMENT, MAKE_KML_FILES, FILE_REPOSITORY, save_oracle=True)
+    print node_profiler.format_summary(status['node_profile'])
+
+or, in a notebook
+    profiler = node_profiler.NodeProfiler(['tcas_profile'])
+    params = nb.derive_many(flt, vars(), profiler=profiler)
+    profiler.summary()
+
+While active, the profiler wraps Node.get_derived (every node goes through it)
+and staged_helper.derive_parameters_series (to tell flights apart).
+Memory is the growth of the process peak RSS (ru_maxrss) while the node ran,
+so it only shows nodes that push the high-water mark up. Inputs shared and
+copied under copy_on_write.CopyOnWriteInputs during the run are in the
+summary as 'copy_on_write'.
+"""
+import os
+import time
+import resource
+import collections
+
+import numpy as np
+
+import copy_on_write
+
+# histogram bin edges for per-flight node wall times, in seconds
+TIME_BINS = [0.0, 0.001, 0.01, 0.1, 1.0, 10.0, 100.0, float('inf')]
+
+NodeTiming = collections.namedtuple('NodeTiming', 'flight node kind wall cpu memory_kb')
+
+
+def _cpu_time():
+    user, system = os.times()[:2]
+    return user + system
+
+
+class NodeProfiler(object):
+    '''
+    Context manager that records a NodeTiming for every node derived while it is
+    active. Nodes defined in profile_modules count as 'profile', the rest as 'base'.
+    '''
+    def __init__(self, profile_modules=()):
+        self.profile_modules = set(profile_modules)
+        self.timings = []
+        self.flight = None
+        self.copy_on_write = dict.fromkeys(copy_on_write.stats(), 0)
+        self._patched = []
+
+    def __enter__(self):
+        import analysis_engine.node as node
+        import staged_helper
+        self._patch(node.Node, 'get_derived', self._timed_get_derived)
+        self._patch(staged_helper, 'derive_parameters_series', self._flight_derive_parameters_series)
+        self._copy_stats = copy_on_write.stats()
+        return self
+
+    def __exit__(self, *exc_info):
+        for key, value in copy_on_write.stats().items():
+            self.copy_on_write[key] += value - self._copy_stats[key]
+        while self._patched:
+            owner, name, original = self._patched.pop()
+            setattr(owner, name, original)
+
+    def _patch(self, owner, name, make_wrapper):
+        original = getattr(owner, name)
+        self._patched.append((owner, name, original))
+        setattr(owner, name, make_wrapper(original))
+
+    def _timed_get_derived(self, get_derived):
+        profiler = self
+        def timed_get_derived(node, args):
+            rss0, cpu0, wall0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, _cpu_time(), time.time()
+            try:
+                return get_derived(node, args)
+            finally:
+                kind = 'profile' if type(node).__module__ in profiler.profile_modules else 'base'
+                profiler.timings.append(NodeTiming(
+                    profiler.flight, node.get_name(), kind, time.time() - wall0, _cpu_time() - cpu0,
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0))
+        return timed_get_derived
+
+    def _flight_derive_parameters_series(self, derive_parameters_series):
+        profiler = self
+        def flight_derive_parameters_series(flight, *args, **kwargs):
+            profiler.flight = getattr(flight, 'filepath', None)
+            return derive_parameters_series(flight, *args, **kwargs)
+        return flight_derive_parameters_series
+
+    def summary(self):
+        '''
+        per-node totals and wall-time histograms across flights, split by kind:
+            {'profile': {node: stats}, 'base': {node: stats}, 'flights': n, 'time_bins': TIME_BINS,
+             'copy_on_write': {'shared': n, 'bytes_shared': .., 'copies': n, ..}}
+        '''
+        per_node = collections.defaultdict(lambda: collections.defaultdict(list))
+        kinds = {}
+        for t in self.timings:
+            per_flight = per_node[t.node][t.flight]
+            per_flight.append(t)
+            kinds[t.node] = t.kind
+        result = {'profile': {}, 'base': {},
+                  'flights': len(set(t.flight for t in self.timings)), 'time_bins': TIME_BINS,
+                  'copy_on_write': dict(self.copy_on_write)}
+        for name, flights in per_node.items():
+            wall = np.array([sum(t.wall for t in ts) for ts in flights.values()])
+            cpu = np.array([sum(t.cpu for t in ts) for ts in flights.values()])
+            memory = np.array([max(t.memory_kb for t in ts) for ts in flights.values()])
+            result[kinds[name]][name] = {
+                'flights': len(wall),
+                'wall_total': float(wall.sum()), 'wall_mean': float(wall.mean()), 'wall_max': float(wall.max()),
+                'cpu_total': float(cpu.sum()),
+                'memory_kb_max': int(memory.max()),
+                'wall_histogram': np.histogram(wall, bins=TIME_BINS)[0].tolist(),
+            }
+        return result
+
+
+def format_summary(summary, top=15):
+    '''text table of the slowest nodes by total wall time'''
+    rows = [(stats['wall_total'], kind, name, stats)
+            for kind in ('profile', 'base') for name, stats in summary[kind].items()]
+    rows.sort(reverse=True)
+    lines = ['%-8s %-50s %8s %10s %10s %10s' % ('kind', 'node', 'flights', 'wall (s)', 'cpu (s)', 'mem (kb)')]
+    for wall, kind, name, stats in rows[:top]:
+        lines.append('%-8s %-50s %8d %10.3f %10.3f %10d' % (kind, name[:50], stats['flights'], wall,
+                                                         stats['cpu_total'], stats['memory_kb_max']))
+    return '\n'.join(lines)
+
+
+def run_profile_profiled(profile_name, module_names, *args, **kwargs):
+    '''helper.run_profile() with node timings added to the status dict as 'node_profile' '''
+    import staged_helper
+    with NodeProfiler(module_names) as profiler:
+        status = staged_helper.run_profile(profile_name, module_names, *args, **kwargs)
+    status['node_profile'] = profiler.summary()
+    return status
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+Cached stand-in for staged_helper.get_derived_nodes().
+
+helper.get_derived_nodes(settings.NODE_MODULES) walks every FDS node module
+to build the {node name: class} map, and the notebook helpers and every engine
+run call it again and again. The registry
+    keeps the map for the life of the process
+    persists a name -> (module, class, dependencies) index, so a fresh process
+      looks classes up directly instead of walking the modules
+    rebuilds when the mtime of any of the node modules changes.
+
+    import node_registry
+    all_nodes = node_registry.get_derived_nodes(settings.NODE_MODULES)  # a copy, safe to add to
+    node_registry.install()   # make staged_helper.get_derived_nodes use the registry too
+
+The index lives at analyser_custom_settings.NODE_REGISTRY_PATH when set,
+otherwise under ~/.asias_fds/.
+"""
+import os
+import sys
+import json
+import logging
+import importlib
+import collections
+
+logger = logging.getLogger(__name__)
+
+
+def default_index_path():
+    try:
+        import analyser_custom_settings as settings
+        path = getattr(settings, 'NODE_REGISTRY_PATH', None)
+    except ImportError:
+        path = None
+    return path or os.path.join(os.path.expanduser('~'), '.asias_fds', 'node_registry.json')
+
+
+def _source_mtime(module):
+    '''mtime of the module source (of the compiled file when there is no source)'''
+    filename = getattr(module, '__file__', None)
+    if filename is None:
+        return None
+    if filename.endswith(('.pyc', '.pyo')) and os.path.exists(filename[:-1]):
+        filename = filename[:-1]
+    return os.path.getmtime(filename)
+
+
+class NodeRegistry(object):
+    '''
+    per-process and on-disk cache of node maps, keyed by the list of node modules.
+    build(module_names) makes the map on a miss; staged_helper.get_derived_nodes by default.
+    '''
+    def __init__(self, index_path=None, build=None):
+        self.index_path = index_path or default_index_path()
+        self._build = build
+        self._cache = {}     # key -> (mtimes, {name: class})
+        self._index = None   # parsed index file
+        self.stats = collections.Counter()   # 'memory', 'index' and 'build' lookups
+
+    def get_derived_nodes(self, module_names):
+        '''{node name: class} for the modules; a fresh dict each call, as callers add to it'''
+        key = ','.join(module_names)
+        modules = [importlib.import_module(name) for name in module_names]
+        mtimes = dict((m.__name__, _source_mtime(m)) for m in modules)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == mtimes:
+            self.stats['memory'] += 1
+            return dict(cached[1])
+        nodes = self._from_index(key, mtimes)
+        if nodes is None:
+            nodes = self._build_nodes(module_names)
+            self._save(key, mtimes, nodes)
+            self.stats['build'] += 1
+        else:
+            self.stats['index'] += 1
+        self._cache[key] = (mtimes, nodes)
+        return dict(nodes)
+
+    def dependencies(self, module_names):
+        '''{node name: [dependency names]} from the index'''
+        self.get_derived_nodes(module_names)
+        entry = self._load_index().get(','.join(module_names), {})
+        return dict((name, deps) for name, (module, cls, deps) in entry.get('nodes', {}).items())
+
+    def clear(self):
+        '''forget the cached maps, in memory and on disk'''
+        self._cache.clear()
+        self._index = {}
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+    def _build_nodes(self, module_names):
+        build = self._build
+        if build is None:
+            import staged_helper
+            build = _helper_get_derived_nodes or staged_helper.get_derived_nodes
+        return build(module_names)
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path) as f:
+                    self._index = json.load(f)
+            except (IOError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _from_index(self, key, mtimes):
+        entry = self._load_index().get(key)
+        if not entry or entry['mtimes'] != mtimes:
+            return None
+        try:
+            return dict((name, getattr(sys.modules[module], cls))
+                        for name, (module, cls, deps) in entry['nodes'].items())
+        except (KeyError, AttributeError):  # class moved to a module not in the list
+            return None
+
+    def _save(self, key, mtimes, nodes):
+        index = self._load_index()
+        index[key] = {'mtimes': mtimes,
+                      'nodes': dict((name, (cls.__module__, cls.__name__, list(cls.get_dependency_names())))
+                                    for name, cls in nodes.items())}
+        directory = os.path.dirname(self.index_path)
+        try:
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            tmp_path = '%s.%d.tmp' % (self.index_path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.rename(tmp_path, self.index_path)  # atomic, other processes see the old or the new file
+        except (IOError, OSError) as err:
+            logger.warning('node registry index not saved to %s: %s', self.index_path, err)
+
+
+_registry = NodeRegistry()
+_helper_get_derived_nodes = None   # the original, once install() has replaced it
+
+
+def get_derived_nodes(module_names):
+    '''drop-in for staged_helper.get_derived_nodes(), from the process-wide registry'''
+    return _registry.get_derived_nodes(module_names)
+
+
+def install():
+    '''route staged_helper.get_derived_nodes (and so run_profile/run_analyzer) through the registry'''
+    global _helper_get_derived_nodes
+    import staged_helper
+    if staged_helper.get_derived_nodes is not get_derived_nodes:
+        _helper_get_derived_nodes = staged_helper.get_derived_nodes
+        staged_helper.get_derived_nodes = get_derived_nodes
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Free intermediate derived parameters once the last node that needs them has run.
+
+staged_helper.derive_parameters_series keeps every node it derives in its
+params dict until the flight is finished, so full-flight arrays such as
+'Distance Travelled In Air' or 'Vref (Recorded then Lookup)' stay resident long
+after their consumers are done. NodeReleaser counts, from the process order,
+how many nodes still need each derived node. When the last of them returns
+from Node.get_derived, the node's array is swapped for an empty one, unless
+the node is one the sink stores: the requested nodes, plus any named in keep.
+
+    with node_release.NodeReleaser(node_mgr, process_order) as releaser:
+        res, params = helper.derive_parameters_series(flight, node_mgr, process_order, precomputed=...)
+    releaser.stats()     # {'released': n, 'bytes': ..}
+
+    node_release.install()   # every derive_parameters_series in this process (run_profile, run_analyzer)
+
+Only nodes derived inside the block are released; HDF5 series and precomputed
+nodes belong to the Flight. KPV, KTI and section nodes are small and are kept.
+"""
+import threading
+import collections
+
+import numpy as np
+
+
+def consumer_counts(node_mgr, process_order):
+    '''{node name: number of nodes in the process order that depend on it}'''
+    counts = collections.Counter()
+    for name in process_order:
+        node_class = node_mgr.derived_nodes.get(name)
+        if name in node_mgr.hdf_keys or not hasattr(node_class, 'get_dependency_names'):
+            continue
+        counts.update(node_class.get_dependency_names())
+    return counts
+
+
+def _nbytes(array):
+    mask = np.ma.getmask(array)
+    return array.nbytes + (mask.nbytes if mask is not np.ma.nomask else 0)
+
+
+class NodeReleaser(object):
+    '''
+    Context manager that releases the arrays of derived nodes after their last
+    consumer; the requested nodes, and any named in keep, are left alone.
+    '''
+    def __init__(self, node_mgr, process_order, keep=None, node_base=None):
+        self.remaining = consumer_counts(node_mgr, process_order)
+        self.keep = set(node_mgr.requested) | set(keep or ())
+        self.node_base = node_base   # class whose get_derived is wrapped; analysis_engine's Node by default
+        self.released = []
+        self.bytes_released = 0
+        self._live = {}
+        self._lock = threading.Lock()   # nodes may be derived on several threads, see concurrent_derive.py
+        self._original = None
+
+    def __enter__(self):
+        if self.node_base is None:
+            import analysis_engine.node as node
+            self.node_base = node.Node
+        self._original = self.node_base.get_derived
+        releaser = self
+        original = self._original
+        def releasing_get_derived(node, args):
+            result = original(node, args)
+            releaser.derived(node.get_name(), node, type(node).get_dependency_names())
+            return result
+        self.node_base.get_derived = releasing_get_derived
+        return self
+
+    def __exit__(self, *exc_info):
+        self.node_base.get_derived = self._original
+
+    def derived(self, name, node, dependency_names):
+        '''record that node was derived from dependency_names; release what is no longer needed'''
+        with self._lock:
+            self._live[name] = node
+            for dep in dependency_names:
+                self.remaining[dep] -= 1
+                if self.remaining[dep] <= 0:
+                    self._release(dep)
+            if self.remaining[name] <= 0:   # nothing downstream needs it at all
+                self._release(name)
+
+    def _release(self, name):
+        node = self._live.pop(name, None)
+        if node is None or name in self.keep:
+            return
+        array = getattr(node, 'array', None)
+        if not isinstance(array, np.ndarray) or not len(array):
+            return
+        self.bytes_released += _nbytes(array)
+        self.released.append(name)
+        node.array = np.ma.zeros(0, dtype=array.dtype)
+
+    def stats(self):
+        return {'released': len(self.released), 'bytes': self.bytes_released}
+
+
+_helper_derive_parameters_series = None   # the original, once install() has replaced it
+_keep = None
+
+
+def derive_parameters_series(flight, node_mgr, process_order, *args, **kwargs):
+    '''staged_helper.derive_parameters_series() releasing intermediate arrays as it goes'''
+    with NodeReleaser(node_mgr, process_order, keep=_keep):
+        return _helper_derive_parameters_series(flight, node_mgr, process_order, *args, **kwargs)
+
+
+def install(keep=None):
+    '''
+    release intermediate arrays in every staged_helper.derive_parameters_series call;
+    keep: node names the sink stores, beyond the requested nodes
+    '''
+    global _helper_derive_parameters_series, _keep
+    import staged_helper
+    _keep = set(keep or ())
+    if staged_helper.derive_parameters_series is not derive_parameters_series:
+        _helper_derive_parameters_series = staged_helper.derive_parameters_series
+        staged_helper.derive_parameters_series = derive_parameters_series
@@ -7,39 +7,80 @@ Created on Thu Aug 15 08:13:59 2013
 """
 from __future__ import division
 import types
+import contextlib
+import collections
 import inspect
 import logging
 import datetime, time, calendar
 
 import numpy  as np
 from numpy import NaN
-import pandas as pd
-import pylab
-import networkx as nx
 
 import analysis_engine
 import analysis_engine.node as node
-import hdfaccess.file
 from analysis_engine import settings
 
 import analyser_custom_settings
 import staged_helper  as helper  
+import node_registry
+import dependency_cache
+import node_release
+import copy_on_write as cow
+import concurrent_derive
+import dtype_policy
+import data_quality
 from staged_helper import Flight, get_deps_series
+from lazy_import import LazyModule, LazyObject
+from param_index import Catalogue, CatalogueCache, file_signature, hdf_series_info, series_info
+
+# plotting, tables and the FFD master list load on first use, not at import
+pd = LazyModule('pandas')
+pylab = LazyModule('pylab')
+nx = LazyModule('networkx')
+hdfaccess = LazyModule('hdfaccess', submodules=['file'])
 
 FFD_DIR=analyser_custom_settings.FFD_PATH
-ffd_master = pd.read_csv(FFD_DIR+'FFDparameters.txt',sep='\t')
-ffd_master.index = ffd_master['DISPLAY_NAME']
 
+def load_ffd_master():
+    '''master list of ffd parameters, indexed on display name'''
+    ffd_master = pd.read_csv(FFD_DIR+'FFDparameters.txt',sep='\t')
+    ffd_master.index = ffd_master['DISPLAY_NAME']
+    return ffd_master
+
+ffd_master = LazyObject(load_ffd_master)
+
+# search indexes over FFD, HDF5 and node names, see param_index.py; the last 32 are kept in memory
+_catalogues = CatalogueCache(max_entries=32)
 
-def derive_many(flight, myvars, precomputed={}):
+
+def derive_many(flight, myvars, precomputed={}, profiler=None, release=False, copy_on_write=False, workers=None,
+                compact=False):
     '''simplified signature for deriving all nodes in a profile
         flt is an object of class Flight
         myvars normally=vars()
         precomputed is a dict of previously computed nodes
+        profiler is an optional node_profiler.NodeProfiler to record node timings
+        release=True frees intermediate base node arrays after their last consumer (see node_release.py)
+        copy_on_write=True shares input arrays with nodes until they write to them (see copy_on_write.py)
+        workers=n derives independent nodes on n threads, each on copy-on-write inputs (see concurrent_derive.py)
+        compact=True stores derived arrays as float32 and small state codes where they fit (see dtype_policy.py)
     '''
+    if profiler is not None and workers:
+        raise ValueError('NodeProfiler measures one node at a time: profile with workers=None')
     node_mgr = get_profile_nodemanager(flight, myvars)
-    process_order, graph = helper.dependency_order(node_mgr, draw=False)
-    res, params = helper.derive_parameters_series(flight, node_mgr, process_order, precomputed=flight.parameters)
+    process_order, graph = dependency_cache.dependency_order(node_mgr, draw=False)
+    releaser = node_release.NodeReleaser(node_mgr, process_order) if release else None
+    protector = cow.CopyOnWriteInputs() if copy_on_write else None
+    compactor = dtype_policy.DtypePolicy(dtype_policy.sinks(node_mgr, process_order)) if compact else None
+    with contextlib.nested(*filter(None, [profiler, releaser, protector, compactor])):
+        if workers:
+            params = concurrent_derive.derive_parameters_concurrent(flight, node_mgr, process_order,
+                                                                    precomputed=flight.parameters, workers=workers)
+        else:
+            res, params = helper.derive_parameters_series(flight, node_mgr, process_order,
+                                                          precomputed=flight.parameters)
+    if compact:
+        dtype_policy.compact_requested(node_mgr, params, flight.parameters)
     return params
     
 
@@ -49,7 +90,7 @@ def derive_one(flight, parameter_class, precomputed={}):
     single_request = {parameter_class.__name__: parameter_class }
     
     # full set of computable nodes
-    base_nodes = helper.get_derived_nodes(settings.NODE_MODULES)
+    base_nodes = node_registry.get_derived_nodes(settings.NODE_MODULES)
     all_nodes = base_nodes.copy()
     for k,v in single_request.items():
         all_nodes[k]=v
@@ -64,7 +105,7 @@ def derive_one(flight, parameter_class, precomputed={}):
                         flight.aircraft_info,
                         achieved_flight_record={'Myfile': flight.filepath, 'Mydict':dict()}
                       )
-    single_order, single_graph = helper.dependency_order(single_mgr, draw=False)
+    single_order, single_graph = dependency_cache.dependency_order(single_mgr, draw=False)
     res, params= helper.derive_parameters_series(flight, single_mgr, single_order, precomputed=flight.parameters)    
     return params
 
@@ -86,7 +127,7 @@ def get_profile_nodemanager(flt, myvars):
     '''
     # full set of computable nodes
     requested_nodes = get_profile_nodes(myvars)  # get Nodes defined in the current namespace
-    all_nodes = helper.get_derived_nodes(settings.NODE_MODULES)  #all the FDS derived nodes
+    all_nodes = node_registry.get_derived_nodes(settings.NODE_MODULES)  #all the FDS derived nodes
     for k,v in requested_nodes.items():  # nodes in this profile
         all_nodes[k]=v
         
@@ -110,7 +151,7 @@ def get_base_nodemanager(flt):
          normally myvars will be set myvars=vars() from a notebook    
     '''
     # full set of computable nodes
-    all_nodes = helper.get_derived_nodes(settings.NODE_MODULES)  #all the FDS derived nodes
+    all_nodes = node_registry.get_derived_nodes(settings.NODE_MODULES)  #all the FDS derived nodes
     requested_nodes = all_nodes.copy()  # get Nodes defined in the current namespace
     if requested_nodes.get('Configuration'):
         del requested_nodes['Configuration']
@@ -139,7 +180,7 @@ def graph_show(graph, font_size=12):
     
 def graph_many_nodes(flt, myvars, font_size=12):
     node_mgr = get_profile_nodemanager(flt, myvars)
-    process_order, graph = helper.dependency_order(node_mgr, draw=False)   
+    process_order, graph = dependency_cache.dependency_order(node_mgr, draw=False)   
     graph_show(graph, font_size=12)
     
 
@@ -149,7 +190,7 @@ def graph_one_node(parameter_class, flight):
     single_request = {parameter_class.__name__: parameter_class }
     
     # full set of computable nodes
-    base_nodes = helper.get_derived_nodes(settings.NODE_MODULES)
+    base_nodes = node_registry.get_derived_nodes(settings.NODE_MODULES)
     all_nodes = base_nodes.copy()
     for k,v in single_request.items():
         all_nodes[k]=v
@@ -164,7 +205,7 @@ def graph_one_node(parameter_class, flight):
                         flight.aircraft_info,
                         achieved_flight_record={'Myfile':flight.filepath, 'Mydict':dict()}
                       )
-    single_order, single_graph = helper.dependency_order(single_mgr, draw=False)
+    single_order, single_graph = dependency_cache.dependency_order(single_mgr, draw=False)
     graph_show(single_graph, font_size=12) 
   
 
@@ -183,12 +224,95 @@ def module_functions(mymodule):
     return  [a for a in dir(mymodule) if isinstance(mymodule.__dict__.get(a), types.FunctionType) and a[0]!='_']
 
 
+def _values(par):
+    '''parameter values with masked samples as nan. When nothing is masked this is
+       a read-only view of the parameter's data, not a copy: a Series built on it
+       cannot be written to, so it cannot change the parameter behind it
+    '''
+    array = par.array
+    mask = np.ma.getmask(array)
+    if mask is np.ma.nomask or not mask.any():
+        values = np.ma.getdata(array).view()
+        values.setflags(write=False)
+        return values
+    return np.where(mask, np.nan, np.ma.getdata(array))
+
+
 def _HDF2Series(par):
-    '''convert a parameter array into a Pandas series indexed on flight seconds
+    '''convert a parameter array into a Pandas series indexed on flight seconds,
+       sharing the parameter's data when nothing is masked (read-only, see _values)
 		e.g. AG = par2series(ff['Gear On Ground']
     '''
-    p2=np.where(par.array.mask, np.nan, par.array.data)
-    return pd.Series( p2, index=ts_index(par))
+    return pd.Series( _values(par), index=ts_index(par), copy=False)
+
+
+class ParameterFrame(object):
+    '''many parameters of different frequencies on one time index, flight seconds.
+       Columns are converted when first used; a parameter sampled at a lower rate
+       holds its last sample.
+         e.g. pf = ParameterFrame(flt.series, frequency=1.0)
+              pf['Altitude AAL'];  pf.to_frame(['Altitude AAL', 'Airspeed'])
+    '''
+    def __init__(self, params, frequency=None):
+        self.params = dict(params)
+        self.frequency = frequency or max(p.frequency for p in self.params.values())
+        duration = max(len(p.array) / p.frequency for p in self.params.values())
+        self.index = _time_index(self.frequency, 0.0, int(round(duration * self.frequency)))
+        self._columns = {}
+
+    @property
+    def columns(self):
+        return sorted(self.params.keys())
+
+    def values(self, name):
+        '''column as a numpy array on the frame index'''
+        if name not in self._columns:
+            par = self.params[name]
+            values = _values(par)
+            if (par.frequency, par.offset, len(par.array)) != (self.frequency, 0.0, len(self.index)):
+                values = values[_sample_positions(par.frequency, par.offset, len(par.array),
+                                                  self.frequency, len(self.index))]
+            self._columns[name] = values
+        return self._columns[name]
+
+    def __getitem__(self, name):
+        return pd.Series(self.values(name), index=self.index, name=name, copy=False)
+
+    def to_frame(self, names=None):
+        names = names or self.columns
+        return pd.DataFrame(dict((name, self.values(name)) for name in names), index=self.index, columns=names)
+
+
+# time index arrays by (frequency, offset, length), shared between parameters and flights.
+# They are read-only, and the least recently used go once a cache holds _INDEX_CACHE_SIZE.
+_INDEX_CACHE_SIZE = 64
+_time_indexes = collections.OrderedDict()
+_position_indexes = collections.OrderedDict()
+
+
+def _cached_index(cache, key, build):
+    '''cache[key], made read-only by build() on a miss; the least recently used entry goes when full'''
+    index = cache.pop(key, None)
+    if index is None:
+        index = build()
+        index.setflags(write=False)
+        if len(cache) >= _INDEX_CACHE_SIZE:
+            cache.popitem(last=False)
+    cache[key] = index
+    return index
+
+
+def _time_index(frequency, offset, length):
+    return _cached_index(_time_indexes, (frequency, offset, length),
+                         lambda: offset + np.arange(length) / frequency)
+
+
+def _sample_positions(frequency, offset, length, to_frequency, to_length):
+    '''for each sample time at to_frequency, the last sample of the parameter at or before it'''
+    def build():
+        times = _time_index(to_frequency, 0.0, to_length)
+        return np.floor((times - offset) * frequency + 1e-9).astype(int).clip(0, length - 1)
+    return _cached_index(_position_indexes, (frequency, offset, length, to_frequency, to_length), build)
 
 
 def node_type(base_nodes, nm):
@@ -211,11 +335,13 @@ def search_node(node_dict, search_term):
     '''search over a dict(name:node) of measurement nodes. partial matches ok; not case sensitive'
 	  e.g. node_search(bn, 'flap')
     '''
-    matching_names= [k for k in node_dict.keys() if k.upper().find(search_term.upper())>=0]
-    df = pd.DataFrame({'name': matching_names })
-    df['type']= [node_type(node_dict, nm) for nm in matching_names]
-    #df.index = df['name']
-    return df	
+    def build():
+        names = sorted(node_dict.keys())
+        return Catalogue(pd.DataFrame({'name': names, 'type': [node_type(node_dict, nm) for nm in names]},
+                                      columns=['name', 'type']), 'name')
+    # the dict itself is the key, with its length to notice nodes added to it since
+    return _catalogues.get(('nodes', id(node_dict)), len(node_dict), build, persist=False,
+                           owner=node_dict).search(search_term)
     
     
 def _node_typestr(node):
@@ -241,17 +367,29 @@ def plot_hdf(hdf_series, label=None, kind='line', use_index=True, rot=None, xtic
     HS.plot(label=label, kind=kind, use_index=use_index, rot=rot, xticks=xticks, yticks=yticks, xlim=xlim, ylim=ylim, ax=ax, style=style, grid=grid, legend=legend, logx=logx, logy=logy)
 
 
+def _ffd_master_unique():
+    '''FFD master with one row per display name'''
+    return ffd_master[~pd.Series(ffd_master.index).duplicated().values]
+
+
 def search_ffd(ffd_pmeta, term):
     '''search through list of parameters in the parameter meta-data for an FFD file, return partial matches
         ffd_pmeta = ffd parameter metadata for a flight (a DataFrame)    
         ffd_master = master list of ffd parameters
     '''
-    matching_names =  [p for p in ffd_pmeta.index if str(p).upper().find(term.upper())>=0]
-    df = pd.DataFrame({'FFD Name': matching_names })
-    df['FFD DATA_TYPE'] = [ ffd_pmeta.ix[nm]['DATA_TYPE'] for nm in matching_names]
-    df['STATES'] = [ ffd_master.ix[nm]['STATES'] if nm in ffd_master.index else 'not in master' for nm in matching_names]
-    df['FFD UNITS'] = [ ffd_master.ix[nm]['UNITS']  if nm in ffd_master.index  else 'not in master' for nm in matching_names]
-    df['dtype'] = [ ffd_pmeta.ix[nm]['dtype']  if nm in ffd_master.index  else 'not in master' for nm in matching_names]
+    def build():
+        return Catalogue(pd.DataFrame({'FFD Name': [str(p) for p in ffd_pmeta.index], 'row': np.arange(len(ffd_pmeta))}),
+                         'FFD Name')
+    rows = _catalogues.get(('ffd', id(ffd_pmeta)), len(ffd_pmeta), build, persist=False,
+                           owner=ffd_pmeta).search(term)['row'].values
+    matching = ffd_pmeta.iloc[rows]
+    master = _ffd_master_unique().reindex(matching.index)
+    in_master = master['DISPLAY_NAME'].notnull().values
+    df = pd.DataFrame({'FFD Name': list(matching.index)})
+    df['FFD DATA_TYPE'] = matching['DATA_TYPE'].values
+    df['STATES'] = np.where(in_master, master['STATES'].values, 'not in master')
+    df['FFD UNITS'] = np.where(in_master, master['UNITS'].values, 'not in master')
+    df['dtype'] = np.where(in_master, matching['dtype'].values, 'not in master')
     return df
 
 
@@ -259,12 +397,13 @@ def search_ffd_master(term):
     '''search through list of parameters in the parameter meta-data for an FFD file, return partial matches
         ffd_master = master list of ffd parameters
     '''
-    matching_names =  [p for p in ffd_master.index if str(p).upper().find(term.upper())>=0]
-    df = pd.DataFrame({'FFD Name': matching_names })
-    df['FFD TYPE'] = [ ffd_master.ix[nm]['TYPE'] for nm in matching_names]
-    df['STATES'] = [ ffd_master.ix[nm]['STATES'] if nm in ffd_master.index else 'not in master' for nm in matching_names]
-    df['FFD UNITS'] = [ ffd_master.ix[nm]['UNITS'] if nm in ffd_master.index else 'not in master' for nm in matching_names]
-    return df
+    def build():
+        master = _ffd_master_unique()
+        return Catalogue(pd.DataFrame({'FFD Name': list(master.index), 'FFD TYPE': master['TYPE'].values,
+                                       'STATES': master['STATES'].values, 'FFD UNITS': master['UNITS'].values},
+                                      columns=['FFD Name', 'FFD TYPE', 'STATES', 'FFD UNITS']), 'FFD Name')
+    master_path = FFD_DIR+'FFDparameters.txt'
+    return _catalogues.get(master_path, file_signature(master_path), build).search(term)
 
          
 # add info: lfl flag, type, frequency, valid, count, mask count
@@ -273,23 +412,38 @@ def search_hdf(myhdf5, search_term):
        Partial matches ok; not case sensitive. 
 	  e.g. param_search(ff, 'Accel')
     '''
-    series = myhdf5.series
-    matching_names= [k for k in series.keys() if k.upper().find(search_term.upper())>=0]
-    df = pd.DataFrame({'FDS name': matching_names })
-    #df['recorded']= [ ('T' if myhdf5.get(nm).lfl else 'F') for nm in matching_names]
-    df['lfl_param']= [ (nm in myhdf5.lfl_params) for nm in matching_names]
-    df['frequency']= [ series.get(nm).frequency for nm in matching_names]
-    df['data_type']= [ series.get(nm).data_type for nm in matching_names]    
-    df['units']= [ (series.get(nm).units if series.get(nm).units else '') for nm in matching_names]
-    
-    values = []
-    for nm in matching_names:
-        mapping = series[nm].values_mapping if series[nm].values_mapping is not None else 'n/a'
-        values.append(mapping)
-    df['FDS values']= values
-    return df
+    filepath = getattr(myhdf5, 'filepath', None) or getattr(myhdf5, 'file_path', None)
+    signature = file_signature(filepath)
+    def build():
+        # series attributes only, read with h5py: myhdf5.series[nm] would load every array
+        info = hdf_series_info(filepath) if signature else series_info(myhdf5.series)
+        names = sorted(info.keys())
+        lfl_params = set(myhdf5.lfl_params)
+        df = pd.DataFrame({'FDS name': names })
+        df['lfl_param']= [ (nm in lfl_params) for nm in names]
+        df['frequency']= [ info[nm][0] for nm in names]
+        df['data_type']= [ info[nm][1] for nm in names]
+        df['units']= [ (info[nm][2] or '') for nm in names]
+        df['FDS values']= [ (info[nm][3] if info[nm][3] is not None else 'n/a') for nm in names]
+        return Catalogue(df, 'FDS name')
+    # an open file is known by its path and (mtime, size); without a local file, by the object itself
+    return _catalogues.get(filepath, signature, build, persist=signature is not None,
+                           owner=None if signature else myhdf5).search(search_term)
 
  
+def mask_report(flt, top=None):
+    '''masked gaps of every series in a flight, most gaps first; see data_quality.py
+        e.g. mask_report(flt, top=20)
+    '''
+    stats = data_quality.flight_mask_stats(flt)
+    df = pd.DataFrame({'name': stats.names, 'frequency': stats.frequency, 'samples': stats.samples,
+                       'masked_fraction': stats.masked_fraction(), 'gaps': stats.gaps,
+                       'longest_gap_sec': stats.longest_gap_sec()},
+                      columns=['name', 'frequency', 'samples', 'masked_fraction', 'gaps', 'longest_gap_sec'])
+    df = df.iloc[np.argsort(-stats.gaps, kind='mergesort')].reset_index(drop=True)
+    return df[:top] if top else df
+
+
 def tabulate_derived(param_nodes):
     '''load derived parameters into a DataFrame for nice display'''
     outdf = pd.DataFrame({'name': [v for v in param_nodes.keys()]})
@@ -307,15 +461,16 @@ def timestamp():
 def ts_index(par):
     '''given a parameter, construct a time array to serve as Series index
         e.g. ts_index(ff['Acceleration Normal'])
+       the array is cached and shared: do not modify it
     '''
-    return np.arange(par.offset, len(par.array)/par.frequency+par.offset,step=1/par.frequency)
+    return _time_index(par.frequency, par.offset, len(par.array))
 
 
 if __name__=='__main__':
     initialize_logger('DEBUG')
     print module_functions(inspect)
 
-    base_nodes = helper.get_derived_nodes(settings.NODE_MODULES)
+    base_nodes = node_registry.get_derived_nodes(settings.NODE_MODULES)
     print node_search(base_nodes, 'flap')
     
     print 'master gear', ffd_master.get('Landing Gear Locked Down N')
@@ -9,7 +9,6 @@ Test of ipython parallel on the example profile module
 @author: KEITHC, July 2013
 """
 ### Section 1: dependencies (see FlightDataAnalyzer source files for additional options)
-import pdb
 from datetime import datetime
 import logging
 from logging import NullHandler
@@ -34,7 +33,8 @@ from analysis_engine.library import (integrate, repair_mask, index_at_value, all
 # asias_fds stuff
 import analyser_custom_settings as settings
 #import staged_helper  as helper 
-import fds_oracle
+from lazy_import import LazyModule
+fds_oracle = LazyModule('fds_oracle')  # Oracle client loads only for SQL flight sets
 
 ### Section 2: measure definitions -- attributes, KTI, phase/section, KPV, DerivedParameter
 #      DerivedParameters will cause a set of hdf5 files to be generated.
@@ -217,6 +217,9 @@ if __name__=='__main__':
     FILE_REPOSITORY, FILES_TO_PROCESS = test_kpv_range()  #test_sql_jfk_local() #tiny_test() #test_sql_jfk() #test10() #tiny_test() #test10_shared #test_kpv_range() 
     LOG_LEVEL = 'INFO'       
     MAKE_KML_FILES = False
+    FILE_CACHE_PATH = None   # local LRU copy of the repository files shared by the engines, see file_cache.py
+    RELEASE_NODES = False    # free intermediate derived arrays after their last consumer (node_release.py)
+    COMPACT_DTYPES = False   # store requested derived parameters as float32 / int8 codes (dtype_policy.py)
     ###############################################################
     module_names = [ os.path.basename(__file__).replace('.py','') ]#helper.get_short_profile_name(__file__)   # profile name = the name of this file
     print ' module names', module_names    
@@ -232,6 +235,8 @@ if __name__=='__main__':
     dview.block = True
     with dview.sync_imports():
         import staged_helper
+        import engine_setup
+        import file_cache
 
     t0 = time.time()
     #build parallel namespace
@@ -242,6 +247,9 @@ if __name__=='__main__':
     dview.scatter('files_to_process', FILES_TO_PROCESS)
     dview['file_repository'] = FILE_REPOSITORY    
     dview['MAKE_KML_FILES'] = MAKE_KML_FILES 
+    dview['file_cache_path'] = FILE_CACHE_PATH
+    dview['release_nodes'] = RELEASE_NODES
+    dview['compact_dtypes'] = COMPACT_DTYPES
     print 'file count:', len(FILES_TO_PROCESS)
     print 'profile', PROFILE_NAME 
     
@@ -255,16 +263,27 @@ if __name__=='__main__':
     def eng_profile():
         #staged_helper.run_profile(PROFILE_NAME , module_names, LOG_LEVEL, files_to_process, COMMENT, MAKE_KML_FILES, file_repository ) 
         logger = staged_helper.initialize_logger(LOG_LEVEL)    
-
-        staged_helper.run_analyzer(PROFILE_NAME, module_names, logger, 
-                     files_to_process,   'NA', output_dir, reports_dir, 
+        engine_setup.install(release=release_nodes, compact_dtypes=compact_dtypes)
+        files = files_to_process
+        if file_cache_path:         # pull each file over the VPN once, not once per run
+            cache = file_cache.FileCache(file_cache_path)
+            files = cache.localize(files_to_process, workers=2)
+            logger.info('file cache: %s', cache.stats())
+
+        status = staged_helper.run_analyzer(PROFILE_NAME, module_names, logger, 
+                     files,   'NA', output_dir, reports_dir, 
                      include_flight_attributes=False, make_kml=MAKE_KML_FILES,   
                      save_oracle=True, comment=COMMENT, 
                      file_repository='linux' 
                      ) 
+        if file_cache_path:
+            cache.release()         # the copies of this run may be evicted again
+        return status
     etime= time.time()
-    dview.apply(eng_profile) 
+    statuses = dview.apply(eng_profile) 
     print 'apply time', time.time()-etime
+    for status in statuses:
+        print 'status', status
     print 'time', time.time()-t0
     print 'done'
     
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+Search indexes over parameter and node names, for the notebook_utils search_*
+helpers.
+
+NameIndex keeps a trigram index (every 3-character run of the upper-cased
+name) and a token index (the words of the name). A substring search looks up
+the trigrams of the term, intersects their posting lists and checks the few
+candidates left, so it matches exactly what `term.upper() in name.upper()`
+matches without scanning every name. Terms shorter than 3 characters fall back
+to a scan.
+
+A Catalogue pairs an index with a metadata table (a DataFrame, one row per
+name), so a search returns the full rows in one .iloc lookup:
+
+    catalogue = Catalogue(table, 'FFD Name')
+    catalogue.search('flap')          # substring, case-insensitive
+    catalogue.search('flap angle', match='words')
+
+CatalogueCache keeps catalogues in memory and pickled on disk, keyed by a
+source (e.g. a file path) and rebuilt when its signature (e.g. mtime) changes.
+At most max_entries catalogues stay in memory, least recently used dropped
+first. An object with no file behind it (a node dict, a DataFrame) is passed
+as owner and keyed by its id: the cache holds the owner with its catalogue, so
+that id cannot come back for another object while the catalogue is cached.
+
+The rows of an hdf5 file's catalogue come from the series attributes alone,
+read with h5py, or from the Parameter objects of a flight with no local file:
+
+    info = param_index.hdf_series_info(flt.filepath)   # {name: (frequency, data_type, units, values_mapping)}
+    info = param_index.series_info(flt.series)
+"""
+import os
+import json
+import hashlib
+import cPickle
+import logging
+import collections
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def trigrams(text):
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def tokens(text):
+    return text.replace('(', ' ').replace(')', ' ').replace('-', ' ').replace('_', ' ').split()
+
+
+class NameIndex(object):
+    '''trigram and token index over a list of names'''
+    def __init__(self, names):
+        self.names = [str(name) for name in names]
+        self._upper = [name.upper() for name in self.names]
+        grams = collections.defaultdict(list)
+        words = collections.defaultdict(list)
+        for i, name in enumerate(self._upper):
+            for gram in set(trigrams(name)):
+                grams[gram].append(i)
+            for word in set(tokens(name)):
+                words[word].append(i)
+        self._trigrams = dict((k, np.array(v, dtype=np.int32)) for k, v in grams.items())
+        self._tokens = dict((k, np.array(v, dtype=np.int32)) for k, v in words.items())
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def _intersect(postings):
+        '''positions present in every posting list, smallest lists first'''
+        if any(p is None for p in postings):
+            return np.array([], dtype=np.int32)
+        postings = sorted(postings, key=len)
+        found = postings[0]
+        for p in postings[1:]:
+            if not len(found):
+                break
+            found = np.intersect1d(found, p, assume_unique=True)
+        return found
+
+    def search(self, term, match='substring'):
+        '''
+        sorted positions of the names matching term, case-insensitive.
+        match='substring': term anywhere in the name; match='words': every word of term is a word of the name
+        '''
+        term = str(term).upper()
+        if match == 'words':
+            return self._intersect([self._tokens.get(w) for w in tokens(term)]) if tokens(term) \
+                else np.arange(len(self.names))
+        grams = trigrams(term)
+        candidates = self._intersect([self._trigrams.get(g) for g in set(grams)]) if grams \
+            else np.arange(len(self.names))
+        # a name with all the trigrams may still not contain the term itself
+        return np.array([i for i in candidates if term in self._upper[i]], dtype=np.int32)
+
+
+class Catalogue(object):
+    '''metadata table with a NameIndex over one of its columns'''
+    def __init__(self, table, name_column):
+        self.table = table.reset_index(drop=True)
+        self.index = NameIndex(self.table[name_column])
+
+    def search(self, term, match='substring'):
+        '''the matching rows of the table'''
+        return self.table.iloc[self.index.search(term, match=match)].reset_index(drop=True)
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.asias_fds', 'search_index')
+
+
+class CatalogueCache(object):
+    '''catalogues (or any picklable index) by source, in memory and on disk'''
+    def __init__(self, directory=None, max_entries=32):
+        self.directory = directory or default_cache_dir()
+        self.max_entries = max_entries
+        self._memory = collections.OrderedDict()   # source -> (signature, owner, catalogue), oldest first
+        self.stats = collections.Counter()
+
+    def _path(self, source):
+        return os.path.join(self.directory, hashlib.md5(str(source)).hexdigest() + '.pkl')
+
+    def get(self, source, signature, build, persist=True, owner=None):
+        '''
+        the catalogue for source, calling build() when there is none for this
+        signature; owner: the in-memory object source identifies, if any
+        '''
+        cached = self._memory.pop(source, None)
+        if cached is not None and cached[0] == signature and cached[1] is owner:
+            self.stats['memory'] += 1
+            self._memory[source] = cached   # most recently used
+            return cached[2]
+        catalogue = self._load(source, signature) if persist else None
+        if catalogue is None:
+            catalogue = build()
+            self.stats['build'] += 1
+            if persist:
+                self._save(source, signature, catalogue)
+        else:
+            self.stats['disk'] += 1
+        self._memory[source] = (signature, owner, catalogue)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats['evicted'] += 1
+        return catalogue
+
+    def _load(self, source, signature):
+        try:
+            with open(self._path(source), 'rb') as f:
+                saved_source, saved_signature, catalogue = cPickle.load(f)
+        except (IOError, EOFError, cPickle.UnpicklingError, ValueError, AttributeError, ImportError):
+            return None
+        return catalogue if (saved_source, saved_signature) == (source, signature) else None
+
+    def _save(self, source, signature, catalogue):
+        path = self._path(source)
+        try:
+            if not os.path.exists(self.directory):
+                os.makedirs(self.directory)
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                cPickle.dump((source, signature, catalogue), f, 2)
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as err:
+            logger.warning('search index for %s not saved: %s', source, err)
+
+
+def hdf_series_info(filepath):
+    '''
+    {series name: (frequency, data_type, units, values_mapping)} from the
+    series attributes of an hdfaccess file; no arrays are read
+    '''
+    import h5py
+    info = {}
+    with h5py.File(filepath, 'r') as hdf:
+        for name, group in hdf['series'].items():
+            attrs = group.attrs
+            mapping = attrs.get('values_mapping')
+            info[name] = (attrs.get('frequency'), attrs.get('data_type'), attrs.get('units'),
+                          dict((int(k), v) for k, v in json.loads(mapping).items()) if mapping is not None else None)
+    return info
+
+
+def series_info(series):
+    '''the same from the Parameter objects of a flight's series'''
+    return dict((name, (p.frequency, p.data_type, p.units, getattr(p, 'values_mapping', None)))
+                for name, p in series.items())
+
+
+def file_signature(path):
+    '''(mtime, size) of a file, or None when it is not a local file'''
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return (stat.st_mtime, stat.st_size)
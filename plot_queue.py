@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Deferred rendering of the TCAS RA diagnostic plots.
+
+TCASRAResponsePlot used to draw and save a six-panel figure inside the
+derivation loop, so every RA flight waited on matplotlib. Now the node only
+captures the RA window (RA +/-15 sec) of the arrays it plots into a small
+record in a queue directory, and the plots are drawn later, or alongside the
+run, by a pool of renderer processes on the Agg backend, each reusing one figure.
+The renderers draw with ra_plots.ra_plot, so they never import a profile.
+
+    # in the node
+    plot_queue.ArtifactQueue(queue_dir).put(plot_queue.ra_record(...))
+    # afterwards, or while the profile runs (--watch)
+    python plot_queue.py QUEUE_DIR OUTPUT_DIR --processes 4
+    # or only for the flights of interest
+    plot_queue.render_all(queue_dir, output_dir, select=['flight_1.hdf5'])
+"""
+import os
+import sys
+import glob
+import time
+import uuid
+import argparse
+import collections
+import multiprocessing
+
+import numpy as np
+
+# seconds plotted either side of the RA sections
+RA_MARGIN = 15.0
+
+# the multistate panels of ra_plots.ra_plot, in argument order
+RA_STATES = ('tcas_ra', 'tcas_ctl', 'tcas_up', 'tcas_down', 'tcas_vert', 'tcas_sens')
+
+# stand-ins for MappedArray and attribute nodes, with the fields ra_plot reads
+States = collections.namedtuple('States', 'data values_mapping')
+Attribute = collections.namedtuple('Attribute', 'value')
+
+
+def ra_window(ra_sections, length):
+    '''(tstart, tend) covering all the RA sections plus the margin, as TCASRAResponsePlot had it'''
+    tstart = max(min([ra.start_edge for ra in ra_sections]) - RA_MARGIN, 0)
+    tend = min(max([ra.stop_edge for ra in ra_sections]) + RA_MARGIN, length)
+    return tstart, tend
+
+
+def ra_record(series, states, filename, orig_icao, dest_icao, tstart, tend):
+    '''
+    compact record of one RA plot: the samples in [tstart, tend) only.
+    series: {name: array} for the top panel; states: {name in RA_STATES: MappedArray}
+    '''
+    i0, i1 = int(tstart), int(np.ceil(tend))
+    record = {'filename': filename, 'orig': orig_icao, 'dest': dest_icao,
+              'tstart': float(tstart), 'tend': float(tend), 'x0': i0,
+              'series_names': np.array(list(series.keys()))}
+    for i, array in enumerate(series.values()):
+        window = array[i0:i1]
+        record['series_%d' % i] = np.ma.filled(np.ma.asarray(window, dtype=np.float32), np.nan)
+    for name in RA_STATES:
+        mapped = states[name]
+        keys = sorted(mapped.values_mapping)
+        record[name] = np.ma.getdata(mapped)[i0:i1].astype(np.int16)
+        record[name + '_keys'] = np.array(keys, dtype=np.int16)
+        record[name + '_values'] = np.array([mapped.values_mapping[k] for k in keys])
+    return record
+
+
+def load_record(path):
+    '''record saved by ArtifactQueue.put, with the state mappings rebuilt as dicts'''
+    saved = np.load(path)
+    record = dict((k, saved[k]) for k in saved.files)
+    for key in ('filename', 'orig', 'dest'):
+        record[key] = str(record[key])
+    for key in ('tstart', 'tend'):
+        record[key] = float(record[key])
+    record['x0'] = int(record['x0'])
+    for name in RA_STATES:
+        mapping = dict(zip(record.pop(name + '_keys').tolist(), record.pop(name + '_values').tolist()))
+        record[name] = States(record[name], mapping)
+    return record
+
+
+class ArtifactQueue(object):
+    '''directory of plot records waiting to be rendered'''
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:  # another engine got there first
+                pass
+
+    def put(self, record):
+        '''save a record, named after its flight; returns the path'''
+        base = os.path.basename(record['filename']).replace('.hdf5', '')
+        path = os.path.join(self.directory, base + '.npz')
+        tmp_path = os.path.join(self.directory, '.%s.tmp' % uuid.uuid4().hex)
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **record)
+        os.rename(tmp_path, path)  # renderers never see half a record
+        return path
+
+    def records(self, select=None):
+        '''record paths, optionally only those for the flight filenames in select'''
+        paths = sorted(glob.glob(os.path.join(self.directory, '*.npz')))
+        if select is not None:
+            wanted = set(os.path.basename(f).replace('.hdf5', '') for f in select)
+            paths = [p for p in paths if os.path.basename(p)[:-len('.npz')] in wanted]
+        return paths
+
+
+_figure = None
+
+
+def _init_renderer():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render(record_path, output_dir):
+    '''draw one record to output_dir/<flight>.png with this process's figure; returns the png path'''
+    global _figure
+    import matplotlib.pyplot as plt
+    from ra_plots import ra_plot
+    record = load_record(record_path)
+    if _figure is None:
+        _figure = plt.figure(figsize=(15, 15))
+    series = collections.OrderedDict((name, record['series_%d' % i])
+                                     for i, name in enumerate(record['series_names'].tolist()))
+    ra_plot(series, *[record[name] for name in RA_STATES],
+            filename=Attribute(record['filename']),
+            orig=Attribute({'code': {'icao': record['orig']}}),
+            dest=Attribute({'code': {'icao': record['dest']}}),
+            tstart=record['tstart'], tend=record['tend'], x0=record['x0'], fig=_figure)
+    png = os.path.join(output_dir, os.path.basename(record_path).replace('.npz', '.png'))
+    _figure.savefig(png, transparent=False)
+    return png
+
+
+def _render(args):
+    return render(*args)
+
+
+def render_all(queue_dir, output_dir, processes=4, select=None):
+    '''render the records not yet drawn (or redrawn since), on a pool of Agg processes; returns png paths'''
+    todo = []
+    for path in ArtifactQueue(queue_dir).records(select):
+        png = os.path.join(output_dir, os.path.basename(path).replace('.npz', '.png'))
+        if not os.path.exists(png) or os.path.getmtime(png) < os.path.getmtime(path):
+            todo.append((path, output_dir))
+    if not todo:
+        return []
+    pool = multiprocessing.Pool(processes, initializer=_init_renderer)
+    try:
+        return pool.map(_render, todo, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='render queued TCAS RA plots')
+    parser.add_argument('queue_dir')
+    parser.add_argument('output_dir')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--watch', type=float, default=0, help='keep rendering new records every WATCH seconds')
+    parser.add_argument('--select', nargs='*', help='only these flight files')
+    opts = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    while True:
+        done = render_all(opts.queue_dir, opts.output_dir, opts.processes, opts.select)
+        print '%d plots rendered' % len(done)
+        if not opts.watch:
+            break
+        time.sleep(opts.watch)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+The TCAS RA diagnostic plot: vertical speed and the standard response over the
+TCAS multistate parameters, one panel each.
+
+Kept apart from the profiles so plot_queue.py's renderer processes draw it
+without importing analysis_engine or the profile settings. matplotlib loads on
+the first call.
+
+    plt = ra_plots.ra_plot({'vertspd': vertspd.array, 'std response': std_vert_spd.array},
+                           tcas_ra.array, tcas_ctl.array, tcas_up.array, tcas_down.array,
+                           tcas_vert.array, tcas_sens.array, filename, orig, dest, tstart, tend)
+"""
+import numpy as np
+
+
+def plot_mapped_array(plt, myaxis, states, mapped_array, title="", series_format="g", x0=0):
+    '''MappedArray maps discrete states to an integer array.
+       Here we plot the states as a time series with states labelled on the y axis.
+       x0 is the time index of the first sample, for arrays cut to a window.'''
+    plt.yticks( np.arange(len(states)), states )
+    myaxis.plot(x0 + np.arange(len(mapped_array)), mapped_array, 'g')
+    myaxis.grid(True, color='gray')
+    plt.ylim(0, len(states)) 
+    plt.title(title)
+
+    
+def ra_plot(array_dict, tcas_ra_array, tcas_ctl_array, tcas_up_array, tcas_down_array, 
+            vert_ctl_array, sens_array, filename, orig, dest, tstart, tend, x0=0, fig=None):
+    '''plot tcas: vertical speed + controls
+       arrays may be cut to a window starting at time index x0 (see plot_queue.py);
+       fig is a figure to clear and reuse instead of opening a new one    '''
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import ScalarFormatter 
+    formatter = ScalarFormatter(useOffset=False) 
+    formatter.set_powerlimits((-8,8)) 
+    formatter.set_scientific(False) 
+    formatter.set_useOffset(0.0) 
+
+    if fig is None:
+        plt.figure(figsize=(15,15)) #set size in inches
+    else:
+        plt.figure(fig.number)
+        fig.clf()
+    plt.subplots_adjust(left=None, bottom=None, right=None, top=None, wspace=None, hspace=0.5)
+    
+    # top time series plot
+    axts    = plt.subplot2grid((8, 1), (0, 0), rowspan=2) #time series    
+    axts.xaxis.set_major_formatter(formatter) 
+    series_names = array_dict.keys()  #only first 4
+    series_formats = ['k','r','g','b']    #color codes
+    for i,nm in enumerate(series_names):
+        ln=axts.plot(x0 + np.arange(len(array_dict[nm])), array_dict[nm], series_formats[i], alpha=0.45)
+        plt.setp(ln, linewidth=2)
+    leg = axts.legend(series_names, 'upper left', fancybox=True)
+    leg.get_frame().set_alpha(0.5)
+    axts.grid(True, color='gray')
+    plt.title('Vertical Speed (fpm)')
+    axts.autoscale(enable=False)
+    
+    # tcas ra
+    ax_ra = plt.subplot2grid((8, 1), (2, 0), sharex=axts)     # 
+    ra_states = tcas_ra_array.values_mapping.values()
+    ra_states = [s.replace('Most Dangerous','') for s in ra_states]
+    ra_array = tcas_ra_array.data 
+    plot_mapped_array(plt, ax_ra, ra_states, ra_array, title="TCAS RA", x0=x0)
+
+    # combined control
+    ax_ctl = plt.subplot2grid((8, 1), (3, 0), sharex=axts)     # 
+    ctl_states = tcas_ctl_array.values_mapping.values()
+    ctl_states = [s.replace('Advisory','Advzy').replace('Corrective', 'Corr.') for s in ctl_states]
+    ctl_array = tcas_ctl_array.data 
+    plot_mapped_array(plt, ax_ctl, ctl_states, ctl_array, title="TCAS Combined Control", x0=x0)
+
+    # up and down advisory
+    ax_updown   = plt.subplot2grid((8, 1), (4, 0), sharex=axts, rowspan=2)  
+    up_states   = [' ']+tcas_up_array.values_mapping.values()
+    down_states = [' ']+tcas_down_array.values_mapping.values()
+    ud_states    = up_states + down_states
+    
+    def disp_state(st):
+        st = st.replace('Descent Corrective','Desc Corr.')
+        st = st.replace('Descend ','Desc>')
+        st = st.replace('Advisory','Advzy').replace('advisory','Advzy')
+        st = st.replace("Don't Climb ","Don't Climb>")
+        return st
+
+    ud_states = [ disp_state(s) for s in ud_states]
+    plt.yticks( np.arange(len(ud_states)), ud_states )   
+
+    up_array = tcas_up_array.data + 1 # adjust for display
+    ax_updown.plot(x0 + np.arange(len(up_array)), up_array, 'g')
+    down_array = tcas_down_array.data + len(up_states)+1 # adjust for display
+    ax_updown.plot(x0 + np.arange(len(down_array)), down_array, 'r')
+    ax_updown.grid(True, color='gray')
+    plt.ylim(0, len(up_states) + len(down_states)) 
+    plt.title('TCAS Up/Down Advisory')
+    
+    # vertical control
+    ax_vert   = plt.subplot2grid((8, 1), (6, 0), sharex=axts)  
+    vert_states   = vert_ctl_array.values_mapping.values()    
+    vert_states = [' ']+[s.replace("Advisory is not one of the following types",'NA') for s in vert_states]
+    vert_array = vert_ctl_array.data + 1
+    plot_mapped_array(plt, ax_vert, vert_states, vert_array, title="TCAS Vertical Control", x0=x0)
+    
+    #sensitivity mode    
+    ax_sens   = plt.subplot2grid((8, 1), (7, 0), sharex=axts)  
+    sens_states   = sens_array.values_mapping.values()    
+    sens_states = [' ']+[s.replace("SL = ",'') for s in sens_states]
+    sens_arr = sens_array.data + 1 # adjust for display
+    plot_mapped_array(plt, ax_sens, sens_states, sens_arr, title="TCAS Sensitivity Mode", x0=x0)
+
+    plt.xlabel('time index')
+    plt.xlim(tstart, tend) 
+    plt.suptitle('TCAS RA: '+filename.value + '\n  '+orig.value['code']['icao']+'-'+dest.value['code']['icao']+ ' '+str(tstart)+':'+str(tend))
+    return plt
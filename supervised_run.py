@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Fault-isolated profile runs: each flight is processed in a worker process
+watched by a supervisor, so one bad HDF5 file or a node stuck in a debugger
+costs that flight only, not the whole engine's share of files.
+
+    status = run_profile_supervised(PROFILE_NAME, module_names, LOG_LEVEL, FILES_TO_PROCESS,
+                                    COMMENT, MAKE_KML_FILES, FILE_REPOSITORY,
+                                    timeout=300, memory_limit_mb=4000, flights_per_worker=50)
+
+The supervisor
+    kills a flight after `timeout` seconds of wall clock time
+    caps worker memory at `memory_limit_mb` (address space, via setrlimit)
+    recycles the worker after `flights_per_worker` flights
+    requeues a failed flight up to `retries` times; hung or crashed workers are replaced
+and reports the outcome of every flight in status['flights'].
+"""
+import time
+import logging
+import datetime
+import traceback
+import collections
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+# flight outcomes reported in status['flights'][filepath]['result']
+OK, ERROR, TIMEOUT, MEMORY, CRASHED = 'ok', 'error', 'timeout', 'memory', 'crashed'
+
+
+def _worker(conn, run_flight, memory_limit_mb, flights_per_worker):
+    '''worker process: run flights sent by the supervisor, one at a time'''
+    if memory_limit_mb:
+        import resource
+        limit = int(memory_limit_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    for i in range(flights_per_worker):
+        filepath = conn.recv()
+        if filepath is None:
+            break
+        t0 = time.time()
+        try:
+            value = run_flight(filepath)
+            conn.send((OK, time.time() - t0, value))
+        except MemoryError:
+            conn.send((MEMORY, time.time() - t0, 'memory limit exceeded'))
+        except Exception:
+            conn.send((ERROR, time.time() - t0, traceback.format_exc()))
+    conn.close()
+
+
+class _Worker(object):
+    '''supervisor side of one worker process'''
+    def __init__(self, run_flight, memory_limit_mb, flights_per_worker):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker,
+                                               args=(child_conn, run_flight, memory_limit_mb, flights_per_worker))
+        self.process.daemon = True
+        self.process.start()
+        self.flights_left = flights_per_worker
+
+    def run(self, filepath, timeout):
+        '''(result, seconds, value or message) for one flight'''
+        t0 = time.time()
+        self.conn.send(filepath)
+        self.flights_left -= 1
+        while True:
+            if self.conn.poll(0.1):
+                try:
+                    return self.conn.recv()
+                except EOFError:
+                    return CRASHED, time.time() - t0, 'worker exited with code %s' % self.process.exitcode
+            if not self.process.is_alive() and not self.conn.poll():
+                return CRASHED, time.time() - t0, 'worker exited with code %s' % self.process.exitcode
+            if timeout and time.time() - t0 > timeout:
+                self.stop()
+                return TIMEOUT, time.time() - t0, 'no result after %s sec' % timeout
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+
+
+def run_supervised(run_flight, files_to_process, timeout=600, memory_limit_mb=None,
+                   flights_per_worker=50, retries=1):
+    '''
+    call run_flight(filepath) for each file, each in a supervised worker process.
+    Returns a status dict with per-flight outcomes:
+        status['flights'][filepath] = {'result': 'ok'|'error'|'timeout'|'memory'|'crashed',
+                                       'attempts': n, 'seconds': t, 'value' or 'message': ...}
+    '''
+    status = {'timestamp': datetime.datetime.now(), 'flights': collections.OrderedDict()}
+    pending = collections.deque((filepath, 1) for filepath in files_to_process)
+    worker = None
+    while pending:
+        filepath, attempt = pending.popleft()
+        if worker is None or not worker.process.is_alive() or worker.flights_left <= 0:
+            if worker is not None:
+                worker.stop()
+            worker = _Worker(run_flight, memory_limit_mb, flights_per_worker)
+        result, seconds, value = worker.run(filepath, timeout)
+        outcome = {'result': result, 'attempts': attempt, 'seconds': seconds}
+        outcome['value' if result == OK else 'message'] = value
+        status['flights'][filepath] = outcome
+        if result != OK:
+            logger.warning('flight %s failed (%s), attempt %d: %s', filepath, result, attempt, value)
+            if result != ERROR:
+                worker.stop()  # do not trust a worker that hung or blew up
+            if attempt <= retries:
+                pending.append((filepath, attempt + 1))
+    if worker is not None:
+        try:
+            worker.conn.send(None)
+        except IOError:  # worker already gone
+            pass
+        worker.stop()
+    status['counts'] = collections.Counter(f['result'] for f in status['flights'].values())
+    return status
+
+
+def run_profile_supervised(profile_name, module_names, log_level, files_to_process, comment,
+                           make_kml, file_repository, save_oracle=True, **supervisor_options):
+    '''
+    helper.run_profile() with each flight in a supervised worker; takes the
+    run_supervised() options timeout, memory_limit_mb, flights_per_worker and retries.
+    '''
+    def run_flight(filepath):
+        import staged_helper
+        return staged_helper.run_profile(profile_name, module_names, log_level, [filepath], comment,
+                                         make_kml, file_repository, save_oracle=save_oracle, mortal=True)
+    return run_supervised(run_flight, files_to_process, **supervisor_options)
@@ -16,12 +16,14 @@ TCAS Elements
             was there a Reversal? this: TCASVerticalControl|Reversal
     was the directive followed?   TODO  e.g. altitude exceedance (PARTIALLY IMPLEMENTED)
     State at Start of RA:
-        Vertical Speed  --        this: 'TCAS RA Start Vertical Speed' = VerticalSpeedAtTCASRAStart()
-        Airspeed        --        this
-        Altitude        --        this: 'TCAS RA Start Altitude QNH'   = AltitudeQNHAtTCASRAStart()
-        AP              --        this: 'TCAS RA Start Autopilot'      = AutopilotAtTCASRAStart()
-        Pitch           --        this: 'TCAS RA Start Pitch'          = PitchAtTCASRAStart()
-        Roll            --        this: 'TCAS RA Start Roll'           = RollAtTCASRAStart()
+        all in one node:          this: TCASRAStartState()
+        Vertical Speed  --        this: 'TCAS RA Start Vertical Speed'
+        Airspeed        --        this: 'TCAS RA Start Airspeed'
+        Altitude        --        this: 'TCAS RA Start Altitude QNH'
+        AP              --        this: 'TCAS RA Start Autopilot'
+        Pitch           --        this: 'TCAS RA Start Pitch'
+        Roll            --        this: 'TCAS RA Start Roll Abs'
+        Sensitivity     --        this: 'TCAS RA Start Pilot Sensitivity Mode'
     Change in state during RA?    ignore: 'Heading Increase'             = absolute change
     How did pilot respond?        base: 'TCAS RA Reaction Delay' (uses normal acceleration)
         disengage AP?             this: 'TCAS RA To AP Disengaged Duration'
@@ -31,7 +33,6 @@ TCAS Elements
 NOTE: we are assuming 1 Hz TCAS Combined Control
 """
 ### Section 1: dependencies (see FlightDataAnalyzer source files for additional options)
-import pdb
 import os, glob, socket
 import numpy as np
 from analysis_engine.node import ( A,   FlightAttributeNode,               # one of these per flight. mostly arrival and departure stuff
@@ -54,7 +55,15 @@ import analysis_engine.library as library
 # asias_fds stuff
 import analyser_custom_settings as settings
 import staged_helper  as helper 
-import fds_oracle
+from lazy_import import LazyModule
+fds_oracle = LazyModule('fds_oracle')  # Oracle client loads only for SQL flight sets
+import kernels
+import dtype_policy
+from event_index import EventIndex
+from compact_nodes import snapshot_kpvs, state_change_kpvs
+from tcas_states import state_codes, tcas_ra_states
+from ra_plots import ra_plot
+import node_profiler
 
    
 ### Section 2: measure definitions -- attributes, KTI, phase/section, KPV, DerivedParameter
@@ -158,126 +167,6 @@ def tcas_vert_spd_down(tcas_down, vert_speed, tcas_vert):
         return None
 
 
-def update_std_vert_spd(t, lag_end, cmb_ctl, up, down, acceleration, required_fpm, 
-                        std_vert_spd, init_vert_spd, vert_spd):
-    new_std_vert_spd = std_vert_spd    
-    if cmb_ctl in ('Clear of Conflict','No Advzy'):
-        new_std_vert_spd = vert_spd
-    elif t<lag_end: # not responding yet
-        new_std_vert_spd = init_vert_spd
-    elif cmb_ctl == 'Down Advisory Corrective' or down.lower()!='no down advisory':
-        if std_vert_spd>required_fpm: 
-            new_std_vert_spd = std_vert_spd - acceleration            
-        if new_std_vert_spd<=required_fpm: 
-            new_std_vert_spd = required_fpm #correct overshoot
-    elif cmb_ctl == 'Up Advisory Corrective'  or up.lower()!='no up advisory':
-        if std_vert_spd<required_fpm: 
-            new_std_vert_spd = std_vert_spd + acceleration
-        if new_std_vert_spd>=required_fpm: 
-            new_std_vert_spd = required_fpm #correct overshoot
-    elif cmb_ctl in ('Preventive', 'Drop Track', 'Altitude Lost'):
-        new_std_vert_spd = std_vert_spd
-    else: #better have a look
-        print 'RA Std Response Unknown: ', t, cmb_ctl
-        new_std_vert_spd = vert_spd
-    return new_std_vert_spd
-
-
-def plot_mapped_array(plt, myaxis, states, mapped_array, title="", series_format="g"):
-    '''MappedArray maps discrete states to an integer array.
-       Here we plot the states as a time series with states labelled on the y axis.'''
-    plt.yticks( np.arange(len(states)), states )
-    myaxis.plot(mapped_array, 'g')
-    myaxis.grid(True, color='gray')
-    plt.ylim(0, len(states)) 
-    plt.title(title)
-
-    
-def ra_plot(array_dict, tcas_ra_array, tcas_ctl_array, tcas_up_array, tcas_down_array, 
-            vert_ctl_array, sens_array, filename, orig, dest, tstart, tend):
-    '''plot tcas: vertical speed + controls    '''
-    import matplotlib.pyplot as plt
-    from matplotlib.ticker import ScalarFormatter 
-    formatter = ScalarFormatter(useOffset=False) 
-    formatter.set_powerlimits((-8,8)) 
-    formatter.set_scientific(False) 
-    formatter.set_useOffset(0.0) 
-
-    plt.figure(figsize=(15,15)) #set size in inches
-    plt.subplots_adjust(left=None, bottom=None, right=None, top=None, wspace=None, hspace=0.5)
-    
-    # top time series plot
-    axts    = plt.subplot2grid((8, 1), (0, 0), rowspan=2) #time series    
-    axts.xaxis.set_major_formatter(formatter) 
-    series_names = array_dict.keys()  #only first 4
-    series_formats = ['k','r','g','b']    #color codes
-    for i,nm in enumerate(series_names):
-        ln=axts.plot(array_dict[nm], series_formats[i], alpha=0.45)
-        plt.setp(ln, linewidth=2)
-    leg = axts.legend(series_names, 'upper left', fancybox=True)
-    leg.get_frame().set_alpha(0.5)
-    axts.grid(True, color='gray')
-    plt.title('Vertical Speed (fpm)')
-    axts.autoscale(enable=False)
-    
-    # tcas ra
-    ax_ra = plt.subplot2grid((8, 1), (2, 0), sharex=axts)     # 
-    ra_states = tcas_ra_array.values_mapping.values()
-    ra_states = [s.replace('Most Dangerous','') for s in ra_states]
-    ra_array = tcas_ra_array.data 
-    plot_mapped_array(plt, ax_ra, ra_states, ra_array, title="TCAS RA")
-
-    # combined control
-    ax_ctl = plt.subplot2grid((8, 1), (3, 0), sharex=axts)     # 
-    ctl_states = tcas_ctl_array.values_mapping.values()
-    ctl_states = [s.replace('Advisory','Advzy').replace('Corrective', 'Corr.') for s in ctl_states]
-    ctl_array = tcas_ctl_array.data 
-    plot_mapped_array(plt, ax_ctl, ctl_states, ctl_array, title="TCAS Combined Control")
-
-    # up and down advisory
-    ax_updown   = plt.subplot2grid((8, 1), (4, 0), sharex=axts, rowspan=2)  
-    up_states   = [' ']+tcas_up_array.values_mapping.values()
-    down_states = [' ']+tcas_down_array.values_mapping.values()
-    ud_states    = up_states + down_states
-    
-    def disp_state(st):
-        st = st.replace('Descent Corrective','Desc Corr.')
-        st = st.replace('Descend ','Desc>')
-        st = st.replace('Advisory','Advzy').replace('advisory','Advzy')
-        st = st.replace("Don't Climb ","Don't Climb>")
-        return st
-
-    ud_states = [ disp_state(s) for s in ud_states]
-    plt.yticks( np.arange(len(ud_states)), ud_states )   
-
-    up_array = tcas_up_array.data + 1 # adjust for display
-    ax_updown.plot(up_array, 'g')
-    down_array = tcas_down_array.data + len(up_states)+1 # adjust for display
-    ax_updown.plot(down_array, 'r')
-    ax_updown.grid(True, color='gray')
-    plt.ylim(0, len(up_states) + len(down_states)) 
-    plt.title('TCAS Up/Down Advisory')
-    
-    # vertical control
-    ax_vert   = plt.subplot2grid((8, 1), (6, 0), sharex=axts)  
-    vert_states   = vert_ctl_array.values_mapping.values()    
-    vert_states = [' ']+[s.replace("Advisory is not one of the following types",'NA') for s in vert_states]
-    vert_array = vert_ctl_array.data + 1
-    plot_mapped_array(plt, ax_vert, vert_states, vert_array, title="TCAS Vertical Control")
-    
-    #sensitivity mode    
-    ax_sens   = plt.subplot2grid((8, 1), (7, 0), sharex=axts)  
-    sens_states   = sens_array.values_mapping.values()    
-    sens_states = [' ']+[s.replace("SL = ",'') for s in sens_states]
-    sens_arr = sens_array.data + 1 # adjust for display
-    plot_mapped_array(plt, ax_sens, sens_states, sens_arr, title="TCAS Sensitivity Mode")
-
-    plt.xlabel('time index')
-    plt.xlim(tstart, tend) 
-    plt.suptitle('TCAS RA: '+filename.value + '\n  '+orig.value['code']['icao']+'-'+dest.value['code']['icao']+ ' '+str(tstart)+':'+str(tend))
-    return plt
-    
-
 '''
 class TCASRAResponsePlot(DerivedParameterNode):
     """
@@ -329,20 +218,13 @@ class TCASAltitudeExceedance(KeyPointValueNode):
                      tcas_up   =  M('TCAS Up Advisory'), tcas_down =  M('TCAS Down Advisory'), 
                      std=P('TCAS RA Standard Response'), vertspd=P('Vertical Speed') ):
         print 'in Alt Exceed'
+        ctl, up_active, down_active = tcas_ra_states(tcas_ctl, tcas_up, tcas_down)
+        valid = ~(np.ma.getmaskarray(vertspd.array) | np.ma.getmaskarray(std.array))
         for ra in ra_sections:
-            exceedance=0
-            deviation=0
-            for t in range(int(ra.start_edge), int(ra.stop_edge)): 
-                if tcas_ctl.array[t] == 'Down Advisory Corrective' or tcas_down.array[t].lower()!='no down advisory':
-                    deviation =  max(vertspd.array[t] - std.array[t], 0)
-                elif tcas_ctl.array[t] == 'Up Advisory Corrective' or tcas_up.array[t].lower()!='no up advisory':
-                    deviation =  max(std.array[t] - vertspd.array[t], 0)
-                else:
-                    deviation = abs(vertspd.array[t] - std.array[t])
-                    deviation = max( deviation-250, 0 ) # allow 250 fpm buffer
-                #print 't vert std DEV', t, vertspd.array[t], std.array[t], deviation
-                if deviation and deviation!=0:
-                    exceedance += deviation
+            window = slice(int(ra.start_edge), int(ra.stop_edge))
+            exceedance = kernels.exceedance(ctl[window], up_active[window], down_active[window],
+                                            np.ma.getdata(vertspd.array)[window],
+                                            np.ma.getdata(std.array)[window], valid[window])
             print 'Alt Exceed', exceedance
             exceedance = exceedance / 60.0 # min to sec
             self.create_kpv(ra.start_edge, exceedance)
@@ -380,66 +262,48 @@ class TCASRAStandardResponse(DerivedParameterNode):
         standard_vert_accel_reversal   = 11.2 * 60   # ft/sec^2 ==> ft/min^2
         standard_response_lag          =  5.0        # seconds
         standard_response_lag_reversal =  2.5        # seconds       
-        self.array = vertspd.array * 0 #make a copy, mask and zero out
-        self.array.mask = True
-        required_fpm_array = vertspd.array * 0
+        # zeroed and masked, in the policy dtype: float32 holds fpm to well within a foot
+        self.array = np.ma.array(np.zeros(len(vertspd.array), dtype=dtype_policy.float_dtype()), mask=True)
+        ctl, up_active, down_active = tcas_ra_states(tcas_ctl, tcas_up, tcas_down)
+        reversal = state_codes(tcas_vert.array, lambda s: s=='Reversal', False)
+        raw_states = [np.ma.getdata(m.array) for m in (tcas_ctl, tcas_up, tcas_down)]
+        vert_spd = np.ma.getdata(vertspd.array)
         
         for ra in ra_sections:                      
             self.debug('TCAS RA Standard Response: in sections')
-            #initialize response state
-            ra_ctl_prev     = tcas_ctl.array[ra.start_edge] # used to check if the command has changed
-            up_prev         = tcas_ctl.array[ra.start_edge] # used to check if the command has changed
-            down_prev       = tcas_ctl.array[ra.start_edge] # used to check if the command has changed
-            initial_vert_spd = vertspd.array[ra.start_edge]
-            std_vert_spd    = initial_vert_spd # current standard response vert speed in fpm
-            required_fpm    = None # nominal vertical speed in fpm required by the RA
-            lag_end         = ra.start_edge + standard_response_lag # time pilot response lag ends
-            acceleration    = standard_vert_accel
-                        
-            for t in range(int(ra.start_edge), int(ra.stop_edge)+1):               
-                # set required_fpm for initial ra or a change in command
-                if ra_ctl_prev!=tcas_ctl.array[t] or up_prev!=tcas_up.array[t] or down_prev!=tcas_down.array[t]:                        
-                    if tcas_ctl.array[t] == 'Up Advisory Corrective' or tcas_up.array[t].lower()!='no up advisory':
-                        required_fpm = tcas_vert_spd_up(tcas_up.array[t], vertspd.array[t], tcas_vert.array[t])                            
-                    elif tcas_ctl.array[t] == 'Down Advisory Corrective'  or tcas_down.array[t].lower()!='no down advisory':
-                        required_fpm = tcas_vert_spd_down(tcas_down.array[t], vertspd.array[t], tcas_vert.array[t])
-                    else:
-                        required_fpm = vertspd.array[t]
-                    if tcas_vert.array[t]=='Reversal':                                                
-                        lag_end = t + standard_response_lag_reversal
-                        acceleration = standard_vert_accel_reversal                    
-                        initial_vert_spd = std_vert_spd
-                if required_fpm is None:
-                    self.warning('TCAS RA Standard Response: No required_fpm found. Take a look! '+str(t))                
-
-                std_vert_spd= update_std_vert_spd(t, lag_end, tcas_ctl.array[t], tcas_up.array[t], tcas_down.array[t],
-                                                  acceleration, required_fpm, 
-                                                  std_vert_spd, initial_vert_spd, vertspd.array[t])
-                self.array.data[t] = std_vert_spd
-                self.array.mask[t] = False
-                required_fpm_array[t] = required_fpm
-                ra_ctl_prev = tcas_ctl.array[t]
-                up_prev     = tcas_up.array[t] 
-                down_prev   = tcas_down.array[t]                
-                #end of time loop within ra section
+            t0 = int(ra.start_edge)
+            window = slice(t0, int(ra.stop_edge)+1)
+            # required_fpm is set for the initial ra and on each change in command;
+            # at the start the up and down advisories are compared with the combined control
+            changed = np.zeros(len(vert_spd[window]), dtype=bool)
+            for states in raw_states:
+                changed[1:] |= states[window][1:]!=states[window][:-1]
+            changed[0] = tcas_ctl.array[t0]!=tcas_up.array[t0] or tcas_ctl.array[t0]!=tcas_down.array[t0]
+            required_on_change = np.empty(len(changed))
+            required_on_change.fill(np.nan)
+            for i in np.flatnonzero(changed):
+                t = t0 + i
+                if ctl[t] == kernels.CTL_UP or up_active[t]:
+                    required_fpm = tcas_vert_spd_up(tcas_up.array[t], vert_spd[t], tcas_vert.array[t])
+                elif ctl[t] == kernels.CTL_DOWN or down_active[t]:
+                    required_fpm = tcas_vert_spd_down(tcas_down.array[t], vert_spd[t], tcas_vert.array[t])
+                else:
+                    required_fpm = vert_spd[t]
+                if required_fpm is not None:
+                    required_on_change[i] = required_fpm
+            
+            std_vert_spd, required_fpm = kernels.std_response(
+                t0, ctl[window], up_active[window], down_active[window], changed, required_on_change,
+                reversal[window], vert_spd[window], ra.start_edge + standard_response_lag,
+                standard_response_lag_reversal, standard_vert_accel, standard_vert_accel_reversal)
+            missing = np.flatnonzero(np.isnan(required_fpm))
+            if len(missing):
+                self.warning('TCAS RA Standard Response: No required_fpm found. Take a look! '+str(t0+missing[0]))
+            self.array.data[window] = std_vert_spd
+            self.array.mask[window] = False
         return
     
 
-def deltas(myarray):
-    '''returns changes in value, same dimension as original array. 
-        The first element is always set
-    '''
-    d=np.diff(myarray)
-    delta = np.concatenate([ [0],d])
-    return delta
-
-def change_indexes(myarray):
-    '''returns array indexes at which the delta was non-zero.
-       intended for multi-state params.  Not tested for masking.
-    '''
-    return np.where( deltas(myarray)!=0 )[0]
-
-
 class TCASCombinedControl(KeyPointValueNode):
     """Reports all Combined Control state changes, masked or not, to support event review"""    
     ''' find tcas_ctl.array.data value changes (first diff)
@@ -449,16 +313,8 @@ class TCASCombinedControl(KeyPointValueNode):
     '''
     units = 'state'    
     def derive(self, tcas_ctl=M('TCAS Combined Control')):    #, ra_sections = S('TCAS RA Sections') ):
-        _change_points = change_indexes(tcas_ctl.array.data) #returns array index
-        for cp in _change_points:
-            _value = tcas_ctl.array.data[cp]
-            if np.ma.is_masked(tcas_ctl.array[cp]):
-                _name = 'TCAS Combined Control|masked'
-            else:
-                _name = 'TCAS Combined Control|' + tcas_ctl.array[cp]
-            if cp>0 and _value and _name:
-                kpv = KeyPointValue(index=cp, value=_value, name=_name)
-                self.append(kpv)
+        kpvs = state_change_kpvs(tcas_ctl.array, 'TCAS Combined Control', nonzero=True)
+        self.extend(kpvs.to_items())
 
 
 ###TODO try np.ediff1d(), use airborne or add simple phase to kpv
@@ -468,20 +324,8 @@ class TCASUpAdvisory(KeyPointValueNode):
     """
     units = 'state'        
     def derive(self, tcas_up=M('TCAS Up Advisory') ):
-        _change_points = change_indexes(tcas_up.array.data) #returns array index
-        print 'up', _change_points
-        for cp in _change_points:
-            #pdb.set_trace()
-            _value = tcas_up.array.data[cp]
-            if np.ma.is_masked( tcas_up.array[cp] ):
-                _name = 'TCAS Up Advisory|masked'
-            else:
-                try:
-                    _name = 'TCAS Up Advisory|' + tcas_up.array[cp]
-                except:
-                    print 'blah'
-            kpv = KeyPointValue(index=cp, value=_value, name=_name)
-            self.append(kpv)
+        kpvs = state_change_kpvs(tcas_up.array, 'TCAS Up Advisory')
+        self.extend(kpvs.to_items())
 
 
 class TCASDownAdvisory(KeyPointValueNode):
@@ -490,17 +334,8 @@ class TCASDownAdvisory(KeyPointValueNode):
     """
     units = 'state'    
     def derive(self, tcas_down=M('TCAS Down Advisory')):
-        _change_points = change_indexes(tcas_down.array.data) #returns array index
-        print 'down', _change_points
-        for cp in _change_points:
-            #pdb.set_trace()
-            _value = tcas_down.array.data[cp]
-            if np.ma.is_masked( tcas_down.array[cp] ):
-                _name = 'TCAS Down Advisory|masked'
-            else:
-                _name = 'TCAS Down Advisory|' + tcas_down.array[cp]
-            kpv = KeyPointValue(index=cp, value=_value, name=_name)
-            self.append(kpv)
+        kpvs = state_change_kpvs(tcas_down.array, 'TCAS Down Advisory')
+        self.extend(kpvs.to_items())
             
             
 class TCASVerticalControl(KeyPointValueNode):
@@ -510,17 +345,8 @@ class TCASVerticalControl(KeyPointValueNode):
     """
     units = 'state'    
     def derive(self, tcas_vrt=M('TCAS Vertical Control')):
-        _change_points = change_indexes(tcas_vrt.array.data) #returns array index
-        print 'vert', _change_points
-        for cp in _change_points:
-            #pdb.set_trace()
-            _value = tcas_vrt.array.data[cp]
-            if np.ma.is_masked(tcas_vrt.array[cp]):
-                _name = 'TCAS Vertical Control|masked'
-            else:
-                _name = 'TCAS Vertical Control|' + tcas_vrt.array[cp]
-            kpv = KeyPointValue(index=cp, value=_value, name=_name)
-            self.append(kpv)
+        kpvs = state_change_kpvs(tcas_vrt.array, 'TCAS Vertical Control')
+        self.extend(kpvs.to_items())
 
                                  
 class TCASSensitivity(KeyPointValueNode):
@@ -529,84 +355,44 @@ class TCASSensitivity(KeyPointValueNode):
     """
     name = 'TCAS Pilot Sensitivity Mode'
     def derive(self, tcas_sens=P('TCAS Sensitivity Level'), ra_sections=S('TCAS RA Sections') ):
-        _change_points = change_indexes(tcas_sens.array.data) #returns array index
-        for cp in _change_points:
-            _value = tcas_sens.array.data[cp]
-            if np.ma.is_masked(tcas_sens.array[cp]):
-                _name = 'TCAS Sensitivity|masked'
-            else:
-                _name = 'TCAS Sensitivity|' + tcas_sens.array[cp]
-            kpv = KeyPointValue(index=cp, value=_value, name=_name)
-            self.append(kpv)
-
-
-class TCASSensitivityAtTCASRAStart(KeyPointValueNode):
-    """
-    KPV reports TCAS Sensitivity Mode at the start of each RA.
-    """
-    name = 'TCAS RA Start Pilot Sensitivity Mode'
-    def derive(self, tcas_sens=P('TCAS Sensitivity Level'), ra=KTI('TCAS RA Start')):
-        self.create_kpvs_at_ktis(tcas_sens.array, ra)
-
-class VerticalSpeedAtTCASRAStart(KeyPointValueNode):
-    """
-    KPV reports Vertical Speed at the start of each RA.
-    """
-    units = 'fpm'
-    name = 'TCAS RA Start Vertical Speed'
-    def derive(self, vrt_spd=P('Vertical Speed'), ra=KTI('TCAS RA Start')):
-        self.create_kpvs_at_ktis(vrt_spd.array, ra)
-
-
-class AltitudeQNHAtTCASRAStart(KeyPointValueNode):
-    """
-    KPV reports Altitude QNH at the start of each RA.
-    """
-    units = 'fpm'
-    name = 'TCAS RA Start Altitude QNH'
-    def derive(self, vrt_spd=P('Altitude QNH'), ra=KTI('TCAS RA Start')):
-        self.create_kpvs_at_ktis(vrt_spd.array, ra)
-
-
-class PitchAtTCASRAStart(KeyPointValueNode):
-    """
-    KPV reports Pitch Angle at the start of each RA.
-    """
-    units = 'deg'
-    name = 'TCAS RA Start Pitch'
-    def derive(self, pitch=P('Pitch'), ra=KTI('TCAS RA Start')):
-        self.create_kpvs_at_ktis(pitch.array, ra)
-
-
-class RollAtTCASRAStart(KeyPointValueNode):
-    """
-    KPV reports Roll Angle at the start of each RA.
-    """
-    units = 'deg'
-    name = 'TCAS RA Start Roll Abs'
-    def derive(self, roll=P('Roll'), ra=KTI('TCAS RA Start')):
-        self.create_kpvs_at_ktis(np.abs(roll.array), ra)
-
-
-class AirspeedAtTCASRAStart(KeyPointValueNode):
-    """
-    KPV reports Airspeed at the start of each RA.
-    """
-    units = 'kts'
-    name = 'TCAS RA Start Airspeed'
-    def derive(self, airspeed=P('Airspeed'), ra=KTI('TCAS RA Start')):
-        self.create_kpvs_at_ktis(np.abs(airspeed.array), ra)
-
-
-class AutopilotAtTCASRAStart(KeyPointValueNode):
-    """
-    KPV reports Autopilot status  at the start of each RA.
-    '1=Engaged, otherwise Disengaged
-    """
-    name = 'TCAS RA Start Autopilot'
-    def derive(self, ap=P('AP Engaged'), ra=KTI('TCAS RA Start')):
-        #print 'AUTOPILOT'
-        self.create_kpvs_at_ktis(ap.array, ra)
+        kpvs = state_change_kpvs(tcas_sens.array, 'TCAS Sensitivity')
+        self.extend(kpvs.to_items())
+
+
+class TCASRAStartState(KeyPointValueNode):
+    """
+    KPVs of the aircraft state at the start of each RA, every parameter read
+    in one snapshot_kpvs pass: 'TCAS RA Start Pilot Sensitivity Mode',
+    'TCAS RA Start Vertical Speed', 'TCAS RA Start Altitude QNH',
+    'TCAS RA Start Pitch', 'TCAS RA Start Roll Abs', 'TCAS RA Start Airspeed'
+    and 'TCAS RA Start Autopilot' (1=Engaged, otherwise Disengaged).
+    """
+    name = 'TCAS RA Start State'
+    # (KPV name, transform) of each parameter, in derive() argument order
+    STATES = (('TCAS RA Start Pilot Sensitivity Mode', None),
+              ('TCAS RA Start Vertical Speed', None),
+              ('TCAS RA Start Altitude QNH', None),
+              ('TCAS RA Start Pitch', None),
+              ('TCAS RA Start Roll Abs', np.abs),
+              ('TCAS RA Start Airspeed', np.abs),
+              ('TCAS RA Start Autopilot', None))
+
+    @classmethod
+    def can_operate(cls, available):
+        return 'TCAS RA Start' in available and len(available) > 1
+
+    def derive(self, ra=KTI('TCAS RA Start'),
+               tcas_sens=P('TCAS Sensitivity Level'),
+               vrt_spd=P('Vertical Speed'),
+               alt_qnh=P('Altitude QNH'),
+               pitch=P('Pitch'),
+               roll=P('Roll'),
+               airspeed=P('Airspeed'),
+               ap=P('AP Engaged')):
+        params = (tcas_sens, vrt_spd, alt_qnh, pitch, roll, airspeed, ap)
+        series = [(name, param.array, transform)
+                  for (name, transform), param in zip(self.STATES, params) if param is not None]
+        self.extend(snapshot_kpvs(ra, series).to_items())
 
 
 class TCASRATimeToAPDisengage(KeyPointValueNode):
@@ -617,9 +403,10 @@ class TCASRATimeToAPDisengage(KeyPointValueNode):
     name = 'TCAS RA Time To AP Disengage'
     units = 's'
     def derive(self, ap_offs=KTI('AP Disengaged Selection'), ras=S('TCAS RA Sections') ):
+        ap_off_index = EventIndex(ap_offs)
         for ra_section in ras:
             ra = ra_section.slice
-            ap_off = ap_offs.get_next(ra.start, within_slice=ra)
+            ap_off = ap_off_index.next_after(ra.start, within_slice=ra)
             if not ap_off:
                 continue
             index = ap_off.index
@@ -708,14 +495,42 @@ if __name__=='__main__':
     COMMENT   = 'quick check'
     LOG_LEVEL = 'INFO'   #'WARNING' shows less, 'INFO' moderate, 'DEBUG' shows most detail
     MAKE_KML_FILES=False    # Run times are much slower when KML is True
+    PROFILE_NODES=False     # record per-node run times in status['node_profile']
+    AVAILABILITY_FILE=None  # availability.npz from availability.scan(), to skip flights without TCAS
+    FILE_CACHE_PATH=None    # local LRU copy of the repository files for repeated sweeps (file_cache.py)
+    COMPACT_DTYPES=False    # store requested derived parameters as float32 / int8 codes (dtype_policy.py)
+    DERIVED_OUTPUT_PATH=None  # directory for the derived parameters of the RA windows, written behind (derived_writer.py)
     ###########################################################################
     
     module_names = [ os.path.basename(__file__).replace('.py','') ] #helper.get_short_profile_name(__file__)   # profile name = the name of this file
     print 'profile', PROFILE_NAME 
-    status = helper.run_profile(PROFILE_NAME , module_names, LOG_LEVEL, FILES_TO_PROCESS, 
+    if AVAILABILITY_FILE:
+        import availability
+        matrix = availability.AvailabilityMatrix.load(AVAILABILITY_FILE)
+        FILES_TO_PROCESS, dropped = matrix.prune(FILES_TO_PROCESS, ['TCAS Combined Control'])
+        print 'skipping %d flights without TCAS Combined Control' % len(dropped)
+    if FILE_CACHE_PATH:
+        import file_cache
+        cache = file_cache.FileCache(FILE_CACHE_PATH)
+        FILES_TO_PROCESS = cache.localize(FILES_TO_PROCESS, workers=4)
+        print 'file cache', cache.stats()
+    if COMPACT_DTYPES:
+        dtype_policy.install()
+    if DERIVED_OUTPUT_PATH:
+        import derived_writer
+        writer = derived_writer.install(DERIVED_OUTPUT_PATH, sections='TCAS RA Sections', margin=15.0)
+    run_profile = node_profiler.run_profile_profiled if PROFILE_NODES else helper.run_profile
+    status = run_profile(PROFILE_NAME , module_names, LOG_LEVEL, FILES_TO_PROCESS, 
                                                 COMMENT, MAKE_KML_FILES, FILE_REPOSITORY,
                                                 save_oracle=True, mortal=True)
 
+    if FILE_CACHE_PATH:
+        cache.release()   # the copies of this run may be evicted again
+    if PROFILE_NODES:
+        print node_profiler.format_summary(status['node_profile'])
+    if DERIVED_OUTPUT_PATH:
+        writer.close()
+        print 'derived output', writer.stats()
     print 'status', status
     ts=status['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
     rpt_sql = helper.report_sql(PROFILE_NAME, status['timestamp'])
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+TCAS multistate parameters as the numeric codes and flags the kernels read.
+
+The TCAS nodes of tcas_profile and tcas_parallel_profile turn their
+MappedArrays into plain arrays once per node, evaluating each state of the
+values_mapping once rather than once per sample:
+
+    ctl, up_active, down_active = tcas_states.tcas_ra_states(tcas_ctl, tcas_up, tcas_down)
+    reversal = tcas_states.state_codes(tcas_vert.array, lambda s: s=='Reversal', False)
+"""
+import numpy as np
+
+import kernels
+
+
+def state_codes(mapped_array, state_func, default=0):
+    '''state_func(state) at every sample of a MappedArray, evaluated once per state of its values_mapping'''
+    mapping = mapped_array.values_mapping
+    keys = np.array(sorted(mapping))
+    table = np.array([state_func(mapping[k]) for k in keys])
+    raw = np.ma.getdata(mapped_array)
+    pos = np.clip(np.searchsorted(keys, raw), 0, len(keys)-1)
+    return np.where(keys[pos]==raw, table[pos], default)
+
+
+def tcas_ctl_code(cmb_ctl):
+    '''kernels.CTL_* code of a TCAS Combined Control state, as kernels.std_response reads them'''
+    if cmb_ctl in ('Clear of Conflict','No Advzy'):
+        return kernels.CTL_CLEAR
+    elif cmb_ctl == 'Down Advisory Corrective':
+        return kernels.CTL_DOWN
+    elif cmb_ctl == 'Up Advisory Corrective':
+        return kernels.CTL_UP
+    elif cmb_ctl in ('Preventive', 'Drop Track', 'Altitude Lost'):
+        return kernels.CTL_HOLD
+    return kernels.CTL_OTHER
+
+
+def tcas_ra_states(tcas_ctl, tcas_up, tcas_down):
+    '''(combined control codes, up advisory active, down advisory active) at every sample'''
+    return (state_codes(tcas_ctl.array, tcas_ctl_code, kernels.CTL_OTHER),
+            state_codes(tcas_up.array, lambda s: s.lower()!='no up advisory', False),
+            state_codes(tcas_down.array, lambda s: s.lower()!='no down advisory', False))
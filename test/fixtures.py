@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+fixtures.py
+
+stand-ins for the analysis_engine node types, shared by the tests of the
+derivation helpers (node release, copy on write, concurrent derive, dtype
+policy, derived writer), which run without FlightDataAnalyzer installed
+
+    from fixtures import Attribute, Node, NodeManager, Param, States, node_class, series
+"""
+import numpy as np
+
+TCAS_STATES = {0: 'No Advisory', 1: 'Up Advisory Corrective', 2: 'Down Advisory Corrective'}
+
+
+class Param(object):
+    '''a parameter node: an array with its frequency, offset and units'''
+    def __init__(self, array, frequency=1.0, offset=0.0, units=None):
+        self.array = array
+        self.frequency = frequency
+        self.offset = offset
+        self.units = units
+
+
+def series(value=0.0, size=1000, frequency=1.0):
+    '''a recorded parameter holding value throughout'''
+    return Param(np.ma.zeros(size) + value, frequency)
+
+
+class Attribute(object):
+    '''a flight attribute node'''
+    def __init__(self, value):
+        self.value = value
+        self.frequency = None
+
+
+class States(np.ma.MaskedArray):
+    '''
+    MappedArray-like: state codes with their values_mapping, which views and
+    copies carry over; assigning a state name stores its code
+    '''
+    values_mapping = TCAS_STATES
+
+    def __array_finalize__(self, obj):
+        np.ma.MaskedArray.__array_finalize__(self, obj)
+        self.values_mapping = getattr(obj, 'values_mapping', type(self).values_mapping)
+
+    def __setitem__(self, index, value):
+        if isinstance(value, str):
+            value = dict((v, k) for k, v in self.values_mapping.items())[value]
+        np.ma.MaskedArray.__setitem__(self, index, value)
+
+
+class Node(object):
+    '''a derived node class: name and dependencies; each test defines get_derived()'''
+    name = None
+    dependencies = ()
+
+    def __init__(self, frequency=1.0, offset=0.0):
+        self.frequency = frequency
+        self.offset = offset
+
+    @classmethod
+    def get_name(cls):
+        return cls.name
+
+    @classmethod
+    def get_dependency_names(cls):
+        return list(cls.dependencies)
+
+
+def node_class(name, dependencies=(), base=Node, **attributes):
+    '''a subclass of base named after the node, e.g. node_class('Speed', ['Distance'])'''
+    attributes.update(name=name, dependencies=dependencies)
+    return type(name.replace(' ', ''), (base,), attributes)
+
+
+class NodeManager(object):
+    '''the parts of analysis_engine's NodeManager the helpers read'''
+    def __init__(self, derived_nodes, hdf_keys=(), requested=(), attributes=None):
+        self.derived_nodes = derived_nodes
+        self.hdf_keys = list(hdf_keys)
+        self.requested = list(requested)
+        self.attributes = attributes or {}
+
+    def get_attribute(self, name):
+        return Attribute(self.attributes[name]) if name in self.attributes else None
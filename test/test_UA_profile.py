@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+test_UA_profile.py
+
+unit tests for the UA profile's Vref lookup
+"""
+import numpy as np
+import unittest
+
+from analysis_engine.node import A, P, Section, SectionNode
+
+import UA_profile as ua
+
+
+def buildsections(*args):
+    '''from FlightDataAnalyzer tests
+       Example: approach = buildsections('Approach', [80,90], [100,110])
+    '''
+    name = args[0]
+    return SectionNode(name, items=[Section(name, slice(begin, end, None), begin, end) for begin, end in args[1:]])
+
+
+class TestAirspeedReferenceVref(unittest.TestCase):
+    def setUp(self):
+        self.airspeed = P('Airspeed', array=np.ma.ones(40) * 140.0, frequency=1., offset=0.)
+        flap = np.ma.zeros(40)
+        flap[8:15] = 25
+        flap[10:15] = 30     # first approach lands at flap 30
+        flap[28:35] = 25     # the second only reaches flap 25
+        self.flap = P('Flap', array=flap, frequency=1., offset=0.)
+        gw = np.ma.ones(40) * 170000.0
+        gw[20:] = 180000.0
+        self.gw = P('Gross Weight Smoothed', array=gw, frequency=1., offset=0.)
+        self.approaches = buildsections('Approach And Landing', [5, 15], [25, 35])
+
+    def derive(self, family):
+        node = ua.AirspeedReferenceVref()
+        node.derive(self.airspeed, self.flap, self.gw, None, A('Series', family + '-400'), A('Family', family),
+                    None, None, None, None, None, self.approaches)
+        return node
+
+    def test_derive_approaches(self):
+        node = self.derive('B747')
+        # every approach looked up in one call, each at its own max flap sample
+        np.testing.assert_array_equal(node.array[5:15], [114.0] * 10)    # flap 30 at 170t
+        np.testing.assert_array_equal(node.array[25:35], [123.0] * 10)   # flap 25 at 180t
+        self.assertTrue(node.array[:5].mask.all())
+        self.assertTrue(node.array[15:25].mask.all())
+
+    def test_unknown_aircraft(self):
+        node = self.derive('XYZ')   # no Vref table: a warning, not an error
+        self.assertFalse(np.ma.count(node.array))
+
+
+if __name__=='__main__':
+    print 'testing UA profile'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+test_availability.py
+
+unit tests for the cross-flight parameter availability matrix
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from availability import AvailabilityMatrix
+
+TCAS_MAPPING = '{"0": "No Advisory", "4": "Up Advisory Corrective"}'
+
+METADATA = [
+    ('a320_1.hdf5', {'Altitude AAL': (1.0, 'Signed', None, 0, 3600),
+                     'ILS Glideslope': (2.0, 'Signed', None, 360, 7200)}),
+    ('b747_1.hdf5', {'Altitude AAL': (1.0, 'Signed', None, 10, 3600),
+                     'TCAS Combined Control': (1.0, 'Multi-state', TCAS_MAPPING, 0, 3600)}),
+    ('b747_2.hdf5', {'Altitude AAL': (1.0, 'Signed', None, 0, 3600),
+                     'ILS Glideslope': (2.0, 'Signed', None, 0, 7200),
+                     'TCAS Combined Control': (1.0, 'Multi-state', TCAS_MAPPING, 0, 3600)}),
+    ('broken.hdf5', {}),
+    ('lost.hdf5', None),   # unreadable
+]
+
+
+class TestAvailabilityMatrix(unittest.TestCase):
+    def setUp(self):
+        self.matrix = AvailabilityMatrix.from_metadata(METADATA)
+
+    def test_matrix(self):
+        self.assertEqual(self.matrix.params, ['Altitude AAL', 'ILS Glideslope', 'TCAS Combined Control'])
+        self.assertEqual(self.matrix.present.shape, (5, 3))
+        self.assertEqual(self.matrix.flights_with(['TCAS Combined Control', 'ILS Glideslope']), ['b747_2.hdf5'])
+        self.assertEqual(self.matrix.flights_with(['Airspeed']), [])
+        self.assertEqual(self.matrix.fraction('TCAS Combined Control'), 0.5)   # of the readable flights
+        np.testing.assert_array_almost_equal(self.matrix.masked_fraction('ILS Glideslope'), [0.05, np.nan, 0.0, np.nan, np.nan])
+        self.assertEqual(self.matrix.unreadable, ['lost.hdf5'])
+        self.assertEqual(self.matrix.param_info['TCAS Combined Control']['values_mapping'], TCAS_MAPPING)
+
+    def test_prune(self):
+        keep, dropped = self.matrix.prune(['a320_1.hdf5', 'b747_1.hdf5', 'new.hdf5', 'lost.hdf5', 'broken.hdf5'],
+                                          ['TCAS Combined Control'])
+        self.assertEqual(keep, ['b747_1.hdf5', 'new.hdf5', 'lost.hdf5'])   # not scanned or not read, so kept
+        self.assertEqual(dropped, ['a320_1.hdf5', 'broken.hdf5'])
+
+    def test_save_load(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'availability.npz')
+            self.matrix.save(path)
+            loaded = AvailabilityMatrix.load(path)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual(loaded.flights, self.matrix.flights)
+        self.assertEqual(loaded.params, self.matrix.params)
+        self.assertEqual(loaded.unreadable, ['lost.hdf5'])
+        np.testing.assert_array_equal(loaded.present, self.matrix.present)
+        np.testing.assert_array_equal(loaded.frequency, self.matrix.frequency)
+        self.assertEqual(loaded.flights_with(['ILS Glideslope']), ['a320_1.hdf5', 'b747_2.hdf5'])
+
+
+if __name__=='__main__':
+    print 'testing availability'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
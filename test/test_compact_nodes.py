@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+test_compact_nodes.py
+
+unit tests for the array-backed KPV/KTI containers
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from compact_nodes import (CompactKPVs, CompactKTIs, NameTable, snapshot_kpvs, state_change_kpvs,
+                           values_at_indices)
+
+
+class TestNameTable(unittest.TestCase):
+    def test_interning(self):
+        names = NameTable()
+        self.assertEqual(list(names.codes(['a', 'b', 'a'])), [0, 1, 0])
+        self.assertEqual(names.names, ['a', 'b'])
+
+
+class TestCompactKPVs(unittest.TestCase):
+    def setUp(self):
+        self.kpvs = CompactKPVs()
+        self.kpvs.extend([2., 3.], [1., 0.], ['Up|B', 'Up|A'])
+        self.kpvs.extend([7.], [1.], 'Up|B')
+
+    def test_columns(self):
+        self.assertEqual(len(self.kpvs), 3)
+        self.assertEqual(self.kpvs.records['index'].tolist(), [2., 3., 7.])
+        self.assertEqual(list(self.kpvs.item_names()), ['Up|B', 'Up|A', 'Up|B'])
+        self.assertEqual(self.kpvs.names, ['Up|B', 'Up|A'])
+
+    def test_pickle(self):
+        self.assertEqual(pickle.loads(pickle.dumps(self.kpvs, 2)), self.kpvs)
+
+    def test_buffer(self):
+        names, buf = self.kpvs.to_buffer()
+        self.assertEqual(CompactKPVs.from_buffer(names, buf), self.kpvs)
+
+    def test_save_load(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'kpvs.npy')
+            self.kpvs.save(path)
+            loaded = CompactKPVs.load(path)
+            self.assertTrue(isinstance(loaded.records, np.memmap))
+            self.assertEqual(loaded, self.kpvs)
+        finally:
+            shutil.rmtree(tempdir)
+
+
+class TestCompactKTIs(unittest.TestCase):
+    def test_extend(self):
+        ktis = CompactKTIs()
+        ktis.extend(np.arange(3.), 'Touchdown')
+        self.assertEqual(list(ktis.item_names()), ['Touchdown'] * 3)
+
+
+class MappedStates(np.ma.MaskedArray):
+    '''minimal stand-in for an analysis_engine MappedArray'''
+    values_mapping = {0: 'A', 1: 'B', 4: 'Up Advisory Corrective'}
+
+
+class TestStateChangeKPVs(unittest.TestCase):
+    def test_changes(self):
+        array = np.ma.array([0, 0, 1, 0, 0]).view(MappedStates)
+        kpvs = state_change_kpvs(array, 'TCAS Up Advisory')
+        self.assertEqual(kpvs.records['index'].tolist(), [2., 3.])
+        self.assertEqual(kpvs.records['value'].tolist(), [1., 0.])
+        self.assertEqual(list(kpvs.item_names()), ['TCAS Up Advisory|B', 'TCAS Up Advisory|A'])
+
+    def test_masked_and_nonzero(self):
+        array = np.ma.array([0, 4, 0, 1], mask=[0, 0, 0, 1]).view(MappedStates)
+        kpvs = state_change_kpvs(array, 'TCAS Combined Control', nonzero=True)
+        self.assertEqual(list(kpvs.item_names()),
+                         ['TCAS Combined Control|Up Advisory Corrective', 'TCAS Combined Control|masked'])
+
+
+def value_at_index(array, index):
+    '''library.value_at_index, one index at a time'''
+    if index < 0.0:
+        return array[0]
+    elif index > len(array) - 1:
+        return array[-1]
+    low = int(index)
+    if low == index:
+        return array[low]
+    high = low + 1
+    r = index - low
+    if array.mask[low] and array.mask[high]:
+        return np.ma.masked
+    elif array.mask[low]:
+        return array.data[high]
+    elif array.mask[high]:
+        return array.data[low]
+    return r * (array.data[high] - array.data[low]) + array.data[low]
+
+
+class Index(object):
+    def __init__(self, index):
+        self.index = index
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_same_as_value_at_index(self):
+        array = np.ma.array([-2., 5., -1., 3., 8., -4.], mask=[0, 0, 1, 1, 0, 0])
+        indices = [-1, 0, 0.5, 1, 1.5, 2, 2.5, 3.25, 4, 4.5, 5, 7]
+        values, valid = values_at_indices(array, indices)
+        for i, index in enumerate(indices):
+            expected = value_at_index(array, index)
+            self.assertEqual(valid[i], expected is not np.ma.masked, index)
+            if valid[i]:
+                self.assertAlmostEqual(values[i], expected)
+
+    def test_kpvs(self):
+        roll = np.ma.array([-10., -20., 30., 40.], mask=[0, 0, 0, 1])
+        kpvs = snapshot_kpvs([Index(1), Index(1.5), Index(3)], [('Roll Abs', roll, np.abs),
+                                                                 ('Roll', roll, None),
+                                                                 ('Unmasked', np.arange(4), None)])
+        self.assertEqual(list(kpvs.item_names()), ['Roll Abs'] * 2 + ['Roll'] * 2 + ['Unmasked'] * 3)
+        self.assertEqual(kpvs.records['index'].tolist(), [1., 1.5, 1., 1.5, 1., 1.5, 3.])
+        self.assertEqual(kpvs.records['value'].tolist(), [20., 25., -20., 5., 1., 1.5, 3.])
+        self.assertEqual(len(snapshot_kpvs([], [('Roll', roll, None)])), 0)
+
+
+if __name__=='__main__':
+    print 'testing compact nodes'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+test_concurrent_derive.py
+
+unit tests for deriving independent nodes of a flight on a thread pool
+"""
+import unittest
+
+import numpy as np
+
+from concurrent_derive import _protect, derive_parameters_concurrent, waves
+from copy_on_write import CopyOnWriteInputs
+from fixtures import Node, NodeManager, node_class, series
+
+
+class FakeNode(Node):
+    '''derived node: array = sum of the dependency arrays + offset_value; zero_input: zero the first input first'''
+    offset_value = 0.0
+    zero_input = False
+
+    def get_derived(self, args):
+        if self.zero_input:
+            args[0].array[:100] = 0.0                   # as DistanceTravelledInAir does to airspeed
+        total = np.ma.zeros(20000)
+        for arg in args:
+            if arg is not None and hasattr(arg, 'array'):
+                total = total + arg.array
+        total[0] = len([a for a in args if a is None])   # writes a fresh array, not an input
+        self.array = np.ma.sqrt(total * total) + self.offset_value
+        return self
+
+
+def fake_node(name, dependencies, offset_value=0.0, zero_input=False):
+    return node_class(name, dependencies, FakeNode, offset_value=offset_value, zero_input=zero_input)
+
+
+class FakeFlight(object):
+    def __init__(self):
+        self.series = {'Vertical Speed': series(3.0, size=20000), 'Airspeed': series(250.0, size=20000)}
+
+
+class TestConcurrentDerive(unittest.TestCase):
+    def setUp(self):
+        classes = [fake_node('Sections', ['Vertical Speed']),
+                   fake_node('Std Response', ['Sections', 'Vertical Speed'], 1.0),
+                   fake_node('Exceedance', ['Std Response', 'Vertical Speed']),
+                   fake_node('Start Airspeed', ['Airspeed', 'Sections']),
+                   fake_node('State Changes', ['Vertical Speed', 'Missing']),
+                   fake_node('Mydict Attribute', ['Mydict'])]
+        self.node_mgr = NodeManager(dict((c.name, c) for c in classes),
+                                    ['Vertical Speed', 'Airspeed'], attributes={'Mydict': {}})
+        self.order = ['Vertical Speed', 'Airspeed', 'Mydict', 'Sections', 'State Changes', 'Mydict Attribute',
+                      'Std Response', 'Start Airspeed', 'Exceedance']
+        self.flight = FakeFlight()
+
+    def test_waves(self):
+        self.assertEqual(waves(self.node_mgr, self.order),
+                         [['Sections', 'State Changes', 'Mydict Attribute'],
+                          ['Std Response', 'Start Airspeed'], ['Exceedance']])
+        self.assertEqual(waves(self.node_mgr, self.order, precomputed={'Sections': None})[0],
+                         ['State Changes', 'Mydict Attribute', 'Std Response', 'Start Airspeed'])
+
+    def test_same_as_serial(self):
+        serial = derive_parameters_concurrent(self.flight, self.node_mgr, self.order, workers=1)
+        for attempt in range(5):
+            params = derive_parameters_concurrent(self.flight, self.node_mgr, self.order, workers=4)
+            self.assertEqual(sorted(params), sorted(serial))
+            for name in params:
+                np.testing.assert_array_equal(params[name].array, serial[name].array)
+        self.assertEqual(params['Exceedance'].array[1], 10.0)
+        self.assertEqual(params['State Changes'].array[0], 1.0)   # 'Missing' was None
+        self.assertEqual(self.flight.series['Vertical Speed'].array[0], 3.0)
+
+    def test_inputs_protected(self):
+        vertspd, airspeed = self.flight.series['Vertical Speed'], self.flight.series['Airspeed']
+        jobs = _protect([('Sections', None, [vertspd]),
+                         ('State Changes', None, [vertspd, None]),
+                         ('Start Airspeed', None, [airspeed])])
+        self.assertFalse(jobs[0][2][0] is vertspd)
+        self.assertTrue(jobs[0][2][0].array is not jobs[1][2][0].array)
+        self.assertTrue(jobs[1][2][1] is None)
+        self.assertFalse(jobs[2][2][0] is airspeed)      # one reader, still its own view
+        self.assertFalse(jobs[2][2][0].array.flags.writeable)
+
+    def test_mutating_node_same_as_serial(self):
+        # Zeroed Airspeed is in the first wave, Start Airspeed, ahead of it in the process order, in the second
+        self.node_mgr.derived_nodes['Zeroed Airspeed'] = fake_node('Zeroed Airspeed', ['Airspeed'], zero_input=True)
+        order = self.order[:7] + ['Start Airspeed', 'Zeroed Airspeed', 'Exceedance']
+        params = dict(self.flight.series)
+        with CopyOnWriteInputs(node_base=FakeNode):
+            for name in order[3:]:
+                if name != 'Mydict Attribute':
+                    cls = self.node_mgr.derived_nodes[name]
+                    params[name] = cls().get_derived([params.get(d) for d in cls.get_dependency_names()])
+        concurrent = derive_parameters_concurrent(self.flight, self.node_mgr, order, workers=4)
+        for name in order[3:]:
+            if name != 'Mydict Attribute':
+                np.testing.assert_array_equal(concurrent[name].array, params[name].array)
+        self.assertEqual(concurrent['Start Airspeed'].array[1], 253.0)    # 250 kt, before the zeroing
+        self.assertEqual(concurrent['Zeroed Airspeed'].array[1], 0.0)
+        self.assertEqual(self.flight.series['Airspeed'].array[1], 250.0)
+
+    def test_no_dependencies(self):
+        self.node_mgr.derived_nodes['Orphan'] = fake_node('Orphan', ['Missing'])
+        self.assertRaises(RuntimeError, derive_parameters_concurrent, self.flight, self.node_mgr,
+                          self.order + ['Orphan'], workers=2)
+
+
+if __name__=='__main__':
+    print 'testing concurrent derive'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+test_copy_on_write.py
+
+unit tests for the copy-on-write node inputs
+"""
+import pickle
+import unittest
+
+import numpy as np
+
+import copy_on_write
+from copy_on_write import CopyOnWriteInputs, protect
+from fixtures import Attribute, Node, Param, States
+
+
+class FakeNode(Node):
+    def get_derived(self, args):
+        airspeed, tcas, mydict = args
+        airspeed.array[2:4] = 0.0                     # DistanceTravelledInAir
+        dn_idx = np.ma.where(tcas.array == 2)
+        tcas.array[dn_idx] = 'Up Advisory Corrective'  # TCASRAStart
+        mydict.value['testkey'] = [1, 2, 3]          # MydictAttribute
+        self.args = args
+        return self
+
+
+class TestCopyOnWrite(unittest.TestCase):
+    def setUp(self):
+        copy_on_write.reset_stats()
+        self.array = np.ma.array(np.arange(10.), mask=[0] * 9 + [1])
+        self.param = Param(self.array)
+
+    def test_reads_share(self):
+        shared = protect(self.param)
+        self.assertFalse(shared.array.flags.writeable)
+        self.assertTrue(np.may_share_memory(shared.array, self.array))
+        self.assertEqual(shared.array.sum(), 36.0)
+        self.assertEqual(copy_on_write.stats()['copies'], 0)
+        self.assertEqual(copy_on_write.stats()['bytes_shared'], 90)
+
+    def test_first_write_copies(self):
+        shared = protect(self.param)
+        shared.array[2] = -1
+        shared.array[3] = -1
+        shared.array += 1
+        self.assertEqual(shared.array[:5].tolist(), [1., 2., 0., 0., 5.])
+        self.assertEqual(self.array[:5].tolist(), [0., 1., 2., 3., 4.])
+        self.assertTrue(self.param.array is self.array)
+        self.assertEqual(copy_on_write.stats()['copies'], 1)
+        other = protect(self.param)
+        other.array.mask = True
+        self.assertEqual(self.array.count(), 9)
+        self.assertEqual(copy_on_write.stats()['copies'], 2)
+
+    def test_output_aliases_input(self):
+        # self.array = param.array; self.array[i] = v, as FDS base nodes and AirspeedReferenceVref do
+        class Output(object):
+            pass
+        shared = protect(self.param)
+        output = Output()
+        output.array = shared.array
+        output.array[0] = 99
+        self.assertEqual(output.array[:3].tolist(), [99., 1., 2.])
+        self.assertTrue(output.array is shared.array)
+        self.assertEqual(self.array[:3].tolist(), [0., 1., 2.])
+        alias = protect(self.param).array
+        alias[:] = np.ma.masked
+        self.assertEqual(alias.count(), 0)
+        self.assertEqual(self.array.count(), 9)
+        self.assertEqual(copy_on_write.stats()['copies'], 2)
+
+    def test_alias_slices_are_read_only(self):
+        shared = protect(self.param)
+        def write_slice():
+            shared.array[2:4][0] = 5
+        self.assertRaises(ValueError, write_slice)
+        self.assertEqual(self.array[2], 2.)
+
+    def test_strided_input(self):
+        strided = Param(np.ma.arange(20.)[::2])
+        shared = protect(strided)
+        shared.array[0] = -1
+        self.assertEqual(shared.array[:3].tolist(), [-1., 2., 4.])
+        self.assertEqual(strided.array[:3].tolist(), [0., 2., 4.])
+        self.assertEqual(copy_on_write.stats()['copies'], 1)
+
+    def test_fortran_input(self):
+        fortran = Param(np.ma.array(np.asfortranarray(np.arange(6.).reshape(2, 3))))
+        shared = protect(fortran)
+        self.assertTrue(np.may_share_memory(shared.array, fortran.array))
+        shared.array[0, 1] = -1
+        self.assertEqual(shared.array.tolist(), [[0., -1., 2.], [3., 4., 5.]])
+        self.assertEqual(fortran.array.tolist(), [[0., 1., 2.], [3., 4., 5.]])
+
+    def test_pickle_as_base_class(self):
+        loaded = pickle.loads(pickle.dumps(protect(self.param).array, 2))
+        self.assertEqual(type(loaded), np.ma.MaskedArray)
+        self.assertEqual(loaded.tolist(), self.array.tolist())
+
+    def test_nodes(self):
+        tcas = Param(np.ma.array([0, 2, 2, 1, 0]).view(States))
+        mydict = Attribute({'Myfile': 'flight.hdf5'})
+        with CopyOnWriteInputs(node_base=FakeNode):
+            node = FakeNode().get_derived([self.param, tcas, mydict])
+        airspeed, tcas_copy, mydict_copy = node.args
+        self.assertEqual(airspeed.array[:4].tolist(), [0., 1., 0., 0.])
+        self.assertEqual(self.array[:4].tolist(), [0., 1., 2., 3.])
+        self.assertEqual(tcas_copy.array.tolist(), [0, 1, 1, 1, 0])
+        self.assertEqual(tcas.array.tolist(), [0, 2, 2, 1, 0])
+        self.assertTrue(isinstance(tcas_copy.array, States))
+        self.assertEqual(mydict.value, {'Myfile': 'flight.hdf5'})
+        self.assertEqual(copy_on_write.stats(), {'shared': 2, 'bytes_shared': 90 + tcas.array.nbytes,
+                                                 'copies': 2, 'bytes_copied': 90 + tcas.array.nbytes,
+                                                 'attribute_copies': 1})
+        self.assertEqual(FakeNode.get_derived.__name__, 'get_derived')
+
+
+if __name__=='__main__':
+    print 'testing copy on write'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
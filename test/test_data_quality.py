@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+test_data_quality.py
+
+unit tests for the batch mask diagnostics
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from data_quality import MaskStats, prune, scan
+
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+
+
+def clump_stats(mask):
+    '''the per-series loop the scanner replaces'''
+    clumps = np.ma.clump_masked(np.ma.array(np.zeros(len(mask)), mask=mask))
+    lengths = [s.stop - s.start for s in clumps]
+    return len(clumps), sum(lengths), max(lengths) if lengths else 0
+
+
+class TestMaskStats(unittest.TestCase):
+    def test_same_as_clump_masked(self):
+        rng = np.random.RandomState(3)
+        masks = [rng.rand(n) < p for n, p in [(1000, 0.1), (50, 0.9), (7, 0.0), (300, 1.0), (64, 0.5)]]
+        masks.append(np.array([True, False, True, True]))   # gaps at both ends
+        stats = MaskStats.from_masks(['p%d' % i for i in range(len(masks))], masks, [1.0] * len(masks))
+        for i, mask in enumerate(masks):
+            gaps, masked, longest = clump_stats(mask)
+            self.assertEqual((stats.gaps[i], stats.masked[i], stats.longest_gap[i]), (gaps, masked, longest), i)
+            self.assertEqual(stats.samples[i], len(mask))
+
+    def test_empty(self):
+        stats = MaskStats.from_masks(['a', 'b'], [np.zeros(0, bool), np.zeros(5, bool)], [1.0, 1.0])
+        self.assertEqual(list(stats.gaps), [0, 0])
+        self.assertTrue(np.isnan(stats.masked_fraction()[0]))
+        self.assertEqual(len(MaskStats.from_masks([], [], [])), 0)
+
+    def test_check(self):
+        gs = np.zeros(100, bool)
+        gs[10:40] = True
+        stats = MaskStats.from_masks(['ILS Glideslope', 'Altitude AAL'], [gs, np.zeros(100, bool)], [2.0, 1.0])
+        self.assertEqual(stats.get('ILS Glideslope')['longest_gap_sec'], 15.0)
+        thresholds = {'ILS Glideslope': {'max_masked_fraction': 0.2, 'max_gap_sec': 10},
+                      'Altitude AAL': {'max_gaps': 0}, 'TCAS RA': {}}
+        self.assertEqual(stats.check(thresholds), [('ILS Glideslope', 'masked fraction 0.300'),
+                                                   ('ILS Glideslope', 'masked gap of 15.0 sec'),
+                                                   ('TCAS RA', 'not recorded')])
+        keep, dropped = prune({'bad.hdf5': stats}, {'Altitude AAL': {'max_gaps': 0}})
+        self.assertEqual(keep, ['bad.hdf5'])
+        keep, dropped = prune({'bad.hdf5': stats, 'lost.hdf5': None}, thresholds)
+        self.assertEqual((keep, sorted(dropped)), (['lost.hdf5'], ['bad.hdf5']))   # unreadable, so kept
+        self.assertEqual(stats.worst(top=1, key='masked'), ['ILS Glideslope'])
+
+    @unittest.skipUnless(H5PY_AVAILABLE, 'needs h5py')
+    def test_scan_unreadable(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            good, broken = os.path.join(tempdir, 'good.hdf5'), os.path.join(tempdir, 'broken.hdf5')
+            with h5py.File(good, 'w') as hdf:
+                group = hdf.create_group('series').create_group('Altitude AAL')
+                group.create_dataset('data', data=np.zeros(10))
+                group.create_dataset('mask', data=np.arange(10) < 3)
+                group.attrs['frequency'] = 1.0
+            with open(broken, 'wb') as f:
+                f.write('not hdf5')
+            stats = scan([good, broken, os.path.join(tempdir, 'gone.hdf5')], processes=2)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual(stats[good].get('Altitude AAL')['masked'], 3)
+        self.assertEqual(sorted(f for f, s in stats.items() if s is None),
+                         [broken, os.path.join(tempdir, 'gone.hdf5')])
+
+
+if __name__=='__main__':
+    print 'testing data quality'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+test_dependency_cache.py
+
+unit tests for the memoised dependency order
+"""
+import unittest
+
+from dependency_cache import DependencyOrderCache
+
+
+class AltitudeMax(object):
+    pass
+
+
+class FakeNodeManager(object):
+    def __init__(self, hdf_keys, family='B747'):
+        self.requested = ['Altitude Max']
+        self.hdf_keys = hdf_keys
+        self.derived_nodes = {'Altitude Max': AltitudeMax, 'Altitude AAL': 'a Parameter, not a class'}
+        self.aircraft_info = {'Family': family, 'Tail Number': None}
+        self.achieved_flight_record = {'Myfile': 'flight.hdf5', 'Mydict': {}}
+
+
+class TestDependencyOrderCache(unittest.TestCase):
+    def setUp(self):
+        self.computed = []
+        self.cache = DependencyOrderCache(maxsize=2, order=self.order)
+
+    def order(self, node_mgr, draw=False):
+        self.computed.append(node_mgr)
+        return ['Altitude AAL', 'Altitude Max'], 'graph'
+
+    def test_one_sort_per_fleet(self):
+        cache = DependencyOrderCache(maxsize=3, order=self.order)
+        fleets = [(['Altitude AAL'], 'B747'), (['Altitude AAL', 'Airspeed'], 'B747'), (['Altitude AAL'], 'A320')]
+        for flight in range(100):
+            hdf_keys, family = fleets[flight % 3]
+            order, graph = cache.dependency_order(FakeNodeManager(list(hdf_keys), family))
+        self.assertEqual(order, ['Altitude AAL', 'Altitude Max'])
+        self.assertEqual(len(self.computed), 3)
+        self.assertEqual(cache.info()['hits'], 97)
+
+    def test_lru_eviction(self):
+        for keys in (['a'], ['b'], ['a'], ['c'], ['a']):
+            self.cache.dependency_order(FakeNodeManager(keys))
+        # 'b' was least recently used when 'c' arrived
+        self.assertEqual(self.cache.info(), {'hits': 2, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2})
+
+    def test_order_is_a_copy(self):
+        order, graph = self.cache.dependency_order(FakeNodeManager(['a']))
+        order.append('My Node')
+        self.assertEqual(self.cache.dependency_order(FakeNodeManager(['a']))[0], ['Altitude AAL', 'Altitude Max'])
+
+    def test_draw_is_not_cached(self):
+        self.cache.dependency_order(FakeNodeManager(['a']), draw=True)
+        self.cache.dependency_order(FakeNodeManager(['a']), draw=True)
+        self.assertEqual(len(self.computed), 2)
+
+
+if __name__=='__main__':
+    print 'testing dependency cache'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+test_derived_writer.py
+
+unit tests for the write-behind writer of derived parameters
+"""
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from derived_writer import DerivedWriter, compression_options, section_windows
+from fixtures import Param, States
+
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+
+
+class Section(object):
+    def __init__(self, start_edge, stop_edge):
+        self.start_edge = start_edge
+        self.stop_edge = stop_edge
+
+
+class Sections(list):
+    frequency = 1.0
+
+
+class SlowWrite(object):
+    '''stand-in for write_hdf5: takes its time, and remembers what it was given'''
+    def __init__(self, seconds=0.1):
+        self.seconds = seconds
+        self.written = {}
+        self.threads = set()
+
+    def __call__(self, path, records, compression, chunk_size):
+        time.sleep(self.seconds)
+        self.threads.add(threading.current_thread().name)
+        self.written[os.path.basename(path)] = dict(records)
+        return 100
+
+
+class TestDerivedWriter(unittest.TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.params = {'TCAS RA Standard Response': Param(np.ma.arange(100.), units='fpm'),
+                       'TCAS Combined Control': Param(np.ma.zeros(100, dtype=np.int8).view(States)),
+                       'TCAS RA Sections': Sections([Section(40.2, 49.8)]),
+                       'TCAS RA Reaction Delay': Param([('TCAS RA Reaction Delay', 3.5)])}
+
+    def tearDown(self):
+        shutil.rmtree(self.output_dir)
+
+    def test_section_windows(self):
+        keep = section_windows(100, 2.0, self.params['TCAS RA Sections'], margin=5.0)
+        self.assertEqual(np.flatnonzero(keep)[[0, -1]].tolist(), [70, 99])   # 35.2 sec at 2Hz, to the end
+        keep = section_windows(100, 1.0, self.params['TCAS RA Sections'])
+        self.assertEqual(np.flatnonzero(keep).tolist(), range(40, 51))
+
+    def test_compression_options(self):
+        self.assertEqual(compression_options('lzf')['compression'], 'lzf')
+        self.assertEqual(compression_options(None), {})
+        self.assertTrue(compression_options('blosc'))   # lzf when hdf5plugin is not installed
+        self.assertRaises(ValueError, DerivedWriter, self.output_dir, compression='zip')
+
+    def test_write_behind(self):
+        write = SlowWrite(0.1)
+        writer = DerivedWriter(self.output_dir, write=write, max_pending=4)
+        t0 = time.time()
+        for flight in ('flight_1.hdf5', 'flight_2.hdf5', 'flight_3.hdf5'):
+            writer.submit(flight, self.params, sections=self.params['TCAS RA Sections'], margin=5.0)
+        self.assertTrue(time.time() - t0 < 0.1)   # the derivation carries on while files are written
+        writer.close()
+        self.assertEqual(sorted(write.written), ['flight_1.hdf5', 'flight_2.hdf5', 'flight_3.hdf5'])
+        self.assertEqual(write.threads, set(['derived-writer']))
+        records = write.written['flight_2.hdf5']
+        self.assertEqual(sorted(records), ['TCAS Combined Control', 'TCAS RA Standard Response'])
+        response = records['TCAS RA Standard Response']
+        self.assertEqual(np.flatnonzero(~response['mask']).tolist(), range(35, 56))
+        self.assertEqual(response['data'][34], 0.0)
+        self.assertEqual(response['data'][35], 35.0)
+        self.assertEqual(response['units'], 'fpm')
+        self.assertEqual(self.params['TCAS RA Standard Response'].array[34], 34.0)   # node untouched
+        self.assertTrue('"1": "Up Advisory Corrective"' in records['TCAS Combined Control']['values_mapping'])
+        stats = writer.stats()
+        self.assertEqual((stats['files'], stats['datasets'], stats['bytes_written'], stats['pending']),
+                         (3, 6, 300, 0))
+        self.assertEqual(stats['bytes_in'], 3 * (800 + 100 + 100 + 100))
+        self.assertTrue(stats['seconds'] >= 0.3)
+
+    def test_error_surfaces(self):
+        def broken(path, records, compression, chunk_size):
+            raise IOError('disk full')
+        writer = DerivedWriter(self.output_dir, write=broken)
+        writer.submit('flight_1', self.params)
+        self.assertRaises(IOError, writer.flush)
+        writer.close()
+
+    @unittest.skipUnless(H5PY_AVAILABLE, 'needs h5py')
+    def test_hdf5(self):
+        with DerivedWriter(self.output_dir, compression='lzf') as writer:
+            writer.submit('flight_1.hdf5', self.params, names=['TCAS RA Standard Response'],
+                          sections=self.params['TCAS RA Sections'])
+        path = os.path.join(self.output_dir, 'flight_1.hdf5')
+        with h5py.File(path, 'r') as hdf:
+            group = hdf['series']['TCAS RA Standard Response']
+            self.assertEqual(group['data'].compression, 'lzf')
+            self.assertEqual(group['data'][45], 45.0)
+            self.assertEqual(group['mask'][:].sum(), 100 - 11)
+            self.assertEqual(group.attrs['units'], 'fpm')
+        self.assertEqual(os.listdir(self.output_dir), ['flight_1.hdf5'])
+
+
+if __name__=='__main__':
+    print 'testing derived writer'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+test_dtype_policy.py
+
+unit tests for the compact dtype policy of derived arrays, and its tolerances
+"""
+import unittest
+
+import numpy as np
+
+import dtype_policy
+from dtype_policy import DtypePolicy, compact, state_dtype
+from fixtures import Node, NodeManager, States, node_class
+
+
+class FakeNode(Node):
+    '''a node deriving a given array'''
+    def __init__(self, array, name=None):
+        self.made = array
+        self.name = name
+
+    def get_derived(self, args):
+        self.array = self.made
+        return self
+
+
+class TestDtypePolicy(unittest.TestCase):
+    def setUp(self):
+        dtype_policy.set_policy()
+        dtype_policy.reset_stats()
+
+    def tearDown(self):
+        dtype_policy.reset_policy()
+
+    def test_float32_within_tolerance(self):
+        # vertical speed and altitude in their flight ranges: float32 holds them to well under 0.01
+        vertspd = np.ma.array(np.linspace(-6000., 6000., 10001) + 1./3)
+        altitude = np.ma.array(np.linspace(0., 45000., 10001) + 1./3, mask=[False] * 10000 + [True])
+        for array in (vertspd, altitude):
+            narrow = compact(array)
+            self.assertEqual(narrow.dtype, np.float32)
+            self.assertTrue(np.abs(narrow.astype(np.float64) - array).max() <= 0.01)
+        self.assertEqual(narrow.mask.tolist(), altitude.mask.tolist())
+        self.assertEqual(dtype_policy.stats(), {'narrowed': 2, 'kept': 0, 'bytes_saved': 2 * 4 * 10001})
+
+    def test_out_of_tolerance_kept(self):
+        epoch = np.ma.array(1.4e9 + np.arange(100.) / 8)     # seconds since 1970 at 8Hz
+        self.assertTrue(compact(epoch) is epoch)
+        masked = np.ma.array([1.0, 1.4e9 + 0.1], mask=[False, True])  # only the masked sample is out
+        self.assertEqual(compact(masked).dtype, np.float32)
+        with_nan = np.ma.array([1.0, np.nan, np.inf])
+        self.assertEqual(compact(with_nan).dtype, np.float32)
+        dtype_policy.set_policy(atol=1e-9)
+        self.assertEqual(compact(np.ma.array([0.5, 1.0])).dtype, np.float32)   # exact in float32
+        third = np.ma.array([1./3])
+        self.assertTrue(compact(third) is third)
+        self.assertEqual(compact(third, atol=1e-7).dtype, np.float32)
+        dtype_policy.set_policy(float_dtype=np.float64)
+        self.assertTrue(compact(third, atol=1.0) is third)
+
+    def test_state_codes(self):
+        self.assertEqual(state_dtype([0, 1, 2]), np.int8)
+        self.assertEqual(state_dtype([-1, 200]), np.int16)
+        self.assertEqual(state_dtype([0, 70000]), np.int32)
+        tcas = np.ma.array([0, 2, 2, 1, 0], mask=[0, 0, 0, 0, 1]).view(States)
+        tcas.values_mapping = {0: 'No Advisory', 1: 'Up Advisory Corrective', 2: 'Down Advisory Corrective'}
+        narrow = compact(tcas)
+        self.assertEqual(narrow.dtype, np.int8)
+        self.assertEqual(narrow.values_mapping, tcas.values_mapping)
+        self.assertEqual(narrow.tolist(), tcas.tolist())
+        self.assertEqual(type(narrow), States)
+        dtype_policy.set_policy(state_codes=False)
+        self.assertTrue(compact(tcas) is tcas)
+
+    def test_nodes(self):
+        ints = np.ma.arange(5)           # not multistate: counts are left alone
+        with DtypePolicy(['Speed', 'Count', 'Max Speed'], node_base=FakeNode):
+            speed = FakeNode(np.ma.array([250.5, 251.25]), 'Speed').get_derived([])
+            airspeed = FakeNode(np.ma.array([250.5, 251.25]), 'Airspeed').get_derived([])  # not a sink
+            count = FakeNode(ints, 'Count').get_derived([])
+            kpv = FakeNode([('Max Speed', 251.25)], 'Max Speed').get_derived([])
+        self.assertEqual(speed.array.dtype, np.float32)
+        self.assertEqual(airspeed.array.dtype, np.float64)
+        self.assertTrue(count.array is ints)
+        self.assertEqual(kpv.array, [('Max Speed', 251.25)])
+        self.assertEqual(FakeNode.get_derived.__name__, 'get_derived')
+
+    def test_no_policy_until_set(self):
+        dtype_policy.reset_policy()
+        self.assertEqual(dtype_policy.float_dtype(), np.float64)
+        with DtypePolicy(node_base=FakeNode):
+            self.assertEqual(dtype_policy.float_dtype(), np.float32)
+        self.assertEqual(dtype_policy.float_dtype(), np.float64)
+        dtype_policy.set_policy()
+        self.assertEqual(dtype_policy.float_dtype(), np.float32)
+
+    def test_sinks(self):
+        node_mgr = NodeManager({'Distance': node_class('Distance', ['Airspeed']),
+                                'Distance Max': node_class('Distance Max', ['Distance'])},
+                               ['Airspeed'], requested=['Distance', 'Distance Max'])
+        # Distance is requested but integrated further on: narrowed only once derivation is over
+        self.assertEqual(dtype_policy.sinks(node_mgr, ['Airspeed', 'Distance', 'Distance Max']),
+                         set(['Distance Max']))
+        params = {'Distance': FakeNode(np.ma.array([0.1, 0.2])).get_derived([])}
+        dtype_policy.compact_requested(node_mgr, params)
+        self.assertEqual(params['Distance'].array.dtype, np.float32)
+
+
+if __name__=='__main__':
+    print 'testing dtype policy'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
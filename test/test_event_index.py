@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+test_event_index.py
+
+unit tests for the sorted-index event lookups
+"""
+import unittest
+from collections import namedtuple
+
+import numpy as np
+
+from event_index import EventIndex, TransitionIndex
+
+Item = namedtuple('Item', 'index name')
+
+
+def within(index, _slice):
+    '''library.is_index_within_slice'''
+    return ((_slice.start is None or _slice.start <= index) and
+            (_slice.stop is None or index < _slice.stop))
+
+
+def get_next(items, index, within_slice=slice(None)):
+    '''KeyTimeInstanceNode.get_next, one item at a time'''
+    for item in sorted(items, key=lambda item: item.index):
+        if within(item.index, within_slice) and item.index > index:
+            return item
+
+
+def last_crossing(array, threshold, index):
+    '''index_at_value(array, threshold, slice(index, 0, -1)) for data that never sits on the threshold'''
+    for j in range(min(int(round(index)), len(array) - 1), 0, -1):
+        a, b = array[j] - threshold, array[j - 1] - threshold
+        if a * b < 0:
+            return j - a / (a - b)
+
+
+class TestEventIndex(unittest.TestCase):
+    def test_same_as_get_next(self):
+        rng = np.random.RandomState(1)
+        items = [Item(float(i), 'AP Disengaged Selection') for i in rng.randint(0, 500, 40)]
+        events = EventIndex(items)
+        for start in range(-5, 510, 7):
+            for _slice in (slice(start, start + 30), slice(start, None), slice(None, start), slice(None)):
+                self.assertEqual(events.next_after(start, within_slice=_slice), get_next(items, start, _slice))
+
+    def test_last_before_and_name(self):
+        events = EventIndex([Item(3., 'A'), Item(9., 'B'), Item(5., 'A')], name='A')
+        self.assertEqual(len(events), 2)
+        self.assertEqual(events.last_before(5.), Item(3., 'A'))
+        self.assertEqual(events.last_before(10., within_slice=slice(4, 6)), Item(5., 'A'))
+        self.assertEqual(events.last_before(3.), None)
+        self.assertEqual(EventIndex([]).next_after(0), None)
+
+
+class TestTransitionIndex(unittest.TestCase):
+    def test_same_as_backward_scan(self):
+        gear = np.zeros(400)
+        for down, up in [(50, 120), (180, 230), (300, 350), (390, 400)]:
+            gear[down:up] = 1
+        gear = np.ma.array(gear, mask=np.zeros(400, bool))
+        gear[60:70] = np.ma.masked   # masked samples still count
+        moves = TransitionIndex(gear, 0.5)
+        self.assertEqual(len(moves), 7)
+        for touchdown in np.arange(0, 400, 0.7):
+            self.assertEqual(moves.last_before(touchdown), last_crossing(gear.data, 0.5, touchdown), touchdown)
+        self.assertEqual(moves.next_after(120), 179.5)
+        self.assertEqual(moves.next_after(389.5), None)
+
+    def test_interpolated(self):
+        moves = TransitionIndex(np.array([0., 2., 2., 0.5, -1.]), 0.5)
+        self.assertEqual(list(moves.index), [0.25, 3.0])
+
+
+if __name__=='__main__':
+    print 'testing event index'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+test_file_cache.py
+
+unit tests for the local LRU cache of repository files, with a slow local
+directory standing in for the remote share
+"""
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+from file_cache import FileCache
+
+
+class SlowShare(object):
+    '''opens files like open(), then reads them slowly, as over the VPN'''
+    def __init__(self, seconds_per_read=0.02):
+        self.seconds_per_read = seconds_per_read
+        self.opened = []
+
+    def __call__(self, path, mode='rb'):
+        self.opened.append(path)
+        return SlowFile(open(path, mode), self.seconds_per_read)
+
+
+class SlowFile(object):
+    def __init__(self, f, seconds_per_read):
+        self.f = f
+        self.seconds_per_read = seconds_per_read
+
+    def read(self, size):
+        time.sleep(self.seconds_per_read)
+        return self.f.read(size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.f.close()
+
+
+def _get_slowly(args):
+    '''a worker process: its own FileCache on the shared directory'''
+    cache_dir, remote_path = args
+    cache = FileCache(cache_dir, open_remote=SlowShare(0.2))
+    local_path = cache.get(remote_path)
+    return local_path, cache.stats()
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.share = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.files = []
+        for i in range(4):
+            path = os.path.join(self.share, 'flight_%d.hdf5' % i)
+            with open(path, 'wb') as f:
+                f.write(chr(65 + i) * 1000)
+            self.files.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.share)
+        shutil.rmtree(self.cache_dir)
+
+    def test_hit_after_miss(self):
+        remote = SlowShare()
+        cache = FileCache(self.cache_dir, open_remote=remote)
+        local_path = cache.get(self.files[0])
+        self.assertEqual(os.path.basename(local_path), 'flight_0.hdf5')
+        self.assertEqual(open(local_path, 'rb').read(), 'A' * 1000)
+        self.assertEqual(cache.localize(self.files[:2], workers=2),
+                         [local_path, cache.get(self.files[1])])
+        self.assertEqual(remote.opened, self.files[:2])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['bytes_fetched']), (2, 2, 2000))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertEqual(sorted(f for f in os.listdir(os.path.dirname(local_path))),
+                         ['flight_0.hdf5', 'flight_0.hdf5.lock', 'flight_0.hdf5.md5'])
+
+    def test_changed_and_corrupt(self):
+        remote = SlowShare(0)
+        cache = FileCache(self.cache_dir, open_remote=remote, verify='md5')
+        local_path = cache.get(self.files[0])
+        with open(self.files[0], 'wb') as f:
+            f.write('Z' * 1200)                 # changed in the repository: new size
+        self.assertEqual(open(cache.get(self.files[0]), 'rb').read(), 'Z' * 1200)
+        with open(local_path, 'r+b') as f:
+            f.write('Y')                        # same size, different content
+        self.assertEqual(open(cache.get(self.files[0]), 'rb').read(), 'Z' * 1200)
+        self.assertEqual(len(remote.opened), 3)
+        self.assertEqual(cache.stats()['corrupt'], 1)
+
+    def test_offline(self):
+        cache = FileCache(self.cache_dir, open_remote=SlowShare(0))
+        local_path = cache.get(self.files[0])
+        os.rename(self.share, self.share + '.gone')   # the VPN is down
+        try:
+            self.assertEqual(cache.get(self.files[0]), local_path)
+            self.assertRaises(IOError, cache.get, self.files[1])
+        finally:
+            os.rename(self.share + '.gone', self.share)
+        self.assertEqual(cache.stats()['offline'], 1)
+
+    def test_lru_eviction(self):
+        cache = FileCache(self.cache_dir, max_bytes=2500, open_remote=SlowShare(0))
+        first, second = cache.get(self.files[0]), cache.get(self.files[1])
+        os.utime(first, (time.time() - 100, time.time() - 100))
+        os.utime(second, (time.time() - 200, time.time() - 200))   # second is least recently used
+        cache.get(self.files[2])
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(sum(size for _, size, _ in cache.entries()), 2000)
+
+    def test_sweep_larger_than_cache(self):
+        for path in self.files:
+            with open(path, 'wb') as f:
+                f.write('x' * 100)
+        cache = FileCache(self.cache_dir, max_bytes=250, open_remote=SlowShare(0))
+        local_paths = cache.localize(self.files, workers=2)
+        self.assertEqual([os.path.exists(p) for p in local_paths], [True] * 4)   # pinned for the run
+        self.assertEqual(cache.stats()['evictions'], 0)
+        cache.release()
+        cache.evict()
+        self.assertEqual([os.path.exists(p) for p in local_paths].count(True), 2)
+        self.assertEqual(cache.stats()['evictions'], 2)
+        for path in local_paths:    # evicted copies take their lock files and folders with them
+            self.assertEqual(os.path.exists(path + '.lock'), os.path.exists(path))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+        self.assertEqual(cache.get(self.files[0]), local_paths[0])   # fetched again
+
+    def test_concurrent_population(self):
+        pool = multiprocessing.Pool(4)
+        try:
+            results = pool.map(_get_slowly, [(self.cache_dir, self.files[0])] * 4)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(len(set(path for path, _ in results)), 1)
+        self.assertEqual(sum(stats['misses'] for _, stats in results), 1)    # fetched once
+        self.assertEqual(sum(stats['hits'] for _, stats in results), 3)
+        self.assertEqual(open(results[0][0], 'rb').read(), 'A' * 1000)
+
+
+if __name__=='__main__':
+    print 'testing file cache'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+test_kernels.py
+
+unit tests for the compiled per-sample kernels: each one against the loop it replaces,
+with and without the jit path
+"""
+import unittest
+
+import numpy as np
+
+import kernels
+
+# consistent (combined control, up advisory, down advisory) states for made-up RAs
+RA_STATES = [('No Advisory', 'No Up Advisory', 'No Down Advisory'),
+             ('Clear of Conflict', 'No Up Advisory', 'No Down Advisory'),
+             ('Up Advisory Corrective', 'Climb', 'No Down Advisory'),
+             ('Up Advisory Corrective', "Don't Descend", 'No Down Advisory'),
+             ('Down Advisory Corrective', 'No Up Advisory', 'Descend'),
+             ('Down Advisory Corrective', 'No Up Advisory', "Don't Climb 500"),
+             ('Preventive', 'No Up Advisory', "Don't Climb"),
+             ('Drop Track', 'No Up Advisory', 'No Down Advisory')]
+CTL_CODES = {'Clear of Conflict': kernels.CTL_CLEAR, 'Up Advisory Corrective': kernels.CTL_UP,
+             'Down Advisory Corrective': kernels.CTL_DOWN, 'Preventive': kernels.CTL_HOLD,
+             'Drop Track': kernels.CTL_HOLD}
+
+
+def vert_spd_required(ctl, up, down, vert, vert_spd):
+    '''tcas_vert_spd_up / tcas_vert_spd_down for the states above'''
+    if ctl == 'Up Advisory Corrective' or up.lower() != 'no up advisory':
+        return {'Climb': 2500 if vert == 'Increase' else 1500, "Don't Descend": 0}[up]
+    elif ctl == 'Down Advisory Corrective' or down.lower() != 'no down advisory':
+        return {'Descend': -2500 if vert == 'Increase' else -1500, "Don't Climb": 0, "Don't Climb 500": 500}[down]
+    return vert_spd
+
+
+def std_response_loop(ctl, up, down, vert, vertspd, start, stop):
+    '''TCASRAStandardResponse.derive and update_std_vert_spd as they were, for one RA'''
+    ra_ctl_prev = up_prev = down_prev = ctl[start]
+    std = init = vertspd[start]
+    required = None
+    lag_end, acceleration = start + 5.0, 8.0 * 60
+    out = []
+    for t in range(start, stop + 1):
+        if ra_ctl_prev != ctl[t] or up_prev != up[t] or down_prev != down[t]:
+            required = vert_spd_required(ctl[t], up[t], down[t], vert[t], vertspd[t])
+            if vert[t] == 'Reversal':
+                lag_end, acceleration, init = t + 2.5, 11.2 * 60, std
+        new = std
+        if ctl[t] in ('Clear of Conflict', 'No Advzy'):
+            new = vertspd[t]
+        elif t < lag_end:
+            new = init
+        elif ctl[t] == 'Down Advisory Corrective' or down[t].lower() != 'no down advisory':
+            if std > required:
+                new = std - acceleration
+            if new <= required:
+                new = required
+        elif ctl[t] == 'Up Advisory Corrective' or up[t].lower() != 'no up advisory':
+            if std < required:
+                new = std + acceleration
+            if new >= required:
+                new = required
+        elif ctl[t] in ('Preventive', 'Drop Track', 'Altitude Lost'):
+            new = std
+        else:
+            new = vertspd[t]
+        std = new
+        out.append(std)
+        ra_ctl_prev, up_prev, down_prev = ctl[t], up[t], down[t]
+    return np.array(out, dtype=float)
+
+
+def exceedance_loop(ctl, up, down, vertspd, std, start, stop):
+    '''TCASAltitudeExceedance.derive as it was, for one RA'''
+    exceedance = 0
+    for t in range(start, stop):
+        if ctl[t] == 'Down Advisory Corrective' or down[t].lower() != 'no down advisory':
+            deviation = max(vertspd[t] - std[t], 0)
+        elif ctl[t] == 'Up Advisory Corrective' or up[t].lower() != 'no up advisory':
+            deviation = max(std[t] - vertspd[t], 0)
+        else:
+            deviation = max(abs(vertspd[t] - std[t]) - 250, 0)
+        if deviation and deviation != 0:
+            exceedance += deviation
+    return exceedance
+
+
+def roll_window(values, half_width, use_max):
+    '''the np.roll stack of the UA_profile sustained_* helpers'''
+    shift = np.zeros(shape=(2 * half_width + 1, len(values)))
+    for c in range(-half_width, half_width + 1):
+        shift[c + half_width] = np.roll(values, c, axis=0)
+    return shift.max(axis=0) if use_max else shift.min(axis=0)
+
+
+def made_up_ra(seed, n=120):
+    '''per-sample state strings and vertical speed for RA segments of random length'''
+    rng = np.random.RandomState(seed)
+    ctl, up, down, vert = [], [], [], []
+    while len(ctl) < n:
+        length = rng.randint(1, 15)
+        states = RA_STATES[rng.randint(len(RA_STATES))]
+        ctl += [states[0]] * length
+        up += [states[1]] * length
+        down += [states[2]] * length
+        vert += [['Maintain', 'Increase', 'Reversal'][rng.randint(3)]] * length
+    vertspd = np.cumsum(rng.normal(0, 300, n)) + rng.uniform(-3000, 3000)
+    return ctl[:n], up[:n], down[:n], vert[:n], vertspd
+
+
+class KernelTestCase(unittest.TestCase):
+    def each_path(self):
+        '''run the test body with the jit path and the fallback'''
+        saved = kernels.USE_JIT
+        try:
+            for use_jit in (True, False):
+                kernels.USE_JIT = use_jit
+                yield use_jit
+        finally:
+            kernels.USE_JIT = saved
+
+
+class TestWindow(KernelTestCase):
+    def test_same_as_roll(self):
+        rng = np.random.RandomState(0)
+        cases = [rng.normal(size=500), rng.normal(size=3), np.arange(10.0), np.zeros(0),
+                 np.array([1.0, np.nan, 3.0, 4.0, 5.0, 6.0])]
+        for use_jit in self.each_path():
+            for values in cases:
+                for half_width in (1, 2, 8):
+                    np.testing.assert_array_equal(kernels.window_min(values, half_width),
+                                                  roll_window(values, half_width, False))
+                    np.testing.assert_array_equal(kernels.window_max(values, half_width),
+                                                  roll_window(values, half_width, True))
+
+    def test_int_input(self):
+        values = np.array([3, 1, 4, 1, 5, 9, 2, 6])
+        self.assertEqual(kernels.window_max(values, 1).tolist(), [6., 4., 4., 5., 9., 9., 9., 6.])
+
+
+class TestTCAS(KernelTestCase):
+    def prepare(self, ctl, up, down, vert, vertspd, start, stop):
+        '''the arguments TCASRAStandardResponse builds for std_response'''
+        window = slice(start, stop + 1)
+        codes = np.array([CTL_CODES.get(s, kernels.CTL_OTHER) for s in ctl])
+        up_active = np.array([s.lower() != 'no up advisory' for s in up])
+        down_active = np.array([s.lower() != 'no down advisory' for s in down])
+        changed = np.zeros(stop + 1 - start, dtype=bool)
+        for states in (ctl, up, down):
+            states = np.array(states[window])
+            changed[1:] |= states[1:] != states[:-1]
+        changed[0] = ctl[start] != up[start] or ctl[start] != down[start]
+        required = np.array([vert_spd_required(ctl[t], up[t], down[t], vert[t], vertspd[t])
+                             for t in range(start, stop + 1)], dtype=float)
+        reversal = np.array([s == 'Reversal' for s in vert])
+        return (start, codes[window], up_active[window], down_active[window], changed, required,
+                reversal[window], vertspd[window], start + 5.0, 2.5, 8.0 * 60, 11.2 * 60)
+
+    def test_std_response(self):
+        for use_jit in self.each_path():
+            for seed in range(20):
+                ctl, up, down, vert, vertspd = made_up_ra(seed)
+                start, stop = seed, 100 + seed % 7
+                std, required = kernels.std_response(*self.prepare(ctl, up, down, vert, vertspd, start, stop))
+                np.testing.assert_allclose(std, std_response_loop(ctl, up, down, vert, vertspd, start, stop))
+                self.assertFalse(np.isnan(required).any())
+
+    def test_exceedance(self):
+        for seed in range(20):
+            ctl, up, down, vert, vertspd = made_up_ra(seed)
+            std = vertspd + np.random.RandomState(seed).normal(0, 400, len(vertspd))
+            codes = np.array([CTL_CODES.get(s, kernels.CTL_OTHER) for s in ctl])
+            up_active = np.array([s.lower() != 'no up advisory' for s in up])
+            down_active = np.array([s.lower() != 'no down advisory' for s in down])
+            valid = np.ones(len(ctl), dtype=bool)
+            self.assertAlmostEqual(kernels.exceedance(codes, up_active, down_active, vertspd, std, valid),
+                                   exceedance_loop(ctl, up, down, vertspd, std, 0, len(ctl)))
+            valid[10:20] = False
+            self.assertAlmostEqual(kernels.exceedance(codes, up_active, down_active, vertspd, std, valid),
+                                   exceedance_loop(ctl, up, down, vertspd, std, 0, 10) +
+                                   exceedance_loop(ctl, up, down, vertspd, std, 20, len(ctl)))
+
+
+if __name__=='__main__':
+    print 'testing kernels'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
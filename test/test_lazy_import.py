@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+test_lazy_import.py
+
+unit tests for the lazy import layer, and the import time budget of the
+profile modules (those need the FDS environment)
+"""
+import os
+import sys
+import subprocess
+import unittest
+
+from lazy_import import LazyModule, LazyObject
+
+# seconds allowed for a cold `import <module>` in a fresh interpreter
+IMPORT_BUDGET = {'notebook_utils': 5.0, 'tcas_profile': 4.0, 'example_profile': 4.0, 'UA_profile': 4.0}
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import analysis_engine
+    FDS_AVAILABLE = True
+except ImportError:
+    FDS_AVAILABLE = False
+
+
+def timed_import(module_name, check_unloaded=()):
+    '''(seconds, [modules still not loaded]) for importing module_name in a fresh interpreter'''
+    script = ('import sys, time\n'
+              't0 = time.time()\n'
+              'import %s as m\n'
+              'elapsed = time.time() - t0\n'
+              'print elapsed, [n for n in %r if not getattr(m, n).loaded]\n') % (module_name, tuple(check_unloaded))
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=REPO_DIR)
+    elapsed, unloaded = output.strip().splitlines()[-1].split(' ', 1)
+    return float(elapsed), eval(unloaded)
+
+
+class TestLazyModule(unittest.TestCase):
+    def test_imported_on_first_use(self):
+        sys.modules.pop('colorsys', None)
+        colorsys = LazyModule('colorsys')
+        self.assertFalse(colorsys.loaded)
+        self.assertFalse('colorsys' in sys.modules)
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertTrue(colorsys.loaded)
+
+    def test_submodules(self):
+        xml = LazyModule('xml', submodules=['dom.minidom'])
+        self.assertTrue(hasattr(xml.dom.minidom, 'parseString'))
+
+
+class TestLazyObject(unittest.TestCase):
+    def test_loaded_once_on_first_use(self):
+        calls = []
+        def load_master():
+            calls.append(1)
+            return {'Flap': 'deg'}
+        master = LazyObject(load_master)
+        self.assertEqual(calls, [])
+        self.assertTrue('Flap' in master)
+        self.assertEqual(master['Flap'], 'deg')
+        self.assertEqual(master.get('Gear'), None)
+        self.assertEqual(calls, [1])
+
+
+@unittest.skipUnless(FDS_AVAILABLE, 'needs the FDS environment')
+class TestImportBudget(unittest.TestCase):
+    def test_notebook_utils(self):
+        elapsed, unloaded = timed_import('notebook_utils', ['pd', 'pylab', 'nx', 'hdfaccess', 'ffd_master'])
+        self.assertEqual(unloaded, ['pd', 'pylab', 'nx', 'hdfaccess', 'ffd_master'])
+        self.assertTrue(elapsed < IMPORT_BUDGET['notebook_utils'], elapsed)
+
+    def test_profiles(self):
+        for module_name in ('tcas_profile', 'example_profile', 'UA_profile'):
+            elapsed, unloaded = timed_import(module_name, ['fds_oracle'])
+            self.assertEqual(unloaded, ['fds_oracle'])
+            self.assertTrue(elapsed < IMPORT_BUDGET[module_name], (module_name, elapsed))
+
+
+if __name__=='__main__':
+    print 'testing lazy imports'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+test_node_registry.py
+
+unit tests for the cached node registry
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+from node_registry import NodeRegistry
+
+NODE_MODULE = '''
+class Node(object):
+    @classmethod
+    def get_name(cls):
+        return cls.__name__
+    @classmethod
+    def get_dependency_names(cls):
+        return ['Altitude AAL']
+
+class AltitudeMax(Node):
+    pass
+
+class SpeedMax(Node):
+    pass
+'''
+
+
+class TestNodeRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.module_path = os.path.join(self.tempdir, 'fake_nodes.py')
+        with open(self.module_path, 'w') as f:
+            f.write(NODE_MODULE)
+        sys.path.insert(0, self.tempdir)
+        import fake_nodes
+        self.module = fake_nodes
+        self.index_path = os.path.join(self.tempdir, 'index', 'registry.json')
+        self.builds = []
+
+    def tearDown(self):
+        sys.path.remove(self.tempdir)
+        del sys.modules['fake_nodes']
+        shutil.rmtree(self.tempdir)
+
+    def build(self, module_names):
+        self.builds.append(module_names)
+        return {'Altitude Max': self.module.AltitudeMax, 'Speed Max': self.module.SpeedMax}
+
+    def test_built_once_per_process(self):
+        registry = NodeRegistry(self.index_path, build=self.build)
+        nodes = registry.get_derived_nodes(['fake_nodes'])
+        nodes['My Profile Node'] = object  # callers add their own nodes
+        again = registry.get_derived_nodes(['fake_nodes'])
+        self.assertEqual(len(self.builds), 1)
+        self.assertEqual(sorted(again), ['Altitude Max', 'Speed Max'])
+        self.assertEqual(registry.stats['memory'], 1)
+
+    def test_index_warm_start(self):
+        NodeRegistry(self.index_path, build=self.build).get_derived_nodes(['fake_nodes'])
+        registry = NodeRegistry(self.index_path, build=self.build)  # as in a new process
+        nodes = registry.get_derived_nodes(['fake_nodes'])
+        self.assertEqual(len(self.builds), 1)
+        self.assertTrue(nodes['Speed Max'] is self.module.SpeedMax)
+        self.assertEqual(registry.stats['index'], 1)
+        self.assertEqual(registry.dependencies(['fake_nodes'])['Altitude Max'], ['Altitude AAL'])
+
+    def test_rebuilt_on_module_change(self):
+        registry = NodeRegistry(self.index_path, build=self.build)
+        registry.get_derived_nodes(['fake_nodes'])
+        later = time.time() + 10
+        os.utime(self.module_path, (later, later))
+        registry.get_derived_nodes(['fake_nodes'])
+        NodeRegistry(self.index_path, build=self.build).get_derived_nodes(['fake_nodes'])
+        self.assertEqual(len(self.builds), 2)
+
+
+if __name__=='__main__':
+    print 'testing node registry'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
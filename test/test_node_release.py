@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+test_node_release.py
+
+unit tests for releasing intermediate node arrays after their last consumer
+"""
+import unittest
+
+import numpy as np
+
+from node_release import NodeReleaser, consumer_counts
+from fixtures import Node, NodeManager, node_class, series
+
+
+class FakeNode(Node):
+    '''an array of 1000 samples once derived'''
+    def get_derived(self, args):
+        self.array = np.ma.zeros(1000) + sum(len(a.array) for a in args if a is not None)
+        return self
+
+
+class TestNodeRelease(unittest.TestCase):
+    def setUp(self):
+        # Altitude AAL (hdf) -> Distance -> Speed -> Profile KPV;  Distance -> Other KPV
+        classes = [node_class(name, dependencies, FakeNode)
+                   for name, dependencies in [('Distance', ['Altitude AAL']), ('Speed', ['Distance']),
+                                              ('Profile KPV', ['Speed']), ('Other KPV', ['Distance', 'Speed']),
+                                              ('Unused', ['Altitude AAL'])]]
+        self.node_mgr = NodeManager(dict((c.name, c) for c in classes), ['Altitude AAL'],
+                                    requested=['Profile KPV', 'Other KPV'])
+        self.order = ['Altitude AAL', 'Distance', 'Speed', 'Profile KPV', 'Other KPV', 'Unused']
+
+    def derive_all(self, keep=None):
+        '''the staged_helper loop, in miniature'''
+        params = {'Altitude AAL': series()}
+        with NodeReleaser(self.node_mgr, self.order, keep=keep, node_base=FakeNode) as releaser:
+            for name in self.order[1:]:
+                cls = self.node_mgr.derived_nodes[name]
+                params[name] = cls().get_derived([params.get(d) for d in cls.get_dependency_names()])
+                if name == 'Speed':
+                    self.assertEqual(len(params['Distance'].array), 1000)   # Other KPV still to come
+        self.assertEqual(FakeNode.get_derived.__name__, 'get_derived')   # restored
+        return params, releaser
+
+    def test_counts(self):
+        self.assertEqual(consumer_counts(self.node_mgr, self.order),
+                         {'Altitude AAL': 2, 'Distance': 2, 'Speed': 2})
+
+    def test_release_after_last_consumer(self):
+        params, releaser = self.derive_all()
+        self.assertEqual(sorted(releaser.released), ['Distance', 'Speed', 'Unused'])
+        self.assertEqual(len(params['Distance'].array), 0)
+        self.assertEqual(len(params['Profile KPV'].array), 1000)   # requested: the sink stores it
+        self.assertEqual(len(params['Altitude AAL'].array), 1000)  # belongs to the flight
+        self.assertEqual(releaser.stats(), {'released': 3, 'bytes': 3 * 8000})
+
+    def test_keep(self):
+        params, releaser = self.derive_all(keep=['Speed'])
+        self.assertEqual(sorted(releaser.released), ['Distance', 'Unused'])
+        self.assertEqual(len(params['Speed'].array), 1000)
+
+
+if __name__=='__main__':
+    print 'testing node release'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
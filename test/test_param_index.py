@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+test_param_index.py
+
+unit tests for the parameter name search indexes
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from param_index import CatalogueCache, NameIndex, hdf_series_info, series_info
+
+try:
+    import h5py
+    H5PY_AVAILABLE = True
+except ImportError:
+    H5PY_AVAILABLE = False
+
+NAMES = ['Flap Angle', 'Flap Lever', 'Slat Angle', 'Gear Down', 'Gear (L) Down', 'Altitude AAL',
+         'Altitude QNH', 'TCAS Up Advisory', 'ILS Glideslope', 'Eng (1) N1', 'Eng (2) N1', 'AP Engaged']
+
+
+class TestNameIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = NameIndex(NAMES)
+
+    def scan(self, term):
+        return [i for i, name in enumerate(NAMES) if name.upper().find(term.upper()) >= 0]
+
+    def test_same_as_scan(self):
+        for term in ['flap', 'ANGLE', 'gear', 'ear d', 'n1', 'a', '', 'altitude q', 'zzz', 'eng (', 'slope']:
+            self.assertEqual(list(self.index.search(term)), self.scan(term), term)
+
+    def test_trigrams_without_substring(self):
+        # every trigram of 'ANGLE FLAP' occurs in 'Flap Angle' but the term does not
+        self.assertEqual(list(NameIndex(['Flap Angle', 'ANGLE FLA']).search('angle flap')), [])
+
+    def test_words(self):
+        self.assertEqual([NAMES[i] for i in self.index.search('angle', match='words')], ['Flap Angle', 'Slat Angle'])
+        self.assertEqual([NAMES[i] for i in self.index.search('down gear', match='words')],
+                         ['Gear Down', 'Gear (L) Down'])
+        self.assertEqual(list(self.index.search('ang', match='words')), [])
+
+
+class TestCatalogueCache(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.builds = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def build(self):
+        self.builds.append(1)
+        return NameIndex(NAMES)
+
+    def test_persisted_by_signature(self):
+        CatalogueCache(self.tempdir).get('master.txt', (1.0, 10), self.build)
+        cache = CatalogueCache(self.tempdir)   # as in a new session
+        index = cache.get('master.txt', (1.0, 10), self.build)
+        self.assertEqual(len(self.builds), 1)
+        np.testing.assert_array_equal(index.search('flap'), [0, 1])
+        cache.get('master.txt', (2.0, 10), self.build)   # file changed
+        self.assertEqual(len(self.builds), 2)
+        self.assertEqual(dict(cache.stats), {'disk': 1, 'build': 1})
+
+    def test_memory_only(self):
+        cache = CatalogueCache(self.tempdir)
+        cache.get(('nodes', 1), None, self.build, persist=False)
+        cache.get(('nodes', 1), None, self.build, persist=False)
+        self.assertEqual(len(self.builds), 1)
+        CatalogueCache(self.tempdir).get(('nodes', 1), None, self.build, persist=False)  # nothing on disk
+        self.assertEqual(len(self.builds), 2)
+
+    def test_bounded(self):
+        cache = CatalogueCache(self.tempdir, max_entries=2)
+        for source in ('a', 'b', 'a', 'c', 'a', 'b'):   # 'b' is dropped for 'c', 'a' stays in use
+            cache.get(source, None, self.build, persist=False)
+        self.assertEqual(len(self.builds), 4)
+        self.assertEqual(cache.stats['evicted'], 2)
+
+    def test_owner(self):
+        cache = CatalogueCache(self.tempdir)
+        nodes, same_names = {'Flap': 1}, {'Flap': 2}
+        cache.get(('nodes', id(nodes)), len(nodes), self.build, persist=False, owner=nodes)
+        cache.get(('nodes', id(nodes)), len(nodes), self.build, persist=False, owner=nodes)
+        self.assertEqual(len(self.builds), 1)
+        cache.get(('nodes', id(nodes)), len(nodes), self.build, persist=False, owner=same_names)
+        self.assertEqual(len(self.builds), 2)   # another object under the same key is not a hit
+
+
+class Parameter(object):
+    '''hdfaccess Parameter attributes'''
+    def __init__(self, frequency, data_type, units=None, values_mapping=None):
+        self.frequency, self.data_type, self.units, self.values_mapping = frequency, data_type, units, values_mapping
+
+
+class TestSeriesInfo(unittest.TestCase):
+    def test_series(self):
+        info = series_info({'Gear Down': Parameter(1.0, 'Discrete', values_mapping={0: '-', 1: 'Down'}),
+                            'Altitude STD': Parameter(4.0, 'Signed', 'ft')})
+        self.assertEqual(info, {'Gear Down': (1.0, 'Discrete', None, {0: '-', 1: 'Down'}),
+                                'Altitude STD': (4.0, 'Signed', 'ft', None)})
+
+    @unittest.skipUnless(H5PY_AVAILABLE, 'needs h5py')
+    def test_hdf(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'flight.hdf5')
+            with h5py.File(path, 'w') as hdf:
+                series = hdf.create_group('series')
+                gear = series.create_group('Gear Down')
+                gear.create_dataset('data', data=np.zeros(10))
+                gear.attrs['frequency'] = 1.0
+                gear.attrs['data_type'] = 'Discrete'
+                gear.attrs['values_mapping'] = json.dumps({0: '-', 1: 'Down'})
+                series.create_group('Altitude STD').attrs['units'] = 'ft'
+            info = hdf_series_info(path)
+        finally:
+            shutil.rmtree(tempdir)
+        self.assertEqual(info['Gear Down'], (1.0, 'Discrete', None, {0: '-', 1: 'Down'}))
+        self.assertEqual(info['Altitude STD'], (None, None, 'ft', None))
+
+
+if __name__=='__main__':
+    print 'testing param index'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+test_plot_queue.py
+
+unit tests for the deferred TCAS RA plot records
+"""
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from collections import namedtuple
+
+import numpy as np
+
+from plot_queue import ArtifactQueue, RA_STATES, load_record, ra_record, ra_window, render
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+Section = namedtuple('Section', 'name slice start_edge stop_edge')
+
+
+class Mapped(np.ndarray):
+    '''just enough of a MappedArray: int data with a values_mapping'''
+    def __new__(cls, data, values_mapping):
+        obj = np.asarray(data).view(cls)
+        obj.values_mapping = values_mapping
+        return obj
+
+
+class TestPlotQueue(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        n = 3600
+        self.vertspd = np.ma.array(np.sin(np.arange(n) / 10.0) * 1000, mask=np.zeros(n, bool))
+        self.vertspd[1010] = np.ma.masked
+        ctl = np.zeros(n, int)
+        ctl[1000:1025] = 4
+        self.states = dict((name, Mapped(ctl, {0: 'No Advisory', 4: 'Up Advisory Corrective', 10: 'Ten'}))
+                           for name in RA_STATES)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_window(self):
+        self.assertEqual(ra_window([Section('RA', slice(1000, 1025), 1000, 1025)], 3600), (985.0, 1040.0))
+        self.assertEqual(ra_window([Section('RA', slice(5, 3595), 5, 3595)], 3600), (0, 3600))
+
+    def test_round_trip(self):
+        record = ra_record({'vertspd': self.vertspd, 'std response': self.vertspd * 0.5}, self.states,
+                           '/data/flight_1.hdf5', 'KJFK', 'KFLL', 985.0, 1040.0)
+        path = ArtifactQueue(self.tempdir).put(record)
+        self.assertEqual(os.path.basename(path), 'flight_1.npz')
+        self.assertTrue(os.path.getsize(path) < 10000)   # the window, not the flight
+        back = load_record(path)
+        self.assertEqual((back['x0'], back['tstart'], back['tend'], back['orig']), (985, 985.0, 1040.0, 'KJFK'))
+        self.assertEqual(len(back['series_0']), 55)
+        self.assertTrue(np.isnan(back['series_%d' % back['series_names'].tolist().index('vertspd')][25]))
+        ctl = back['tcas_ctl']
+        self.assertEqual(ctl.values_mapping, {0: 'No Advisory', 4: 'Up Advisory Corrective', 10: 'Ten'})
+        self.assertEqual(list(ctl.data[14:16]), [0, 4])
+
+    def test_select(self):
+        queue = ArtifactQueue(self.tempdir)
+        for name in ('a.hdf5', 'b.hdf5'):
+            queue.put(ra_record({'vertspd': self.vertspd}, self.states, name, 'KJFK', 'KFLL', 985.0, 1040.0))
+        self.assertEqual([os.path.basename(p) for p in queue.records(select=['/x/b.hdf5'])], ['b.npz'])
+        self.assertEqual(len(queue.records()), 2)
+
+    @unittest.skipUnless(MATPLOTLIB_AVAILABLE, 'needs matplotlib')
+    def test_render(self):
+        path = ArtifactQueue(self.tempdir).put(ra_record({'vertspd': self.vertspd}, self.states,
+                                                         'flight_1.hdf5', 'KJFK', 'KFLL', 985.0, 1040.0))
+        png = render(path, self.tempdir)
+        self.assertEqual(os.path.basename(png), 'flight_1.png')
+        self.assertTrue(os.path.getsize(png) > 0)
+        self.assertFalse('tcas_profile' in sys.modules)   # the renderer does not load a profile
+
+
+if __name__=='__main__':
+    print 'testing plot queue'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+test_supervised_run.py
+
+unit tests for supervised, fault-isolated flight runs
+"""
+import os
+import time
+import unittest
+
+from supervised_run import run_supervised
+
+
+def fake_flight(filepath):
+    '''stands in for one run_profile() call; behaviour is picked by the file name'''
+    if filepath.startswith('bad'):
+        raise ValueError('corrupt hdf5')
+    elif filepath.startswith('hang'):
+        time.sleep(60)
+    elif filepath.startswith('crash'):
+        os._exit(3)
+    elif filepath.startswith('greedy'):
+        return len(' ' * (512 * 1024 * 1024))
+    return os.getpid()
+
+
+class TestRunSupervised(unittest.TestCase):
+    def test_failures_are_isolated(self):
+        files = ['ok1.hdf5', 'bad.hdf5', 'hang.hdf5', 'crash.hdf5', 'ok2.hdf5']
+        status = run_supervised(fake_flight, files, timeout=1, retries=0)
+        results = dict((f, status['flights'][f]['result']) for f in files)
+        self.assertEqual(results, {'ok1.hdf5': 'ok', 'bad.hdf5': 'error', 'hang.hdf5': 'timeout',
+                                   'crash.hdf5': 'crashed', 'ok2.hdf5': 'ok'})
+        self.assertEqual(status['counts']['ok'], 2)
+
+    def test_retry(self):
+        status = run_supervised(fake_flight, ['bad.hdf5'], retries=2)
+        self.assertEqual(status['flights']['bad.hdf5']['attempts'], 3)
+
+    def test_worker_recycling(self):
+        files = ['ok%d.hdf5' % i for i in range(4)]
+        status = run_supervised(fake_flight, files, flights_per_worker=2)
+        pids = set(status['flights'][f]['value'] for f in files)
+        self.assertEqual(len(pids), 2)
+
+    def test_memory_limit(self):
+        status = run_supervised(fake_flight, ['greedy.hdf5', 'ok.hdf5'], memory_limit_mb=256, retries=0)
+        self.assertEqual(status['flights']['greedy.hdf5']['result'], 'memory')
+        self.assertEqual(status['flights']['ok.hdf5']['result'], 'ok')
+
+
+if __name__=='__main__':
+    print 'testing supervised run'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -33,11 +33,6 @@ from tcas_profile import (
     TCASDownAdvisory,
     TCASVerticalControl,    
 )
-'''
-TCASSensitivityAtTCASRAStart,
-VerticalSpeedAtTCASRAStart,
-AltitudeQNHAtTCASRAStart,
-'''
 
 
 ### fixtures
@@ -225,132 +220,52 @@ class TestTCASVerticalControl(unittest.TestCase):
         self.assertEqual(expected,  node)
 
 
-class TestTCASSensitivityAtTCASRAStart(unittest.TestCase):
+class TestTCASRAStartState(unittest.TestCase):
+    def setUp(self):
+        self.klass =tcas.TCASRAStartState
+        self.start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
+
     def test_can_operate(self):
-        expected = [('TCAS Sensitivity Level', 'TCAS RA Start')]
-        opts =tcas.TCASSensitivityAtTCASRAStart.get_operational_combinations()
-        self.assertEqual(opts, expected)
-    
+        opts = self.klass.get_operational_combinations()
+        self.assertTrue(('TCAS RA Start', 'Vertical Speed') in opts)
+        self.assertTrue(('TCAS RA Start', 'Pitch', 'Roll') in opts)
+        self.assertFalse(('TCAS RA Start',) in opts)
+
     def test_derive(self):
-        '''[[[State]]]
+        '''every RA start state in one pass; TCAS Sensitivity Level states
           0 = SL = 0 (Automatic)
           1 = SL = 1 (Standby)
-          2 = SL = 2 (TA Only)
-          3 = SL = 3
           ...
         '''
-        values_mapping = {  0: '0',    1: '1', }
-        tcas_sens = M( 'TCAS Sensitivity Level', 
-                              array=np.ma.array([0,0,1,0,0]),
-                              values_mapping=values_mapping, frequency=.25, offset=0.)
-        start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
-        node = tcas.TCASSensitivityAtTCASRAStart()
-        node.derive(tcas_sens, start)
-        
-        expected = [ KeyPointValue(index=2, value=1, name='TCAS RA Start Pilot Sensitivity Mode'), ]
-        self.assertEqual(expected,  node)
-
-
-class TestVerticalSpeedAtTCASRAStart(unittest.TestCase):
-    def setUp(self):
-        self.klass =tcas.VerticalSpeedAtTCASRAStart
-    
-    def test_can_operate(self):
-        self.assertEqual(self.klass.get_operational_combinations(),[('Vertical Speed', 'TCAS RA Start')])
-
-    def test_derive(self):
-        start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
+        tcas_sens = M( 'TCAS Sensitivity Level', array=np.ma.array([0,0,1,0,0]),
+                       values_mapping={0: '0', 1: '1'}, frequency=.25, offset=0.)
         vspd = P( 'Vertical Speed', array=np.ma.arange(10)*10.0, frequency=1., offset=0.)
-        expected = [KeyPointValue(index=2, value=20.0, name='TCAS RA Start Vertical Speed'),]
-
-        k = self.klass()
-        k.derive(vspd, start)
-        self.assertEqual(k, expected)
-
-
-class TestAltitudeQNHAtTCASRAStart(unittest.TestCase):
-    def setUp(self):
-        self.klass =tcas.AltitudeQNHAtTCASRAStart
-    
-    def test_can_operate(self):
-        self.assertEqual(self.klass.get_operational_combinations(),[('Altitude QNH', 'TCAS RA Start')])
-
-    def test_derive(self):
-        start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
         alt = P( 'Altitude QNH', array=np.ma.arange(10)*10.0, frequency=1., offset=0.)
-        expected = [KeyPointValue(index=2, value=20.0, name='TCAS RA Start Altitude QNH'),]
-
+        pitch = P( 'Pitch', array=np.ma.arange(10)*10.0, frequency=1., offset=0.)
+        roll = P( 'Roll', array=np.ma.arange(10)*-10.0, frequency=1., offset=0.)
+        airspeed = P( 'Airspeed', array=np.arange(100,200,10)*1.0, frequency=1., offset=0.)
+        ap = P( 'AP Engaged', array=np.ma.arange(10)*1.0, frequency=1., offset=0.)
+        expected = [KeyPointValue(index=2, value=1, name='TCAS RA Start Pilot Sensitivity Mode'),
+                    KeyPointValue(index=2, value=20.0, name='TCAS RA Start Vertical Speed'),
+                    KeyPointValue(index=2, value=20.0, name='TCAS RA Start Altitude QNH'),
+                    KeyPointValue(index=2, value=20.0, name='TCAS RA Start Pitch'),
+                    KeyPointValue(index=2, value=20.0, name='TCAS RA Start Roll Abs'),
+                    KeyPointValue(index=2, value=120.0, name='TCAS RA Start Airspeed'),
+                    KeyPointValue(index=2, value=2.0, name='TCAS RA Start Autopilot'),]
         k = self.klass()
-        k.derive(alt, start)
+        k.derive(self.start, tcas_sens, vspd, alt, pitch, roll, airspeed, ap)
         self.assertEqual(k, expected)
-        
-        
-class TestPitchAtTCASRAStart(unittest.TestCase):
-    def setUp(self):
-        self.klass =tcas.PitchAtTCASRAStart
-    
-    def test_can_operate(self):
-        self.assertEqual(self.klass.get_operational_combinations(),[('Pitch', 'TCAS RA Start')])
 
-    def test_derive(self):
-        start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
-        param = P( 'Pitch', array=np.ma.arange(10)*10.0, frequency=1., offset=0.)
-        expected = [KeyPointValue(index=2, value=20.0, name='TCAS RA Start Pitch'),]
-
-        k = self.klass()
-        k.derive(param, start)
-        self.assertEqual(k, expected)
-
-        
-class TestRollAtTCASRAStart(unittest.TestCase):
-    def setUp(self):
-        self.klass =tcas.RollAtTCASRAStart
-    
-    def test_can_operate(self):
-        self.assertEqual(self.klass.get_operational_combinations(),[('Roll', 'TCAS RA Start')])
-
-    def test_derive(self):
-        start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
-        param = P( 'Roll', array=np.ma.arange(10)*10.0, frequency=1., offset=0.)
-        expected = [KeyPointValue(index=2, value=20.0, name='TCAS RA Start Roll Abs'),]
-
-        k = self.klass()
-        k.derive(param, start)
-        self.assertEqual(k, expected)
-        
-        
-class TestAirspeedAtTCASRAStart(unittest.TestCase):
-    def setUp(self):
-        self.klass =tcas.AirspeedAtTCASRAStart
-    
-    def test_can_operate(self):
-        self.assertEqual(self.klass.get_operational_combinations(),[('Airspeed', 'TCAS RA Start')])
-
-    def test_derive(self):
-        start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
-        param = P( 'Airspeed', array=np.arange(100,200,10)*1.0, frequency=1., offset=0.)
-        expected = [KeyPointValue(index=2, value=120.0, name='TCAS RA Start Airspeed'),]
+    def test_derive_some(self):
+        vspd = P( 'Vertical Speed', array=np.ma.arange(10)*10.0, frequency=1., offset=0.)
+        ap = P( 'AP Engaged', array=np.ma.arange(10)*1.0, frequency=1., offset=0.)
+        expected = [KeyPointValue(index=2, value=20.0, name='TCAS RA Start Vertical Speed'),
+                    KeyPointValue(index=2, value=2.0, name='TCAS RA Start Autopilot'),]
         k = self.klass()
-        k.derive(param, start)
+        k.derive(self.start, None, vspd, None, None, None, None, ap)
         self.assertEqual(k, expected)
 
 
-class TestAutopilotAtTCASRAStart(unittest.TestCase):
-    def setUp(self):
-        self.klass =tcas.AutopilotAtTCASRAStart
-    
-    def test_can_operate(self):
-        self.assertEqual(self.klass.get_operational_combinations(),[('AP Engaged', 'TCAS RA Start')])
-
-    def test_derive(self):
-        start = KTI( items= [KeyTimeInstance(index=2,   name='TCAS RA Start'),  ] )
-        param = P( 'AP Engaged', array=np.ma.arange(10)*1.0, frequency=1., offset=0.)
-        expected = [KeyPointValue(index=2, value=2.0, name='TCAS RA Start Autopilot'),]
-        k = self.klass()
-        k.derive(param, start)
-        self.assertEqual(k, expected)
-        
-
 class TestTCASRATimeToAPDisengage(unittest.TestCase):
     def setUp(self):
         self.klass =tcas.TCASRATimeToAPDisengage
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+test_tcas_states.py
+
+unit tests for the TCAS state codes the kernels read
+"""
+import unittest
+
+import numpy as np
+
+import kernels
+from fixtures import Param, States
+from tcas_states import state_codes, tcas_ctl_code, tcas_ra_states
+
+
+def states(values, mapping=None):
+    array = np.ma.array(values).view(States)
+    if mapping is not None:
+        array.values_mapping = mapping
+    return Param(array)
+
+
+class TestTCASStates(unittest.TestCase):
+    def test_state_codes(self):
+        tcas = states([0, 2, 2, 1, 5]).array          # 5 is not in the mapping
+        self.assertEqual(state_codes(tcas, lambda s: s.startswith('Down'), False).tolist(),
+                         [False, True, True, False, False])
+        self.assertEqual(state_codes(tcas, len, -1).tolist(), [11, 24, 24, 22, -1])
+
+    def test_ctl_code(self):
+        self.assertEqual([tcas_ctl_code(s) for s in ('No Advzy', 'Down Advisory Corrective',
+                                                     'Up Advisory Corrective', 'Drop Track', 'Reversal')],
+                         [kernels.CTL_CLEAR, kernels.CTL_DOWN, kernels.CTL_UP, kernels.CTL_HOLD, kernels.CTL_OTHER])
+
+    def test_ra_states(self):
+        ctl = states([0, 1, 2, 3], {0: 'Clear of Conflict', 1: 'Up Advisory Corrective',
+                                    2: 'Down Advisory Corrective', 3: 'Preventive'})
+        up = states([0, 1, 0, 0], {0: 'No Up Advisory', 1: 'Climb'})
+        down = states([0, 0, 1, 1], {0: 'No Down Advisory', 1: 'Descend'})
+        codes, up_active, down_active = tcas_ra_states(ctl, up, down)
+        self.assertEqual(codes.tolist(), [kernels.CTL_CLEAR, kernels.CTL_UP, kernels.CTL_DOWN, kernels.CTL_HOLD])
+        self.assertEqual(up_active.tolist(), [False, True, False, False])
+        self.assertEqual(down_active.tolist(), [False, False, True, True])
+
+
+if __name__=='__main__':
+    print 'testing tcas states'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+test_vspeed_registry.py
+
+unit tests for the Vref table registry
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from vspeed_registry import VrefTable, VelocitySpeedRegistry
+
+
+class B747(object):
+    '''stands in for a flightdatautilities VelocitySpeed class'''
+    interpolate = True
+    source = 'test'
+    weight_unit = 't'
+    tables = {
+        'vref': {
+            'weight': (160, 170, 180),
+                  30: (111, 114, 118),
+                  25: (116, 120, 123),
+                },
+    }
+
+
+class Unweighted(object):
+    '''a table with one speed per flap setting, whatever the weight'''
+    interpolate = False
+    weight_unit = None
+    tables = {'vref': {15: 135, 30: 125}}
+
+
+class NoVref(object):
+    '''takeoff speeds only'''
+    interpolate = False
+    weight_unit = 'kg'
+    tables = {'v2': {'weight': (50000, 60000), 5: (130, 140)}}
+
+
+class TestVrefTable(unittest.TestCase):
+    def test_interpolated(self):
+        table = VrefTable.from_vspeed(B747)
+        self.assertEqual(table.vref_settings, [25, 30])
+        result = table.vref(np.ma.array([30, 25, 30]), np.ma.array([165000., 170000., 160000.]))
+        np.testing.assert_array_equal(result, [112.5, 120.0, 111.0])
+
+    def test_masked_outside_table(self):
+        table = VrefTable.from_vspeed(B747)
+        result = table.vref(np.ma.array([30, 20, 30]), np.ma.array([200000., 170000., 170000.]))
+        self.assertEqual(list(np.ma.getmaskarray(result)), [True, True, False])
+
+    def test_step_lookup(self):
+        table = VrefTable(B747.tables['vref'], interpolate=False, weight_unit='t')
+        result = table.vref(np.ma.array([30, 30]), np.ma.array([165000., 170000.]))
+        np.testing.assert_array_equal(result, [114.0, 114.0])
+
+    def test_without_weights(self):
+        table = VrefTable.from_vspeed(Unweighted)
+        self.assertEqual(table.weights, None)
+        result = table.vref(np.ma.array([15, 20, 15]), None)
+        np.testing.assert_array_equal(result, [135.0, 0.0, 135.0])
+        self.assertEqual(list(np.ma.getmaskarray(result)), [False, True, False])
+
+    def test_no_vref_table(self):
+        self.assertEqual(VrefTable.from_vspeed(NoVref), None)
+
+
+class TestVelocitySpeedRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_fallback_order(self):
+        registry = VelocitySpeedRegistry()
+        registry.register('B747', None, B747)
+        registry.register('B747-400', 'CF6-80C2', VrefTable(B747.tables['vref'], weight_unit='kg'))
+        family_table = registry.resolve('B747-200', 'B747', 'JT9D', 'JT9D-7')
+        series_table = registry.resolve('B747-400', 'B747', 'CF6-80C2', 'CF6-80C2B1')
+        self.assertEqual(family_table.weight_scale, 0.001)
+        self.assertEqual(series_table.weight_scale, 1.0)
+
+    def test_unknown_aircraft(self):
+        registry = VelocitySpeedRegistry()
+        self.assertRaises(KeyError, registry.resolve, 'CRJ 700', 'CRJ')
+
+    def test_no_vref_table(self):
+        registry = VelocitySpeedRegistry(fallback=lambda *key: NoVref)
+        registry.register('B787', None, NoVref)   # skipped with a warning
+        self.assertFalse(('B787', None) in registry)
+        self.assertRaises(KeyError, registry.resolve, 'B787-8', 'B787')
+
+    def test_fds_fallback(self):
+        calls = []
+        def fallback(*key):
+            calls.append(key)
+            return B747
+        registry = VelocitySpeedRegistry(fallback=fallback)
+        for i in range(3):
+            registry.resolve('B747-200', 'B747')
+        self.assertEqual(len(calls), 1)
+
+    def test_load_directory(self):
+        table = {'aircraft': 'A320', 'engine': None, 'weight_unit': 't',
+                 'vref': {'weight': [50, 60], '35': [120, 130]}}
+        with open(os.path.join(self.tempdir, 'a320.json'), 'w') as f:
+            json.dump(table, f)
+        registry = VelocitySpeedRegistry()
+        self.assertEqual(registry.load_directory(self.tempdir), 1)
+        result = registry.resolve('A320-200', 'A320').vref(35, 55000.)
+        np.testing.assert_array_equal(result, [125.0])
+
+
+if __name__=='__main__':
+    print 'testing vspeed registry'
+    try:
+        unittest.main()
+    except SystemExit as inst: #ignore extraneous error from interactive prompt
+        pass
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of velocity speed (Vref) tables used by the profiles.
+
+Tables come from two places:
+    VelocitySpeed classes registered by a profile module (e.g. UA_profile.A320)
+    *.json table files in a directory, so new fleets can be added without code.
+
+A table file looks like:
+    {"aircraft": "B757", "engine": null, "weight_unit": "t", "interpolate": true,
+     "source": "where the numbers came from",
+     "vref": {"weight": [80, 90, 100], "30": [120, 126, 132]}}
+
+Every table is held as numpy arrays (see VrefTable), built once at registration.
+Aircraft resolve through the same fallback order as FDS 'get_vspeed_map'; the
+answer for each (series, family, engine series, engine type) key is memoised so
+repeat lookups are a single dict access.
+"""
+import os
+import glob
+import json
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# lookup tables are stored in their own weight unit; gross weight arrives in kg.
+# A table with weight_unit None has one speed per setting, whatever the weight.
+WEIGHT_UNIT_SCALE = {'kg': 1.0, 't': 0.001, 'lb': 2.20462262, None: None}
+
+
+class VrefTable(object):
+    '''
+    Vref lookup over a velocity speed table, pre-built as numpy arrays so a whole
+    array of (flap setting, gross weight) samples is resolved in one call.
+    Interpolating tables use linear interpolation on weight, the others step
+    to the next tabulated weight, as VelocitySpeed.vref() does.
+    Weights outside the table and settings not in the table come back masked.
+    A table without weights (weight_unit None) gives one speed per setting.
+    '''
+    def __init__(self, vref, interpolate=True, weight_unit='kg', source=''):
+        if weight_unit not in WEIGHT_UNIT_SCALE:
+            raise ValueError('unknown weight unit %r' % (weight_unit,))
+        self.settings = np.array(sorted(k for k in vref.keys() if k != 'weight'))
+        self.weight_scale = WEIGHT_UNIT_SCALE[weight_unit]
+        self.weights = np.array(vref['weight'], dtype=np.float64) if self.weight_scale is not None else None
+        # one row of speeds per flap setting, rows ordered as self.settings; one speed per row without weights
+        self.grid = np.array([vref[s] for s in self.settings], dtype=np.float64)
+        self.interpolate = interpolate
+        self.source = source
+
+    @classmethod
+    def from_vspeed(cls, vspeed_class):
+        '''build from an FDS VelocitySpeed class (or instance); None, with a warning, if it has no Vref table'''
+        vref = getattr(vspeed_class, 'tables', {}).get('vref')
+        if not vref:
+            logger.warning('%s has no Vref table', getattr(vspeed_class, '__name__', vspeed_class))
+            return None
+        return cls(vref, interpolate=vspeed_class.interpolate,
+                   weight_unit=vspeed_class.weight_unit,
+                   source=getattr(vspeed_class, 'source', ''))
+
+    @classmethod
+    def from_json(cls, table):
+        '''build from a parsed table file; json object keys are always strings'''
+        vref = {}
+        for k, speeds in table['vref'].items():
+            vref[k if k == 'weight' else _setting(k)] = speeds
+        return cls(vref, interpolate=table.get('interpolate', True),
+                   weight_unit=table.get('weight_unit', 'kg'),
+                   source=table.get('source', ''))
+
+    @property
+    def vref_settings(self):
+        return list(self.settings)
+
+    def vref(self, setting_array, weight_array):
+        '''Vref per sample for arrays of flap setting and gross weight (kg)'''
+        setting_array = np.ma.atleast_1d(setting_array)
+        weight_array = np.ma.atleast_1d(weight_array)
+        result = np.ma.masked_all(setting_array.shape, dtype=np.float64)
+        setting_data = np.ma.getdata(setting_array)
+        if self.weights is None:   # weight does not matter
+            bad = np.ma.getmaskarray(setting_array)
+            for row, setting in enumerate(self.settings):
+                result[(setting_data == setting) & ~bad] = self.grid[row]
+            return result
+        weights = np.ma.getdata(weight_array).astype(np.float64) * self.weight_scale
+        bad = np.ma.getmaskarray(setting_array) | np.ma.getmaskarray(weight_array)
+        bad |= (weights < self.weights[0]) | (weights > self.weights[-1])
+        for row, setting in enumerate(self.settings):
+            rows = (setting_data == setting) & ~bad
+            if not rows.any():
+                continue
+            if self.interpolate:
+                result[rows] = np.interp(weights[rows], self.weights, self.grid[row])
+            else:
+                steps = np.searchsorted(self.weights, weights[rows], side='left')
+                result[rows] = self.grid[row][steps]
+        return result
+
+
+def _setting(key):
+    '''flap settings are numbers in the FDS tables: '30' -> 30, '2.5' -> 2.5'''
+    value = float(key)
+    return int(value) if value == int(value) else value
+
+
+class VelocitySpeedRegistry(object):
+    '''
+    Vref tables keyed on (aircraft, engine), where aircraft is a series or a
+    family and engine is an engine type, an engine series or None.
+
+    fallback is called as fallback(series, family, engine_series, engine_type)
+    for aircraft with no registered table; FDS 'get_vspeed_map' fits.
+    '''
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+        self._tables = {}
+        self._resolved = {}  # (series, family, engine_series, engine_type) -> VrefTable or None
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __contains__(self, key):
+        return key in self._tables
+
+    def register(self, aircraft, engine, table):
+        '''add a VrefTable, or a VelocitySpeed class to convert, for (aircraft, engine)'''
+        if not isinstance(table, VrefTable):
+            table = VrefTable.from_vspeed(table)
+            if table is None:   # no Vref table to register
+                return
+        if (aircraft, engine) in self._tables:
+            logger.warning('Vref table for %s replaced', (aircraft, engine))
+        self._tables[(aircraft, engine)] = table
+        self._resolved.clear()  # a new table can change earlier answers
+
+    def register_map(self, vspeed_map):
+        '''register a dict in the style of VELOCITY_SPEED_MAP: {(aircraft, engine): VelocitySpeed}'''
+        for (aircraft, engine), vspeed_class in vspeed_map.items():
+            self.register(aircraft, engine, vspeed_class)
+
+    def load_directory(self, path):
+        '''register every *.json table file in path; returns the number loaded'''
+        if not path or not os.path.isdir(path):
+            return 0
+        filenames = sorted(glob.glob(os.path.join(path, '*.json')))
+        for filename in filenames:
+            with open(filename) as f:
+                table = json.load(f)
+            self.register(table['aircraft'], table.get('engine'), VrefTable.from_json(table))
+        return len(filenames)
+
+    def resolve(self, series=None, family=None, engine_series=None, engine_type=None):
+        '''
+        VrefTable for an aircraft, searched in the FDS 'get_vspeed_map' order.
+
+        :raises: KeyError -- if no velocity speed mapping found.
+        '''
+        key = (series, family, engine_series, engine_type)
+        try:
+            table = self._resolved[key]
+        except KeyError:
+            table = self._resolved[key] = self._search(*key)
+        if table is None:
+            raise KeyError('No Vref table for %s' % (key,))
+        return table
+
+    def _search(self, series, family, engine_series, engine_type):
+        lookup_combinations = ((series, engine_type),
+                               (family, engine_type),
+                               (series, engine_series),
+                               (family, engine_series),
+                               (series, None),
+                               (family, None))
+        for combination in lookup_combinations:
+            if combination in self._tables:
+                return self._tables[combination]
+        if self.fallback is None:
+            return None
+        try:
+            vspeed_class = self.fallback(series, family, engine_series, engine_type)
+        except KeyError:
+            return None
+        return VrefTable.from_vspeed(vspeed_class) if vspeed_class else None